@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Compare the synchronous and asyncio engines against local Redis instances"""
+import asyncio
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis_async import AsyncRedisInfo, AsyncRedisVerify, execute_concurrently
+from redis_info import RedisInfo
+from redis_verify import RedisVerify
+
+DEFAULT_ENDPOINTS = ["127.0.0.1:6379", "127.0.0.1:6380"]
+DEFAULT_REPEAT = 100
+
+
+def get_endpoint_args(endpoint):
+    host, port = endpoint.rsplit(":", 1)
+    return {"host": host,
+            "port": int(port),
+            "cluster_mode": False,
+            "authentication": None,
+            "decode_responses": True}
+
+
+def benchmark_sync_info(endpoints):
+    start_time = time.time()
+    for endpoint in endpoints:
+        RedisInfo(**get_endpoint_args(endpoint)).execute()
+    return time.time() - start_time
+
+
+def benchmark_async_info(endpoints):
+    start_time = time.time()
+    asyncio.run(execute_concurrently([AsyncRedisInfo(**get_endpoint_args(endpoint)) for endpoint in endpoints]))
+    return time.time() - start_time
+
+
+def benchmark_sync_verify(endpoints, pattern):
+    start_time = time.time()
+    for endpoint in endpoints:
+        args = get_endpoint_args(endpoint)
+        args.update({"pattern": pattern, "no_ttl_only": True, "print_keys": False, "throttle": "none"})
+        RedisVerify(**args).execute()
+    return time.time() - start_time
+
+
+def benchmark_async_verify(endpoints, pattern):
+    tasks = []
+    for endpoint in endpoints:
+        args = get_endpoint_args(endpoint)
+        args.update({"pattern": pattern, "no_ttl_only": True, "print_keys": False})
+        tasks.append(AsyncRedisVerify(**args))
+    start_time = time.time()
+    asyncio.run(execute_concurrently(tasks))
+    return time.time() - start_time
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark synchronous against asyncio engine")
+    parser.add_argument("--endpoints", type=str, nargs="+", default=DEFAULT_ENDPOINTS, help="Redis endpoint(s) in host:port form")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Times each endpoint is repeated to simulate a fleet - Defaults to {}".format(str(DEFAULT_REPEAT)))
+    parser.add_argument("--pattern", type=str, default="*", help="Pattern walked by the verify benchmark")
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    endpoints = args.endpoints * args.repeat
+    result = {"endpoints": len(endpoints),
+              "sync_info_time": benchmark_sync_info(endpoints),
+              "async_info_time": benchmark_async_info(endpoints),
+              "sync_verify_time": benchmark_sync_verify(args.endpoints, args.pattern),
+              "async_verify_time": benchmark_async_verify(args.endpoints, args.pattern)}
+    result["info_speedup"] = result["sync_info_time"] / result["async_info_time"]
+    result["verify_speedup"] = result["sync_verify_time"] / result["async_verify_time"]
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
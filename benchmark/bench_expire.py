@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Compare the pipelined and the server side Lua expire paths against a local Redis instance"""
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis import Redis
+from redis_expire import RedisExpire
+
+DEFAULT_KEYS = 200000
+DEFAULT_TTL = 3600
+KEY_PREFIX = "bench:expire:"
+POPULATE_BATCH = 10000
+
+
+def populate(client, keys):
+    """Persistent keys only, so that every run has the same work to do"""
+    client.delete(*client.keys(KEY_PREFIX + "*") or ["{}0".format(KEY_PREFIX)])
+    for start in range(0, keys, POPULATE_BATCH):
+        client.mset({"{}{}".format(KEY_PREFIX, index): index for index in range(start, min(start + POPULATE_BATCH, keys))})
+
+
+def benchmark_expire(host, port, keys, lua, no_ttl_only):
+    client = Redis(host=host, port=port)
+    populate(client, keys)
+    task = RedisExpire(host, port, False, None, False, KEY_PREFIX + "*", no_ttl_only, DEFAULT_TTL, False,
+                       lua=lua, throttle="none")
+    start_time = time.time()
+    result = task.execute()
+    elapsed_time = time.time() - start_time
+    client.delete(*client.keys(KEY_PREFIX + "*") or ["{}0".format(KEY_PREFIX)])
+    return {"time": elapsed_time,
+            "keys_deleted": result["keys_deleted"],
+            "keys_per_second": result["keys_deleted"] / elapsed_time if elapsed_time > 0 else 0}
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark pipelined against server side Lua expire")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Redis Host")
+    parser.add_argument("--port", type=int, default=6379, help="Redis Port")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Number of keys expired - Defaults to {}".format(str(DEFAULT_KEYS)))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    result = {}
+    for no_ttl_only in (False, True):
+        pipeline_result = benchmark_expire(args.host, args.port, args.keys, False, no_ttl_only)
+        lua_result = benchmark_expire(args.host, args.port, args.keys, True, no_ttl_only)
+        result["no_ttl_only" if no_ttl_only else "all_keys"] = {"pipeline": pipeline_result,
+                                                                "lua": lua_result,
+                                                                "speedup": pipeline_result["time"] / lua_result["time"]}
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Measure how client-side key filtering of RedisVerify scales with the number of filter processes"""
+import os
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis import Redis
+from redis_filter import KeyFilter
+from redis_verify import RedisVerify
+
+DEFAULT_KEYS = 500000
+DEFAULT_PROCESSES = [0, 1, 2, 4]
+# Backtracking heavy on purpose, standing in for compound business rules
+DEFAULT_REGEX = r"^bench:filter:(\w+:)*\d*7\d*$"
+KEY_PREFIX = "bench:filter:"
+POPULATE_BATCH = 10000
+
+
+def populate(client, keys):
+    for start in range(0, keys, POPULATE_BATCH):
+        client.mset({"{}tenant{}:user:{}".format(KEY_PREFIX, index % 100, index): index for index in range(start, min(start + POPULATE_BATCH, keys))})
+
+
+def clear(client):
+    for key_value in client.scan_iter(match=KEY_PREFIX + "*", count=POPULATE_BATCH):
+        client.unlink(key_value)
+
+
+def benchmark_filter(host, port, regex, processes):
+    task = RedisVerify(host, port, False, None, False, KEY_PREFIX + "*", False, False, throttle="none",
+                       key_filter=KeyFilter(regex=regex), filter_processes=processes)
+    start_time = time.time()
+    result = task.execute()
+    elapsed_time = time.time() - start_time
+    return {"time": elapsed_time,
+            "keys_encountered": result["keys_encountered"],
+            "cpu_count": os.cpu_count()}
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark client-side key filtering across filter processes")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Redis Host")
+    parser.add_argument("--port", type=int, default=6379, help="Redis Port")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Number of keys - Defaults to {}".format(str(DEFAULT_KEYS)))
+    parser.add_argument("--regex", type=str, default=DEFAULT_REGEX, help="Regular expression keys are filtered with")
+    parser.add_argument("--processes", type=int, nargs="+", default=DEFAULT_PROCESSES,
+                        help="Filter processes to compare, 0 for matching in the scanning thread - Defaults to {}".format(" ".join(map(str, DEFAULT_PROCESSES))))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    client = Redis(host=args.host, port=args.port)
+    populate(client, args.keys)
+    result = {}
+    try:
+        for processes in args.processes:
+            result[processes] = benchmark_filter(args.host, args.port, args.regex, processes)
+            result[processes]["keys_per_second"] = args.keys / result[processes]["time"]
+            result[processes]["speedup"] = result[args.processes[0]]["time"] / result[processes]["time"]
+    finally:
+        clear(client)
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
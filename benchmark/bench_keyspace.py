@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Run the key walk tasks over synthetic keyspaces and parameter sweeps, recording a comparable JSON report.
+   With --baseline, the run fails when a case got slower than the baseline by more than --threshold"""
+import itertools
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import time
+
+from argparse import ArgumentParser
+from redis import Redis
+
+DEFAULT_ENDPOINTS = ["127.0.0.1:6379"]
+DEFAULT_KEYS = 100000
+DEFAULT_PREFIXES = 100
+DEFAULT_PREFIX_SKEW = 1.0
+DEFAULT_VALUE_SIZE = 64
+DEFAULT_TTL_RATIO = 0.5
+DEFAULT_SLOWLOG_ENTRIES = 10000
+DEFAULT_THRESHOLD = 0.2
+NAMESPACE = "bench:keyspace:"
+POPULATE_BATCH = 10000
+
+# Task, module, class and arguments of every case - sweeps only apply to the arguments a task accepts
+SCAN_ARGUMENTS = ("concurrency", "auto_tune", "throttle", "max_connections", "read_preference")
+# Key walks run unpaced unless a throttle is swept, so that cases measure the tasks rather than their pacing
+SCAN_DEFAULTS = {"throttle": "none"}
+TASKS = {"verify": ("redis_verify", "RedisVerify", {"no_ttl_only": False, "print_keys": False}, SCAN_ARGUMENTS),
+         "verify_no_ttl": ("redis_verify", "RedisVerify", {"no_ttl_only": True, "print_keys": False}, SCAN_ARGUMENTS),
+         "verify_prefixes": ("redis_verify", "RedisVerify", {"no_ttl_only": False, "print_keys": False, "prefix_depth": 3, "ttl_buckets": True}, SCAN_ARGUMENTS),
+         "verify_ttl_profile": ("redis_verify", "RedisVerify", {"no_ttl_only": False, "print_keys": False, "ttl_profile": True}, SCAN_ARGUMENTS),
+         "memory": ("redis_memory", "RedisMemory", {}, SCAN_ARGUMENTS),
+         "expire": ("redis_expire", "RedisExpire", {"no_ttl_only": True, "print_keys": False, "ttl": 3600}, SCAN_ARGUMENTS),
+         "expire_lua": ("redis_expire", "RedisExpire", {"no_ttl_only": True, "print_keys": False, "ttl": 3600, "lua": True}, SCAN_ARGUMENTS),
+         "delete": ("redis_delete", "RedisDelete", {"no_ttl_only": False, "print_keys": False}, SCAN_ARGUMENTS),
+         "slowlog": ("redis_slowlog", "RedisSlowlog", {}, ())}
+# Tasks changing the keyspace, which is loaded again before each of their cases
+MUTATING_TASKS = ("expire", "expire_lua", "delete")
+SWEEP_VALUES = {"true": True, "false": False}
+
+
+def parse_endpoint(endpoint):
+    host, _, port = endpoint.rpartition(":")
+    return {"host": host, "port": int(port), "name": endpoint}
+
+
+def get_prefix_weights(prefixes, prefix_skew):
+    """Zipf distributed prefixes - a skew of 0 spreads keys evenly"""
+    return [1 / (rank ** prefix_skew) for rank in range(1, prefixes + 1)]
+
+
+def generate_keyspace(endpoints, keys, prefixes, prefix_skew, value_size, ttl_ratio, seed=0):
+    """Spread keys over the endpoints as a cluster spreads slots, with prefix:id:field names,
+       a share of ttl_ratio keys expiring within a day and the rest persistent"""
+    generator = random.Random(seed)
+    weights = get_prefix_weights(prefixes, prefix_skew)
+    clients = [Redis(host=endpoint["host"], port=endpoint["port"]) for endpoint in endpoints]
+    clear_keyspace(endpoints)
+    value = b"x" * value_size
+    for start in range(0, keys, POPULATE_BATCH):
+        pipelines = [client.pipeline(transaction=False) for client in clients]
+        batch = min(POPULATE_BATCH, keys - start)
+        for index, prefix in zip(range(start, start + batch), generator.choices(range(prefixes), weights, k=batch)):
+            key_value = "{}prefix{}:{}:field".format(NAMESPACE, prefix, index)
+            ttl = generator.randrange(60, 86400) if generator.random() < ttl_ratio else None
+            pipelines[index % len(pipelines)].set(key_value, value, ex=ttl)
+        for pipeline in pipelines:
+            pipeline.execute()
+
+
+def clear_keyspace(endpoints):
+    for endpoint in endpoints:
+        client = Redis(host=endpoint["host"], port=endpoint["port"])
+        pipeline = client.pipeline(transaction=False)
+        for key_value in client.scan_iter(match=NAMESPACE + "*", count=POPULATE_BATCH):
+            pipeline.unlink(key_value)
+        pipeline.execute()
+
+
+def generate_slowlog(endpoints, entries):
+    """Fill the slowlog of every endpoint with entries, logging every command for the time being"""
+    for endpoint in endpoints:
+        client = Redis(host=endpoint["host"], port=endpoint["port"])
+        threshold = client.config_get("slowlog-log-slower-than")["slowlog-log-slower-than"]
+        client.config_set("slowlog-max-len", entries)
+        client.slowlog_reset()
+        client.config_set("slowlog-log-slower-than", 0)
+        pipeline = client.pipeline(transaction=False)
+        for index in range(entries):
+            pipeline.get("{}slowlog:{}".format(NAMESPACE, index))
+        pipeline.execute()
+        client.config_set("slowlog-log-slower-than", threshold)
+
+
+def get_server_cpu(endpoints):
+    cpu_time = 0
+    for endpoint in endpoints:
+        cpu = Redis(host=endpoint["host"], port=endpoint["port"]).info("cpu")
+        cpu_time += float(cpu["used_cpu_sys"]) + float(cpu["used_cpu_user"])
+    return cpu_time
+
+
+def get_peak_rss():
+    """Peak RSS in KB of this process alone - Linux carries ru_maxrss of the parent over fork and exec,
+       while VmHWM belongs to the address space of the spawned interpreter"""
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(task_name, parameters, endpoints, slowlog_entries, queue):
+    """Runs in a process of its own, so that peak RSS is the one of the case alone"""
+    import importlib
+    module_name, class_name, arguments, _ = TASKS[task_name]
+    task_class = getattr(importlib.import_module(module_name), class_name)
+    arguments = dict(arguments, **parameters)
+    common_arguments = [endpoints[0]["host"], endpoints[0]["port"], False, None, False]
+    if task_name == "slowlog":
+        task = task_class(*common_arguments, entries=slowlog_entries, **arguments)
+    else:
+        task = task_class(*common_arguments, pattern=NAMESPACE + "*", nodes=endpoints, **dict(SCAN_DEFAULTS, **arguments))
+    start_time = time.time()
+    result = task.run(metrics=True)
+    elapsed_time = time.time() - start_time
+    # Slowlog returns a list, so the metrics are taken from the task rather than the result
+    metrics = task.metrics.get_statistics()
+    if task_name == "slowlog":
+        keys, sleep_time = len(result), 0
+    else:
+        keys, sleep_time = result.get("keys_scanned", result.get("keys_encountered", 0)), result.get("sleep_time", 0)
+    # Throttle sleep is left out, as it measures the pacing asked for rather than the task
+    execution_time = elapsed_time - sleep_time
+    queue.put({"keys": keys,
+               "elapsed_time": elapsed_time,
+               "sleep_time": sleep_time,
+               "keys_per_second": keys / execution_time if execution_time > 0 else 0,
+               "round_trips": sum(latency["count"] for latency in metrics["latency_in_microsec"].values()),
+               "client_cpu_time": metrics["cpu_time"],
+               "peak_rss_kb": get_peak_rss()})
+
+
+def get_cases(tasks, sweeps):
+    """Every combination of the sweep values a task accepts"""
+    for task_name in tasks:
+        accepted = [(name, values) for name, values in sweeps.items() if name in TASKS[task_name][3]]
+        names = [name for name, _ in accepted]
+        for values in itertools.product(*[values for _, values in accepted]):
+            yield task_name, dict(zip(names, values))
+
+
+def get_case_id(task_name, parameters):
+    return " ".join([task_name] + ["{}={}".format(name, parameters[name]) for name in sorted(parameters)])
+
+
+def parse_sweeps(sweeps):
+    """name=value,value,... into {name: [value, ...]}, with true / false and integers converted"""
+    parsed = {}
+    for sweep in sweeps:
+        name, _, values = sweep.partition("=")
+        parsed[name] = [SWEEP_VALUES.get(value, int(value) if value.isdigit() else value) for value in values.split(",")]
+    return parsed
+
+
+def compare_reports(report, baseline, threshold):
+    """Cases slower than the baseline by more than the threshold, in keys per second"""
+    baseline_cases = {case["id"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in report["cases"]:
+        baseline_case = baseline_cases.get(case["id"])
+        if baseline_case is None or not baseline_case["keys_per_second"]:
+            continue
+        change = case["keys_per_second"] / baseline_case["keys_per_second"] - 1
+        if change < -threshold:
+            regressions.append({"id": case["id"],
+                                "keys_per_second": case["keys_per_second"],
+                                "baseline_keys_per_second": baseline_case["keys_per_second"],
+                                "change": change})
+    return regressions
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark the key walk tasks over synthetic keyspaces")
+    parser.add_argument("--endpoints", type=str, nargs="+", default=DEFAULT_ENDPOINTS,
+                        help="Independent master endpoint(s) in host:port form, keys are spread over them like cluster slots")
+    parser.add_argument("--tasks", type=str, nargs="+", choices=TASKS, default=list(TASKS), help="Tasks benchmarked - Defaults to all")
+    parser.add_argument("--sweep", type=str, action="append", default=[],
+                        help="Parameter values to sweep, e.g. concurrency=1,8 or auto_tune=false,true - may be repeated")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Number of keys - Defaults to {}".format(str(DEFAULT_KEYS)))
+    parser.add_argument("--prefixes", type=int, default=DEFAULT_PREFIXES, help="Number of distinct prefixes - Defaults to {}".format(str(DEFAULT_PREFIXES)))
+    parser.add_argument("--prefix_skew", type=float, default=DEFAULT_PREFIX_SKEW,
+                        help="Zipf exponent of the prefix distribution, 0 for uniform - Defaults to {}".format(str(DEFAULT_PREFIX_SKEW)))
+    parser.add_argument("--value_size", type=int, default=DEFAULT_VALUE_SIZE, help="Bytes per value - Defaults to {}".format(str(DEFAULT_VALUE_SIZE)))
+    parser.add_argument("--ttl_ratio", type=float, default=DEFAULT_TTL_RATIO,
+                        help="Share of keys with a TTL - Defaults to {}".format(str(DEFAULT_TTL_RATIO)))
+    parser.add_argument("--slowlog_entries", type=int, default=DEFAULT_SLOWLOG_ENTRIES,
+                        help="Slowlog entries per endpoint for the slowlog task - Defaults to {}".format(str(DEFAULT_SLOWLOG_ENTRIES)))
+    parser.add_argument("--output", type=str, help="File to write the JSON report to - Defaults to stdout")
+    parser.add_argument("--baseline", type=str, help="JSON report to compare keys per second against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown against --baseline failing the run - Defaults to {}".format(str(DEFAULT_THRESHOLD)))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    endpoints = [parse_endpoint(endpoint) for endpoint in args.endpoints]
+    keyspace = {"keys": args.keys,
+                "prefixes": args.prefixes,
+                "prefix_skew": args.prefix_skew,
+                "value_size": args.value_size,
+                "ttl_ratio": args.ttl_ratio,
+                "endpoints": args.endpoints}
+    report = {"keyspace": keyspace, "cases": []}
+    # Each case runs in a fresh interpreter rather than a fork of this one
+    context = multiprocessing.get_context("spawn")
+    keyspace_loaded = False
+    for task_name, parameters in get_cases(args.tasks, parse_sweeps(args.sweep)):
+        if task_name == "slowlog":
+            generate_slowlog(endpoints, args.slowlog_entries)
+        elif task_name in MUTATING_TASKS or not keyspace_loaded:
+            generate_keyspace(endpoints, args.keys, args.prefixes, args.prefix_skew, args.value_size, args.ttl_ratio)
+            keyspace_loaded = task_name not in MUTATING_TASKS
+        server_cpu_time = get_server_cpu(endpoints)
+        queue = context.Queue()
+        process = context.Process(target=run_case, args=(task_name, parameters, endpoints, args.slowlog_entries, queue))
+        process.start()
+        case = queue.get()
+        process.join()
+        case.update({"id": get_case_id(task_name, parameters),
+                     "task": task_name,
+                     "parameters": parameters,
+                     "server_cpu_time": get_server_cpu(endpoints) - server_cpu_time})
+        report["cases"].append(case)
+        print("{}: {:.0f} keys/s".format(case["id"], case["keys_per_second"]), file=sys.stderr, flush=True)
+        # Mutating tasks leave the keyspace behind changed
+        if task_name in MUTATING_TASKS:
+            keyspace_loaded = False
+    clear_keyspace(endpoints)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            report["regressions"] = compare_reports(report, json.load(baseline_file), args.threshold)
+    content = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            output_file.write(content + "\n")
+    else:
+        print(content)
+    if report.get("regressions"):
+        print("{} case(s) slower than the baseline by more than {:.0%}".format(len(report["regressions"]), args.threshold), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Compare a live RedisVerify key walk with the offline RedisRdb analysis of a snapshot of the same keyspace"""
+import os
+import socket
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from bench_keyspace import NAMESPACE, clear_keyspace, generate_keyspace, parse_endpoint
+from redis_rdb import RedisRdb
+from redis_verify import RedisVerify
+
+DEFAULT_KEYS = 1000000
+DEFAULT_VALUE_SIZE = 64
+
+
+def fetch_rdb(path, host, port):
+    """Snapshot as sent to a replica on SYNC, the server file being out of reach inside its container"""
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(b"SYNC\r\n")
+        stream = sock.makefile("rb")
+        header = stream.readline()
+        while header == b"\n":
+            header = stream.readline()
+        header = header.rstrip(b"\r\n")
+        if header.startswith(b"$EOF:"):
+            mark = header[5:]
+            data = b""
+            while not data.endswith(mark):
+                data += stream.read1(65536)
+            data = data[:-len(mark)]
+        else:
+            data = stream.read(int(header[1:]))
+    with open(path, "wb") as rdb_file:
+        rdb_file.write(data)
+
+
+def benchmark(task):
+    start_time = time.time()
+    result = task.execute()
+    elapsed_time = time.time() - start_time
+    return {"time": elapsed_time,
+            "keys_encountered": result["keys_encountered"],
+            "keys_per_second": result["keys_encountered"] / elapsed_time if elapsed_time > 0 else 0}
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark offline RDB analysis against a live key walk")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Redis Host")
+    parser.add_argument("--port", type=int, default=6379, help="Redis Port")
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Number of keys - Defaults to {}".format(str(DEFAULT_KEYS)))
+    parser.add_argument("--value_size", type=int, default=DEFAULT_VALUE_SIZE, help="Bytes per value - Defaults to {}".format(str(DEFAULT_VALUE_SIZE)))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    endpoints = [parse_endpoint("{}:{}".format(args.host, args.port))]
+    generate_keyspace(endpoints, args.keys, 100, 1.0, args.value_size, 0.5)
+    rdb_path = os.path.join(tempfile.mkdtemp(), "dump.rdb")
+    try:
+        fetch_rdb(rdb_path, args.host, args.port)
+        pattern = NAMESPACE + "*"
+        result = {"rdb_megabytes": os.path.getsize(rdb_path) / 1000000}
+        for no_ttl_only in (False, True):
+            live_result = benchmark(RedisVerify(args.host, args.port, False, None, False, pattern, no_ttl_only, False, throttle="none"))
+            rdb_result = benchmark(RedisRdb(rdb_path, pattern=pattern, no_ttl_only=no_ttl_only))
+            result["no_ttl_only" if no_ttl_only else "all_keys"] = {"live": live_result,
+                                                                    "rdb": rdb_result,
+                                                                    "speedup": live_result["time"] / rdb_result["time"]}
+        prefix_result = benchmark(RedisRdb(rdb_path, pattern=pattern, prefix_depth=3, ttl_buckets=True))
+        prefix_result["megabytes_per_second"] = result["rdb_megabytes"] / prefix_result["time"]
+        result["rdb_prefixes"] = prefix_result
+    finally:
+        os.remove(rdb_path)
+        os.rmdir(os.path.dirname(rdb_path))
+        clear_keyspace(endpoints)
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
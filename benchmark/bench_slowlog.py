@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Compare per-entry and columnar slowlog post-processing on synthetic slowlogs"""
+import pytz
+import random
+import time
+
+from argparse import ArgumentParser
+from datetime import datetime
+from pprint import pprint
+from redis_slowlog import RedisSlowlog, SlowlogColumns
+
+DEFAULT_ENTRIES = 1000000
+DEFAULT_NODES = 64
+# Slowlog of a busy node spans a few hours
+DEFAULT_TIME_SPAN = 4 * 3600
+START_TIME = 1627266629
+# Format of readable start times, as formatted per entry before SlowlogTimeFormatter
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S%z"
+
+
+def generate_slowlogs(entries, nodes, time_span, seed=0):
+    """Slowlogs keyed by host, in the form SLOWLOG GET returns for Cluster Mode"""
+    generator = random.Random(seed)
+    entries_per_node = entries // nodes
+    logs = {}
+    for node in range(nodes):
+        logs["10.10.1.{}:6379".format(node)] = [{"id": entry_id,
+                                                 "start_time": START_TIME + generator.randrange(time_span),
+                                                 "duration": generator.randrange(10000, 100000),
+                                                 "command": "HMGET state:{} state lock_expire_a".format(entry_id).encode()}
+                                                for entry_id in range(entries_per_node)]
+    return logs
+
+
+def copy_slowlogs(logs):
+    return {host: [dict(log) for log in slowlog_entries] for host, slowlog_entries in logs.items()}
+
+
+def benchmark_per_entry(logs):
+    """Processing of RedisSlowlog.execute before the columnar path"""
+    task = RedisSlowlog.__new__(RedisSlowlog)
+    start_time = time.time()
+    logs = task.cluster_mode_processing(logs)
+    for log in logs:
+        log["readable_start_time"] = (datetime.
+                                      utcfromtimestamp(int(log["start_time"])).
+                                      replace(tzinfo=pytz.utc).
+                                      strftime(DATETIME_FORMAT))
+        log["duration_in_microsec"] = log.pop("duration")
+        log["duration_in_millisec"] = int(log["duration_in_microsec"] / RedisSlowlog.MICROSECONDS_PER_MILLISECOND)
+    logs = task.parse_string_codec(logs)
+    sorted(logs, key=lambda x: x.get("start_time", ""), reverse=True)
+    return time.time() - start_time
+
+
+def benchmark_columnar(logs, materialize):
+    start_time = time.time()
+    columns = SlowlogColumns.from_logs(logs)
+    columns.sort()
+    columns.get_readable_start_times()
+    columns.get_durations_in_millisec()
+    if materialize:
+        list(columns.iter_rows())
+    return time.time() - start_time
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark per-entry against columnar slowlog post-processing")
+    parser.add_argument("--entries", type=int, default=DEFAULT_ENTRIES, help="Number of synthetic entries - Defaults to {}".format(str(DEFAULT_ENTRIES)))
+    parser.add_argument("--nodes", type=int, default=DEFAULT_NODES, help="Number of nodes the entries are spread over - Defaults to {}".format(str(DEFAULT_NODES)))
+    parser.add_argument("--time_span", type=int, default=DEFAULT_TIME_SPAN, help="Seconds the start times are spread over - Defaults to {}".format(str(DEFAULT_TIME_SPAN)))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    logs = generate_slowlogs(args.entries, args.nodes, args.time_span)
+    result = {"entries": args.entries,
+              "per_entry_time": benchmark_per_entry(copy_slowlogs(logs)),
+              "columnar_time": benchmark_columnar(logs, materialize=False),
+              "columnar_materialized_time": benchmark_columnar(logs, materialize=True)}
+    result["speedup"] = result["per_entry_time"] / result["columnar_time"]
+    result["materialized_speedup"] = result["per_entry_time"] / result["columnar_materialized_time"]
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
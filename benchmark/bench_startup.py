@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Measure interpreter startup of every subcommand with python -X importtime"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis_troubleshoot import SUBCOMMANDS
+
+DEFAULT_REPEAT = 10
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def get_import_time(module):
+    """Cumulative microseconds spent importing the module, as reported by -X importtime"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module)], cwd=SOURCE_DIRECTORY,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if fields[-1] == module:
+            return int(fields[1])
+    return None
+
+
+def get_startup_time(subcommand):
+    """Wall time of the entry point up to printing the help of the subcommand"""
+    start_time = time.time()
+    subprocess.run([sys.executable, "redis_troubleshoot.py", subcommand, "--help"], cwd=SOURCE_DIRECTORY,
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.time() - start_time
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Benchmark startup time of every subcommand")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per subcommand, the median is reported - Defaults to {}".format(str(DEFAULT_REPEAT)))
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    result = {}
+    for subcommand, (module, _) in SUBCOMMANDS.items():
+        result[subcommand] = {"import_time_in_microsec": statistics.median(get_import_time(module) for _ in range(args.repeat)),
+                              "startup_time": statistics.median(get_startup_time(subcommand) for _ in range(args.repeat))}
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""Asyncio counterpart of RedisCommon and the troubleshooting tasks,
+   driving many nodes and in-flight pipelines concurrently from a single thread"""
+import asyncio
+import re
+import time
+
+from redis.client import parse_info, parse_slowlog_get
+from redis.exceptions import ConnectionError, ResponseError
+from redis_common import RedisCommon
+from redis_info import filter_info_log
+from redis_sink import PLAIN, create_key_sink
+from redis_slowlog import RedisSlowlog, SlowlogTimeFormatter
+from redis_throttle import NO_THROTTLE
+
+
+class AsyncRedisConnection:
+    """Single RESP connection - commands sent concurrently are serialised by a lock.
+       The socket is opened and authenticated on first use, and dropped on any error so that
+       unread replies of a failed pipeline never answer the commands of the next one"""
+
+    def __init__(self, host, port, decode_responses=False, timeout=RedisCommon.DEFAULT_CONN_TIMEOUT, authentication=None):
+        self.host = host
+        self.port = int(port)
+        self.decode_responses = decode_responses
+        self.timeout = timeout
+        self.authentication = authentication
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        """To be called holding the lock, so that concurrent first commands share a single authenticated socket"""
+        if self.writer is not None:
+            return
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        if self.authentication:
+            self.writer.write(self.encode_command(("AUTH", self.authentication)))
+            await self.writer.drain()
+            response = await asyncio.wait_for(self.read_response(), self.timeout)
+            if isinstance(response, ResponseError):
+                raise response
+
+    def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader, self.writer = None, None
+
+    async def close(self):
+        async with self.lock:
+            if self.writer is not None:
+                writer = self.writer
+                self.disconnect()
+                await writer.wait_closed()
+
+    @staticmethod
+    def encode_command(args):
+        pieces = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            pieces.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(pieces)
+
+    def decode(self, value):
+        return value.decode("utf-8", errors="replace") if self.decode_responses else value
+
+    async def read_response(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by {}:{}".format(self.host, self.port))
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return self.decode(payload)
+        elif prefix == b"-":
+            # Returned rather than raised so that the remaining pipeline replies are still read
+            return ResponseError(payload.decode("utf-8", errors="replace"))
+        elif prefix == b":":
+            return int(payload)
+        elif prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            return self.decode((await self.reader.readexactly(length + 2))[:-2])
+        elif prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self.read_response() for _ in range(length)]
+        raise ConnectionError("Unexpected reply {!r} from {}:{}".format(line, self.host, self.port))
+
+    async def read_responses(self, count):
+        return [await self.read_response() for _ in range(count)]
+
+    async def execute_pipeline(self, commands):
+        """Send every command in a single write and read back all replies, within the timeout"""
+        async with self.lock:
+            try:
+                await self.connect()
+                self.writer.write(b"".join(self.encode_command(command) for command in commands))
+                await self.writer.drain()
+                responses = await asyncio.wait_for(self.read_responses(len(commands)), self.timeout)
+            except BaseException:
+                # Includes timeouts and cancellation, either of which may leave replies unread
+                self.disconnect()
+                raise
+        for response in responses:
+            if isinstance(response, ResponseError):
+                raise response
+        return responses
+
+    async def execute_command(self, *args):
+        return (await self.execute_pipeline([args]))[0]
+
+
+class AsyncRedisCommon:
+    DEFAULT_PORT = RedisCommon.DEFAULT_PORT
+    DEFAULT_CONN_TIMEOUT = RedisCommon.DEFAULT_CONN_TIMEOUT
+
+    def __init__(self, host, port=DEFAULT_PORT, cluster_mode=None, authentication=None, decode_responses=True):
+        if cluster_mode not in (True, False, None):
+            raise ValueError("Expect Boolean value for cluster_mode")
+        self.__host = host
+        self.__port = port
+        self.__is_cluster = bool(cluster_mode)
+        self.__authentication = authentication
+        self.__decode_responses = decode_responses
+        self.__connections = {}
+
+    @property
+    def host(self):
+        """Getter method for host name"""
+        return self.__host
+
+    @property
+    def port(self):
+        """Getter method for port"""
+        return self.__port
+
+    @property
+    def name(self):
+        """Getter method for node name in host:port form"""
+        return "{}:{}".format(self.host, self.port)
+
+    @property
+    def is_cluster(self):
+        return self.__is_cluster
+
+    async def get_node_connection(self, node):
+        """Connections are opened once per node and reused for every later command"""
+        connection = self.__connections.get(node["name"])
+        if connection is None:
+            connection = AsyncRedisConnection(node["host"], node["port"], self.__decode_responses, self.DEFAULT_CONN_TIMEOUT,
+                                              self.__authentication)
+            self.__connections[node["name"]] = connection
+        return connection
+
+    async def get_nodes(self, masters_only=True):
+        """List node(s) as dictionaries with host, port and name - from CLUSTER NODES in cluster mode"""
+        own_node = {"host": self.host, "port": int(self.port), "name": self.name}
+        if not self.is_cluster:
+            return [own_node]
+        connection = await self.get_node_connection(own_node)
+        cluster_nodes = await connection.execute_command("CLUSTER", "NODES")
+        if isinstance(cluster_nodes, bytes):
+            cluster_nodes = cluster_nodes.decode("utf-8")
+        nodes = []
+        for line in cluster_nodes.splitlines():
+            fields = line.split()
+            flags = fields[2].split(",")
+            if "fail" in flags or (masters_only and "master" not in flags):
+                continue
+            address = fields[1].split("@")[0]
+            host, port = address.rsplit(":", 1)
+            host = host or self.host
+            nodes.append({"host": host, "port": int(port), "name": "{}:{}".format(host, port)})
+        return nodes
+
+    async def get_master_nodes(self):
+        return await self.get_nodes(masters_only=True)
+
+    async def run_on_nodes(self, coroutine_function, nodes):
+        """Run coroutine_function(node, connection) against every node concurrently, keyed by node name"""
+        connections = [await self.get_node_connection(node) for node in nodes]
+        results = await asyncio.gather(*[coroutine_function(node, connection) for node, connection in zip(nodes, connections)])
+        return {node["name"]: result for node, result in zip(nodes, results)}
+
+    async def close(self):
+        for connection in self.__connections.values():
+            await connection.close()
+        self.__connections = {}
+
+
+class AsyncRedisInfo(AsyncRedisCommon):
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, filter_keys=None):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses)
+        self.cluster_mode = cluster_mode
+        self.filter_keys = re.compile(filter_keys) if filter_keys is not None else None
+
+    def filter_info_log(self, log):
+        return filter_info_log(log, self.filter_keys, self.cluster_mode)
+
+    async def get_info_log(self):
+        async def get_node_info(node, connection):
+            response = await connection.execute_command("INFO")
+            return parse_info(response)
+        logs = await self.run_on_nodes(get_node_info, await self.get_nodes(masters_only=False))
+        return logs if self.cluster_mode else logs[self.name]
+
+    async def execute(self):
+        logs = await self.get_info_log()
+        return self.filter_info_log(logs)
+
+
+class AsyncRedisSlowlog(AsyncRedisCommon):
+    MICROSECONDS_PER_MILLISECOND = RedisSlowlog.MICROSECONDS_PER_MILLISECOND
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, entries=None):
+        super().__init__(host, port, cluster_mode, authentication, False)
+        self.cluster_mode = cluster_mode
+        self.entries = entries
+        self.time_formatter = SlowlogTimeFormatter()
+
+    cluster_mode_processing = RedisSlowlog.cluster_mode_processing
+    append_logs = RedisSlowlog.append_logs
+    parse_string_codec = RedisSlowlog.parse_string_codec
+    get_columns = RedisSlowlog.get_columns
+
+    async def get_slowlogs(self):
+        async def get_node_slowlog(node, connection):
+            args = ["SLOWLOG", "GET"] if self.entries is None else ["SLOWLOG", "GET", self.entries]
+            return parse_slowlog_get(await connection.execute_command(*args))
+        logs = await self.run_on_nodes(get_node_slowlog, await self.get_nodes(masters_only=False))
+        return logs if self.cluster_mode else logs[self.name]
+
+    async def execute(self):
+        logs = await self.get_slowlogs()
+        return list(self.get_columns(logs).iter_rows())
+
+
+class AsyncRedisScan(AsyncRedisCommon):
+    """Matched keys go to a key sink as with RedisScan. Throttling and checkpoints are not supported,
+       as pacing a single event loop and resuming many nodes are left to the synchronous tasks"""
+    NO_TTL_SET = -1
+    DEFAULT_COUNT = 1000
+
+    WILDCARD = "*"
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys,
+                 output_keys=None, output_format=PLAIN, compress_output=False, throttle=NO_THROTTLE, checkpoint=None):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses)
+        if throttle != NO_THROTTLE:
+            raise ValueError("Throttle {} is not supported by the asyncio engine, only {}".format(throttle, NO_THROTTLE))
+        if checkpoint is not None:
+            raise ValueError("Checkpoints are not supported by the asyncio engine")
+        self.pattern = pattern
+        self.no_ttl_only = no_ttl_only
+        self.print_keys = print_keys
+        self.output_keys = output_keys
+        self.output_format = output_format
+        self.compress_output = compress_output
+        self.key_sink = None
+
+    def create_key_sink(self):
+        return create_key_sink(self.print_keys, self.output_keys, self.output_format, self.compress_output)
+
+    async def scan_node_pages(self, connection):
+        """SCAN a node page by page with an explicit cursor"""
+        cursor = 0
+        while True:
+            cursor, keys = await connection.execute_command("SCAN", cursor, "MATCH", self.pattern, "COUNT", self.DEFAULT_COUNT)
+            yield keys
+            if int(cursor) == 0:
+                break
+
+    async def get_keys_without_ttl(self, connection, keys):
+        ttls = await connection.execute_pipeline([("TTL", key_value) for key_value in keys])
+        return [key_value for key_value, ttl in zip(keys, ttls) if ttl == self.NO_TTL_SET]
+
+    async def get_key_node(self):
+        """Node serving the key - follows a MOVED redirection in cluster mode"""
+        node = {"host": self.host, "port": int(self.port), "name": self.name}
+        if not self.is_cluster:
+            return node
+        connection = await self.get_node_connection(node)
+        try:
+            await connection.execute_command("TYPE", self.pattern)
+        except ResponseError as error:
+            if not str(error).startswith("MOVED"):
+                raise
+            host, port = str(error).split()[2].rsplit(":", 1)
+            node = {"host": host, "port": int(port), "name": "{}:{}".format(host, port)}
+        return node
+
+    async def scan_nodes(self, node_coroutine_function):
+        start_time = time.time()
+        self.key_sink = self.create_key_sink()
+        try:
+            node_results = await self.run_on_nodes(node_coroutine_function, await self.get_master_nodes())
+        finally:
+            self.key_sink.close()
+        result = {"nodes": node_results}
+        for node_result in node_results.values():
+            for key, value in node_result.items():
+                result[key] = result.get(key, 0) + value
+        result.update(self.key_sink.get_statistics())
+        total_time = time.time() - start_time
+        result.update({"total_time": total_time,
+                       "sleep_time": 0,
+                       "execution_time": total_time,
+                       "pattern": self.pattern,
+                       "no_ttl_only": self.no_ttl_only})
+        return result
+
+
+class AsyncRedisVerify(AsyncRedisScan):
+    async def verify_pattern_node(self, node, connection):
+        keys_encountered = 0
+        async for keys in self.scan_node_pages(connection):
+            if self.no_ttl_only and keys:
+                keys = await self.get_keys_without_ttl(connection, keys)
+            keys_encountered += len(keys)
+            self.key_sink.write(keys, node["name"])
+        return {"keys_encountered": keys_encountered}
+
+    async def verify_single(self):
+        start_time = time.time()
+        node = await self.get_key_node()
+        connection = await self.get_node_connection(node)
+        keys_encountered, ttl = await connection.execute_pipeline([("EXISTS", self.pattern), ("TTL", self.pattern)])
+        if self.no_ttl_only and ttl != self.NO_TTL_SET:
+            keys_encountered = 0
+        key_sink = self.create_key_sink()
+        try:
+            key_sink.write([self.pattern] if keys_encountered else [], node["name"])
+        finally:
+            key_sink.close()
+        total_time = time.time() - start_time
+        result = {"total_time": total_time,
+                  "sleep_time": 0,
+                  "execution_time": total_time,
+                  "keys_encountered": keys_encountered,
+                  "pattern": self.pattern,
+                  "no_ttl_only": self.no_ttl_only}
+        result.update(key_sink.get_statistics())
+        return result
+
+    async def execute(self):
+        if self.WILDCARD not in self.pattern:
+            return await self.verify_single()
+        return await self.scan_nodes(self.verify_pattern_node)
+
+
+class AsyncRedisExpire(AsyncRedisScan):
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, ttl, print_keys,
+                 output_keys=None, output_format=PLAIN, compress_output=False, throttle=NO_THROTTLE, checkpoint=None):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys,
+                         output_keys, output_format, compress_output, throttle, checkpoint)
+        self.ttl = ttl
+
+    async def set_ttl_pattern_node(self, node, connection):
+        keys_deleted = 0
+        keys_scanned = 0
+        async for keys in self.scan_node_pages(connection):
+            keys_scanned += len(keys)
+            if self.no_ttl_only and keys:
+                keys = await self.get_keys_without_ttl(connection, keys)
+            if keys:
+                await connection.execute_pipeline([("EXPIRE", key_value, self.ttl) for key_value in keys])
+            keys_deleted += len(keys)
+            self.key_sink.write(keys, node["name"])
+        return {"keys_deleted": keys_deleted,
+                "keys_scanned": keys_scanned}
+
+    async def set_ttl_single(self):
+        start_time = time.time()
+        node = await self.get_key_node()
+        connection = await self.get_node_connection(node)
+        keys_deleted, ttl = await connection.execute_pipeline([("EXISTS", self.pattern), ("TTL", self.pattern)])
+        if self.no_ttl_only and ttl != self.NO_TTL_SET:
+            keys_deleted = 0
+        if keys_deleted:
+            await connection.execute_command("EXPIRE", self.pattern, self.ttl)
+        key_sink = self.create_key_sink()
+        try:
+            key_sink.write([self.pattern] if keys_deleted else [], node["name"])
+        finally:
+            key_sink.close()
+        total_time = time.time() - start_time
+        result = {"total_time": total_time,
+                  "sleep_time": 0,
+                  "execution_time": total_time,
+                  "keys_deleted": keys_deleted,
+                  "pattern": self.pattern,
+                  "ttl": self.ttl,
+                  "no_ttl_only": self.no_ttl_only}
+        result.update(key_sink.get_statistics())
+        return result
+
+    async def execute(self):
+        if self.WILDCARD not in self.pattern:
+            return await self.set_ttl_single()
+        result = await self.scan_nodes(self.set_ttl_pattern_node)
+        result["ttl"] = self.ttl
+        return result
+
+
+class AsyncRedisFlushall(AsyncRedisCommon):
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, flushall, asynchronous):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses)
+        self.flushall = flushall
+        self.asynchronous = asynchronous
+
+    async def execute(self):
+        if not self.flushall:
+            return {}
+        args = ["FLUSHALL", "ASYNC"] if self.asynchronous else ["FLUSHALL"]
+
+        async def flushall_node(node, connection):
+            start_time = time.time()
+            await connection.execute_command(*args)
+            return time.time() - start_time
+        return await self.run_on_nodes(flushall_node, await self.get_master_nodes())
+
+
+async def execute_concurrently(tasks):
+    """Execute many async tasks at once, e.g. AsyncRedisInfo for every instance of a fleet"""
+    try:
+        return await asyncio.gather(*[task.execute() for task in tasks])
+    finally:
+        for task in tasks:
+            await task.close()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Persist SCAN cursor and running statistics of every node,
+   so that an interrupted key walk can resume where it stopped"""
+import json
+import os
+import threading
+import time
+
+
+class RedisCheckpoint:
+    DEFAULT_INTERVAL = 10
+
+    def __init__(self, path=None, resume=False, identity=None, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.identity = identity or {}
+        self.interval = interval
+        self.nodes = {}
+        self.resumed = False
+        self.last_save = time.time()
+        self.lock = threading.Lock()
+        if path is not None and resume and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint.get("identity") != self.identity:
+            raise ValueError("Checkpoint {} was written for {}, not {}".format(self.path, checkpoint.get("identity"), self.identity))
+        self.nodes = checkpoint.get("nodes", {})
+        self.resumed = True
+
+    def get_cursor(self, node_name):
+        return self.nodes.get(node_name, {}).get("cursor", 0)
+
+    def is_complete(self, node_name):
+        return self.nodes.get(node_name, {}).get("complete", False)
+
+    def get_statistics(self, node_name, default_statistics):
+        """Running statistics of a node, restored from the checkpoint when resuming"""
+        statistics = dict(default_statistics)
+        statistics.update(self.nodes.get(node_name, {}).get("statistics", {}))
+        return statistics
+
+    def update(self, node_name, cursor, statistics, complete=False):
+        """Record that every key up to the cursor has been processed, writing the file at most once per interval"""
+        with self.lock:
+            self.nodes[node_name] = {"cursor": cursor,
+                                     "complete": complete,
+                                     "statistics": dict(statistics)}
+            if time.time() - self.last_save >= self.interval:
+                self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        checkpoint = {"identity": self.identity,
+                      "nodes": self.nodes}
+        # Write to a temporary file first so that a crash never leaves a truncated checkpoint
+        temporary_path = "{}.tmp".format(self.path)
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temporary_path, self.path)
+        self.last_save = time.time()
@@ -1,41 +1,147 @@
 # -*- coding: utf-8 -*-
-from redis import Redis
-from rediscluster import RedisCluster
+import threading
 
+from redis import BlockingConnectionPool, ConnectionPool, Redis
+from redis_metrics import JSON, InstrumentedConnection, InstrumentedRedis, RedisMetrics
 
-class RedisCommon:
-    DEFAULT_PORT = 6379
-    DEFAULT_MAX_CONNECTION = 10
+PRIMARY = "primary"
+REPLICA_PREFERRED = "replica_preferred"
+REPLICA = "replica"
+READ_PREFERENCES = (PRIMARY, REPLICA_PREFERRED, REPLICA)
+# Replicas acknowledge their offset once per second, so a lag of 1 is the norm
+DEFAULT_MAX_REPLICATION_LAG = 2
+
+
+class ReadOnlyConnection(InstrumentedConnection):
+    """Connection serving keyed reads from a cluster replica, rather than being redirected to its master"""
+
+    def on_connect(self):
+        super().on_connect()
+        self.send_command("READONLY")
+        if self.read_response() not in (b"OK", "OK"):
+            raise ConnectionError("READONLY failed on {}:{}".format(self.host, self.port))
+
+
+class RedisPoolRegistry:
+    """Connection pools and cluster clients shared by every task of the process, keyed by endpoint and credentials,
+       so that tasks run one after another reuse sockets and the cluster slot discovery"""
     DEFAULT_CONN_TIMEOUT = 10
+    # Time a caller waits for a connection of a bounded pool to be released
+    DEFAULT_POOL_TIMEOUT = 20
 
-    SECONDS_PER_MINUTE = 60
+    def __init__(self):
+        self.pools = {}
+        self.cluster_clients = {}
+        self.lock = threading.Lock()
+        self.statistics = {"pool_hits": 0,
+                           "pool_creations": 0,
+                           "cluster_client_hits": 0,
+                           "cluster_client_creations": 0}
 
-    def __init__(self, host, port=DEFAULT_PORT, cluster_mode=None, authentication=None, decode_responses=True):
-        # Begin initialising for Redis Client
-        if not cluster_mode:
-            redis_client_args = {
+    def get_pool(self, host, port, authentication=None, decode_responses=False, max_connections=None, readonly=False):
+        """Unbounded by default - with max_connections, callers wait for a free connection rather than fail"""
+        key = (host, int(port), authentication, decode_responses, max_connections, readonly)
+        with self.lock:
+            if key in self.pools:
+                self.statistics["pool_hits"] += 1
+                return self.pools[key]
+            pool_args = {
                 "host": host,
                 "port": port,
-                "socket_connect_timeout": self.DEFAULT_CONN_TIMEOUT
+                "password": authentication,
+                "decode_responses": decode_responses,
+                "socket_connect_timeout": self.DEFAULT_CONN_TIMEOUT,
+                # Counts bytes per request, only reported by instrumented clients
+                "connection_class": ReadOnlyConnection if readonly else InstrumentedConnection
             }
-            self.__redis_client = Redis(**redis_client_args)
-        elif cluster_mode:
+            if max_connections is None:
+                pool = ConnectionPool(**pool_args)
+            else:
+                pool = BlockingConnectionPool(max_connections=max_connections, timeout=self.DEFAULT_POOL_TIMEOUT, **pool_args)
+            self.pools[key] = pool
+            self.statistics["pool_creations"] += 1
+            return pool
+
+    def get_client(self, host, port, authentication=None, decode_responses=False, max_connections=None, metrics=None,
+                   readonly=False):
+        """Clients are cheap, the pool underneath is what is shared - with metrics, the client records every request"""
+        pool = self.get_pool(host, port, authentication, decode_responses, max_connections, readonly)
+        if metrics is not None:
+            return InstrumentedRedis(connection_pool=pool, metrics=metrics)
+        return Redis(connection_pool=pool)
+
+    def get_cluster_client(self, host, port, authentication=None, decode_responses=True, max_connections=None):
+        key = (host, int(port), authentication, decode_responses, max_connections)
+        with self.lock:
+            if key in self.cluster_clients:
+                self.statistics["cluster_client_hits"] += 1
+                return self.cluster_clients[key]
+            # Only cluster mode pays for importing rediscluster
+            from rediscluster import RedisCluster
             redis_client_args = {
                 "startup_nodes": [{"host": host, "port": port}],
+                "password": authentication,
                 "decode_responses": decode_responses,
-                "max_connections": self.DEFAULT_MAX_CONNECTION,
+                "max_connections": max_connections,
                 "socket_connect_timeout": self.DEFAULT_CONN_TIMEOUT,
                 "skip_full_coverage_check": True
             }
-            self.__redis_client = RedisCluster(**redis_client_args)
-        else:
-            raise ValueError("Expect Boolean value for cluster_mode")
-        # Create pipeline
-        self.__redis_pipeline = self.get_redis_client().pipeline()
+            cluster_client = RedisCluster(**redis_client_args)
+            self.cluster_clients[key] = cluster_client
+            self.statistics["cluster_client_creations"] += 1
+            return cluster_client
+
+    def get_statistics(self):
+        with self.lock:
+            statistics = dict(self.statistics)
+            statistics.update({"pools": len(self.pools),
+                               "cluster_clients": len(self.cluster_clients)})
+            return statistics
+
+    def clear(self):
+        """Disconnect and forget every pool and cluster client"""
+        with self.lock:
+            for pool in self.pools.values():
+                pool.disconnect()
+            for cluster_client in self.cluster_clients.values():
+                cluster_client.connection_pool.disconnect()
+            self.pools.clear()
+            self.cluster_clients.clear()
+
+
+POOL_REGISTRY = RedisPoolRegistry()
+
+
+class RedisCommon:
+    DEFAULT_PORT = 6379
+    DEFAULT_MAX_CONNECTION = 10
+    DEFAULT_CONN_TIMEOUT = RedisPoolRegistry.DEFAULT_CONN_TIMEOUT
+
+    SECONDS_PER_MINUTE = 60
+
+    pool_registry = POOL_REGISTRY
+
+    def __init__(self, host, port=DEFAULT_PORT, cluster_mode=None, authentication=None, decode_responses=True,
+                 max_connections=None, read_preference=PRIMARY, max_replication_lag=DEFAULT_MAX_REPLICATION_LAG):
+        if read_preference not in READ_PREFERENCES:
+            raise ValueError("Expect read preference to be one of {}".format(", ".join(READ_PREFERENCES)))
+        # Client and pipeline are only built on first use
+        self.__redis_client = None
+        self.__redis_pipeline = None
         # Initialise remaining variables
         self.__host = host
-        self.__port = port
+        # Some task CLIs leave --port without default
+        self.__port = port if port is not None else self.DEFAULT_PORT
         self.__is_cluster = cluster_mode
+        self.__authentication = authentication
+        self.__decode_responses = decode_responses
+        self.__max_connections = max_connections
+        # Where read-only key walks go, and how far behind a replica may be to serve them
+        self.read_preference = read_preference
+        self.max_replication_lag = max_replication_lag
+        self.metrics = None
+        # cProfile profilers of the current run, one per thread, only when profiling
+        self.profilers = None
 
     @property
     def host(self):
@@ -47,12 +153,153 @@ class RedisCommon:
         """Getter method for port"""
         return self.__port
 
+    @property
+    def name(self):
+        """Getter method for node name in host:port form"""
+        return "{}:{}".format(self.host, self.port)
+
     @property
     def is_cluster(self):
         return self.__is_cluster
 
+    @property
+    def redis_client(self):
+        return self.get_redis_client()
+
+    @property
+    def redis_pipeline(self):
+        return self.get_redis_pipeline()
+
     def get_redis_client(self):
+        if self.__redis_client is None:
+            if self.is_cluster:
+                # Cluster client bounds connections per node, defaulting to the historical limit
+                max_connections = self.__max_connections or self.DEFAULT_MAX_CONNECTION
+                self.__redis_client = self.pool_registry.get_cluster_client(self.host, self.port, self.__authentication,
+                                                                            self.__decode_responses, max_connections)
+            else:
+                self.__redis_client = self.pool_registry.get_client(self.host, self.port, self.__authentication,
+                                                                    max_connections=self.__max_connections, metrics=self.metrics)
         return self.__redis_client
 
     def get_redis_pipeline(self):
+        if self.__redis_pipeline is None:
+            self.__redis_pipeline = self.get_redis_client().pipeline()
         return self.__redis_pipeline
+
+    def get_pool_statistics(self):
+        return self.pool_registry.get_statistics()
+
+    def get_master_nodes(self):
+        """List master node(s) as dictionaries with host, port and name"""
+        if not self.is_cluster:
+            return [{"host": self.host, "port": self.port, "name": self.name}]
+        return [{"host": node["host"], "port": node["port"], "name": node["name"]}
+                for node in self.get_redis_client().connection_pool.nodes.all_masters()]
+
+    def get_all_nodes(self):
+        """List master and replica node(s) as dictionaries with host, port and name"""
+        if not self.is_cluster:
+            return self.get_master_nodes()
+        return [{"host": node["host"], "port": node["port"], "name": node["name"]}
+                for node in self.get_redis_client().connection_pool.nodes.all_nodes()]
+
+    @staticmethod
+    def get_server_version(node_client):
+        """Redis version of the node as a tuple of integers, e.g. (6, 2, 14)"""
+        return tuple(int(part) for part in str(node_client.info("server")["redis_version"]).split("."))
+
+    def get_node_client(self, node, readonly=False):
+        """Client bound to a single node - standalone mode reuses the existing client for its own node.
+           With readonly, a cluster replica serves keyed reads itself"""
+        if not self.is_cluster and node["name"] == self.name:
+            return self.get_redis_client()
+        # Match the decoding behaviour of the client of the task
+        return self.pool_registry.get_client(node["host"], node["port"], self.__authentication,
+                                             self.is_cluster and self.__decode_responses, self.__max_connections, self.metrics,
+                                             readonly and self.is_cluster)
+
+    @staticmethod
+    def get_replica_nodes(node_client):
+        """Replica(s) of a master as reported by its INFO replication, with their state and lag in seconds"""
+        replication = node_client.info("replication")
+        replicas = []
+        for index in range(int(replication.get("connected_slaves", 0))):
+            replica = replication.get("slave{}".format(index))
+            if not isinstance(replica, dict):
+                continue
+            replicas.append({"host": replica["ip"],
+                             "port": int(replica["port"]),
+                             "name": "{}:{}".format(replica["ip"], replica["port"]),
+                             "state": replica.get("state"),
+                             "lag": int(replica.get("lag", 0))})
+        return replicas
+
+    def get_read_node(self, node, node_client, preferred=None):
+        """Node the reads of a master go to according to the read preference - the least lagging online replica
+           within max_replication_lag, checked when picked. A preferred node, e.g. the one a checkpointed cursor
+           was taken on, is kept as long as it remains eligible"""
+        if self.read_preference == PRIMARY or preferred == node["name"]:
+            return node
+        replicas = [replica for replica in self.get_replica_nodes(node_client)
+                    if replica["state"] == "online" and replica["lag"] <= self.max_replication_lag]
+        if preferred is not None:
+            for replica in replicas:
+                if replica["name"] == preferred:
+                    return replica
+            raise ValueError("Cursor of {} was taken on {}, which is no longer within {}s of replication lag".format(
+                node["name"], preferred, self.max_replication_lag))
+        if replicas:
+            return min(replicas, key=lambda x: x["lag"])
+        if self.read_preference == REPLICA:
+            raise ConnectionError("No replica of {} within {}s of replication lag".format(node["name"], self.max_replication_lag))
+        return node
+
+    def create_profiler(self):
+        """Enabled profiler for the calling thread when profiling, as cProfile only follows the thread enabling it"""
+        if self.profilers is None:
+            return None
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # From Python 3.12 only a single profiler can be active at a time across threads
+            return None
+        self.profilers.append(profiler)
+        return profiler
+
+    def dump_profile(self, profile):
+        """Statistics of every thread of the run, merged into a single file"""
+        import pstats
+        statistics = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            statistics.add(profiler)
+        statistics.dump_stats(profile)
+        self.profilers = None
+
+    def run(self, metrics=False, metrics_output=None, metrics_format=JSON, profile=None):
+        """execute() with optional instrumentation - metrics are attached to a dict result and / or written
+           to metrics_output, and cProfile statistics dumped to profile.
+           Requests of a cluster client itself are not instrumented, those of the node clients are"""
+        if metrics or metrics_output is not None:
+            self.metrics = RedisMetrics()
+            # Clients built before are not instrumented
+            self.__redis_client = None
+            self.__redis_pipeline = None
+        if profile is not None:
+            self.profilers = []
+        profiler = self.create_profiler()
+        try:
+            result = self.execute()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.dump_profile(profile)
+        if self.metrics is not None:
+            self.metrics.stop()
+            if metrics and isinstance(result, dict):
+                result["metrics"] = self.metrics.get_statistics()
+            if metrics_output is not None:
+                self.metrics.write(metrics_output, metrics_format, {"task": type(self).__name__, "endpoint": self.name})
+        return result
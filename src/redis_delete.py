@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis.exceptions import ResponseError
+from redis_common import DEFAULT_MAX_REPLICATION_LAG, PRIMARY, READ_PREFERENCES, RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_filter import add_filter_arguments, pop_filter_arguments
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
+from redis_scan import RedisScan
+from redis_sink import OUTPUT_FORMATS, PLAIN, STDOUT
+from redis_throttle import DEFAULT_OPS_PER_SEC, FIXED, THROTTLE_MODES
+from redis_tuner import AutoBatchTuner
+
+DEFAULT_REDIS_PORT = 6379
+
+
+class RedisDelete(RedisScan):
+    """Delete keys by pattern right away, rather than leaving them to expiry as RedisExpire does"""
+    # UNLINK frees large values in a background thread, but only exists from Redis 4.0
+    UNLINK_VERSION = (4, 0)
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys,
+                 dry_run=False, **kwargs):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys, **kwargs)
+        # Argument for deleting keys
+        self.dry_run = dry_run
+
+    def get_delete_command(self, node_client):
+        return "UNLINK" if self.get_server_version(node_client) >= self.UNLINK_VERSION else "DEL"
+
+    def delete_pattern_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_scanned": 0,
+                                                     "keys_matched": 0,
+                                                     "keys_deleted": 0})
+        # SCAN and TTL may go to a replica, deletes always go to the master
+        read_client = self.get_read_client(node, node_client, statistics)
+        keys_pending = 0
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        delete_command = self.get_delete_command(node_client)
+        node_pipeline = node_client.pipeline(transaction=False)
+        for cursor, keys, keys_scanned in self.match_node_pages(node, read_client, throttle, tuner):
+            statistics["keys_scanned"] += keys_scanned
+            if self.no_ttl_only and keys:
+                keys = self.get_keys_without_ttl(read_client, keys)
+            statistics["keys_matched"] += len(keys)
+            self.write_keys(keys, node)
+            if not self.dry_run:
+                for key_value in keys:
+                    node_pipeline.execute_command(delete_command, key_value)
+                keys_pending += len(keys)
+            if keys_pending >= tuner.pipeline_batch:
+                flush_start = time.time()
+                # Keys deleted concurrently by someone else are not counted
+                statistics["keys_deleted"] += sum(node_pipeline.execute())
+                tuner.record_flush(time.time() - flush_start, keys_pending)
+                keys_pending = 0
+            # Cursor can only be checkpointed once every key before it has been deleted
+            if keys_pending == 0:
+                self.update_checkpoint(node, cursor, statistics)
+        statistics["keys_deleted"] += sum(node_pipeline.execute())
+        self.update_checkpoint(node, 0, statistics)
+        result = dict(statistics)
+        result["delete_command"] = delete_command
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def delete_pattern(self):
+        start_time = time.time()
+        result = self.scan_nodes(self.delete_pattern_node)
+        end_time = time.time()
+        # Calculate statistics
+        total_time = end_time - start_time
+        execution_time = total_time - result["sleep_time"]
+        result.update({"total_time": total_time,
+                       "execution_time": execution_time,
+                       "effective_rate": result["operations"] / total_time if total_time > 0 else 0,
+                       "keys_per_second": result["keys_scanned"] / execution_time if execution_time > 0 else 0,
+                       "pattern": self.pattern,
+                       "no_ttl_only": self.no_ttl_only,
+                       "dry_run": self.dry_run})
+        return result
+
+    def delete_single(self):
+        start_time = time.time()
+        keys = [self.pattern] if self.redis_client.exists(self.pattern) else []
+        if keys and self.no_ttl_only and self.redis_client.ttl(self.pattern) != self.NO_TTL_SET:
+            keys = []
+        keys_deleted = 0
+        if keys and not self.dry_run:
+            try:
+                keys_deleted = self.redis_client.unlink(self.pattern)
+            except ResponseError:
+                # Server older than Redis 4.0
+                keys_deleted = self.redis_client.delete(self.pattern)
+        end_time = time.time()
+        # Calculate statistics
+        total_time = end_time - start_time
+        result = {"total_time": total_time,
+                  "sleep_time": 0,
+                  "execution_time": total_time,
+                  "keys_matched": len(keys),
+                  "keys_deleted": keys_deleted,
+                  "pattern": self.pattern,
+                  "no_ttl_only": self.no_ttl_only,
+                  "dry_run": self.dry_run}
+        if self.print_keys:
+            result["keys"] = keys
+        return result
+
+    def execute(self):
+        if self.WILDCARD in self.pattern:
+            return self.delete_pattern()
+        else:
+            return self.delete_single()
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Script to delete keys by pattern in Redis instances")
+    parser.add_argument("--host", type=str, required=True, help="Redis Host")
+    parser.add_argument("--port", type=int, default=DEFAULT_REDIS_PORT, help="Redis Port - Defaults to {}".format(str(DEFAULT_REDIS_PORT)))
+    parser.add_argument("--authentication", type=str, help="Authentication required for Redis")
+    parser.add_argument("--pattern", type=str, required=True, help="Pattern of keys to delete")
+    parser.add_argument("--no_ttl_only", action="store_true", help="Delete only keys without TTL")
+    parser.add_argument("--dry_run", action="store_true", help="Only report the key(s) that would be deleted")
+    parser.add_argument("--print_keys", action="store_true", required=False, help="Print key(s)")
+    parser.add_argument("--max_connections", type=int,
+                        help="Connections per node pool, waiting for a free connection beyond it - Defaults to unbounded, {} per cluster client".format(str(RedisCommon.DEFAULT_MAX_CONNECTION)))
+    parser.add_argument("--read_preference", type=str, choices=READ_PREFERENCES, default=PRIMARY, required=False,
+                        help="Node(s) SCAN and TTL / TYPE reads go to, writes always going to the master - Defaults to {}".format(PRIMARY))
+    parser.add_argument("--max_replication_lag", type=int, default=DEFAULT_MAX_REPLICATION_LAG, required=False,
+                        help="Seconds since a replica last acknowledged its master beyond which it is not read from - Defaults to {}".format(str(DEFAULT_MAX_REPLICATION_LAG)))
+    parser.add_argument("--concurrency", type=int, default=RedisNodeExecutor.DEFAULT_CONCURRENCY,
+                        help="Number of master nodes scanned concurrently - Defaults to {}".format(str(RedisNodeExecutor.DEFAULT_CONCURRENCY)))
+    parser.add_argument("--output_keys", type=str,
+                        help="Stream matched key(s) to this file as they are found, {} for stdout".format(STDOUT))
+    parser.add_argument("--output_format", type=str, choices=OUTPUT_FORMATS, default=PLAIN,
+                        help="Format of key(s) streamed by --output_keys")
+    parser.add_argument("--compress_output", action="store_true", help="Gzip key(s) streamed by --output_keys")
+    parser.add_argument("--checkpoint", type=str, help="File to periodically persist SCAN cursor(s) and statistics to")
+    parser.add_argument("--resume", action="store_true", help="Resume from the cursor(s) persisted in --checkpoint")
+    parser.add_argument("--auto_tune", action="store_true", help="Tune SCAN COUNT and pipeline batch size to --target_latency")
+    parser.add_argument("--target_latency", type=float, default=AutoBatchTuner.DEFAULT_TARGET_LATENCY,
+                        help="Target seconds per SCAN page and per pipeline flush when auto tuning")
+    parser.add_argument("--throttle", type=str, choices=THROTTLE_MODES, default=FIXED,
+                        help="Throttle pacing each node - Defaults to {}".format(FIXED))
+    parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC,
+                        help="Target keys per second per node for token_bucket / feedback throttle - Defaults to {}".format(str(DEFAULT_OPS_PER_SEC)))
+    # Check if cluster mode or not
+    cluster_mode_group = parser.add_mutually_exclusive_group(required=True)
+    cluster_mode_group.add_argument("--cluster_mode_enabled",
+                                    action="store_true",
+                                    dest="cluster_mode",
+                                    help="Indicate that Redis instance is cluster mode enabled")
+    cluster_mode_group.add_argument("--cluster_mode_disabled",
+                                    action="store_false",
+                                    dest="cluster_mode",
+                                    help="Indicate that Redis instance is cluster mode disabled")
+    parser.add_argument("--decode_responses", type=bool, default=False, help="Decode responses from Redis")
+    add_filter_arguments(parser)
+    add_instrumentation_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    instrumentation = pop_instrumentation_arguments(args)
+    key_filter = pop_filter_arguments(args)
+    task = RedisDelete(key_filter=key_filter, **vars(args))
+    result = task.run(**instrumentation)
+    # Keep the summary apart from key(s) streamed to stdout
+    pprint(result, stream=sys.stderr if args.output_keys == STDOUT else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
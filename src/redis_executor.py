@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Run a worker against every master node concurrently,
+   as opposed to walking the nodes one after another"""
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RedisNodeExecutor:
+    DEFAULT_CONCURRENCY = 8
+
+    # Time spent concurrently across nodes is merged by maximum rather than sum
+    MAXIMUM_FIELDS = ("sleep_time", "node_time")
+
+    def __init__(self, redis_common, concurrency=DEFAULT_CONCURRENCY, nodes=None):
+        self.redis_common = redis_common
+        self.concurrency = concurrency
+        self.nodes = nodes if nodes is not None else redis_common.get_master_nodes()
+
+    def run_node(self, worker, node):
+        start_time = time.time()
+        # Workers run in threads of their own, profiled separately when the task is profiled
+        profiler = self.redis_common.create_profiler() if hasattr(self.redis_common, "create_profiler") else None
+        try:
+            result = worker(node, self.redis_common.get_node_client(node))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        result["node_time"] = time.time() - start_time
+        return node["name"], result
+
+    def merge_results(self, node_results):
+        """Sum statistics and concatenate lists across nodes, keeping per-node statistics under "nodes" """
+        merged = {}
+        for _, result in node_results:
+            for key, value in result.items():
+                if isinstance(value, bool):
+                    continue
+                elif isinstance(value, (int, float)) and key in self.MAXIMUM_FIELDS:
+                    merged[key] = max(merged.get(key, 0), value)
+                elif isinstance(value, (int, float)):
+                    merged[key] = merged.get(key, 0) + value
+                elif isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+        merged["nodes"] = {name: {key: value for key, value in result.items() if not isinstance(value, list)}
+                           for name, result in node_results}
+        return merged
+
+    def map(self, worker):
+        """Run the worker against every node, returning (node name, result) pairs in node order"""
+        max_workers = max(1, min(self.concurrency, len(self.nodes)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(lambda node: self.run_node(worker, node), self.nodes))
+
+    def execute(self, worker):
+        return self.merge_results(self.map(worker))
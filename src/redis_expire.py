@@ -1,68 +1,155 @@
 # -*- coding: utf-8 -*-
+import sys
 import time
 
 from argparse import ArgumentParser
 from pprint import pprint
-from redis_common import RedisCommon
+from redis_common import DEFAULT_MAX_REPLICATION_LAG, PRIMARY, READ_PREFERENCES, RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_filter import add_filter_arguments, pop_filter_arguments
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
+from redis_scan import RedisScan
+from redis_sink import OUTPUT_FORMATS, PLAIN, STDOUT
+from redis_throttle import DEFAULT_OPS_PER_SEC, FIXED, THROTTLE_MODES
+from redis_tuner import AutoBatchTuner
 
 DEFAULT_REDIS_PORT = 6379
 
 
-class RedisExpire(RedisCommon):
-    NO_TTL_SET = -1
-    DEFAULT_SLEEP = 1
-    DEFAULT_SLEEP_BATCH = 1000
-    DEFAULT_COUNT = 1000
+class RedisExpire(RedisScan):
+    DEFAULT_TIME_BUDGET = 5
+    # Writing after SCAN and TIME needs the effects of the script to be replicated, which redis.replicate_commands
+    # enables from Redis 3.2 and which is the only mode from Redis 5.0
+    LUA_VERSION = (3, 2)
+    # SCAN, match and EXPIRE server side, page after page until the cursor completes or the time budget
+    # in milliseconds runs out - returns the next cursor, keys scanned and keys expired
+    EXPIRE_SCRIPT = """
+redis.replicate_commands()
+local cursor = ARGV[1]
+local ttl = tonumber(ARGV[4])
+local no_ttl_only = ARGV[5] == "1"
+local time_budget = tonumber(ARGV[6]) * 1000
+local start_time = redis.call("TIME")
+local keys_scanned = 0
+local keys_expired = 0
+repeat
+    local reply = redis.call("SCAN", cursor, "MATCH", ARGV[2], "COUNT", ARGV[3])
+    cursor = reply[1]
+    for _, key in ipairs(reply[2]) do
+        keys_scanned = keys_scanned + 1
+        if not no_ttl_only or redis.call("TTL", key) == -1 then
+            redis.call("EXPIRE", key, ttl)
+            keys_expired = keys_expired + 1
+        end
+    end
+    local now = redis.call("TIME")
+    local elapsed_time = (now[1] - start_time[1]) * 1000000 + (now[2] - start_time[2])
+until cursor == "0" or elapsed_time >= time_budget
+return {cursor, keys_scanned, keys_expired}
+"""
 
-    WILDCARD = "*"
-
-    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, ttl, print_keys):
-        super().__init__(host, port, cluster_mode, authentication, decode_responses)
-        self.redis_client = self.get_redis_client()
-        self.redis_pipeline = self.get_redis_pipeline()
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, ttl, print_keys,
+                 lua=False, time_budget=DEFAULT_TIME_BUDGET, **kwargs):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys, **kwargs)
         # Argument for expiring keys
-        self.pattern = pattern
-        self.no_ttl_only = no_ttl_only
         self.ttl = ttl
-        self.print_keys = print_keys
+        self.lua = lua
+        self.time_budget = time_budget
+        if lua and (print_keys or self.output_keys is not None):
+            raise ValueError("Keys expired server side are not sent back, --print_keys and --output_keys cannot be used with --lua")
+        if lua and self.key_filter is not None:
+            raise ValueError("Keys are matched server side with --lua, client side filters cannot be used with it")
+        if lua and self.read_preference != PRIMARY:
+            raise ValueError("The Lua script scans and expires on the master, --read_preference cannot be used with --lua")
 
-    def set_ttl_pattern(self):
+    def set_ttl_pattern_node(self, node, node_client):
         # Set variables for deletion
-        keys_deleted = 0
-        sleep_counter = 0
-        cumulative_keys = []
+        statistics = self.get_node_statistics(node, {"keys_deleted": 0,
+                                                     "keys_scanned": 0,
+                                                     "ttl_round_trips": 0})
+        # SCAN and TTL may go to a replica, EXPIRE always goes to the master
+        read_client = self.get_read_client(node, node_client, statistics)
+        keys_pending = 0
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        # Not a transaction, which fails with CROSSSLOT once queued keys span several slots in cluster mode
+        node_pipeline = node_client.pipeline(transaction=False)
+        for cursor, keys, keys_scanned in self.match_node_pages(node, read_client, throttle, tuner):
+            statistics["keys_scanned"] += keys_scanned
+            # Filter the whole page for non-TTL set before queueing any EXPIRE
+            if self.no_ttl_only and keys:
+                keys = self.get_keys_without_ttl(read_client, keys)
+                statistics["ttl_round_trips"] += 1
+            for key_value in keys:
+                node_pipeline.expire(key_value, self.ttl)
+            statistics["keys_deleted"] += len(keys)
+            keys_pending += len(keys)
+            self.write_keys(keys, node)
+            if keys_pending >= tuner.pipeline_batch:
+                flush_start = time.time()
+                node_pipeline.execute()
+                tuner.record_flush(time.time() - flush_start, keys_pending)
+                keys_pending = 0
+            # Cursor can only be checkpointed once EXPIRE for every key before it has been sent
+            if keys_pending == 0:
+                self.update_checkpoint(node, cursor, statistics)
+        node_pipeline.execute()
+        self.update_checkpoint(node, 0, statistics)
+        result = dict(statistics)
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def set_ttl_lua_node(self, node, node_client):
+        """Expire keys of a node with the scan-match-expire loop running server side,
+           so that only cursors and counts cross the network"""
+        statistics = self.get_node_statistics(node, {"keys_deleted": 0,
+                                                     "keys_scanned": 0,
+                                                     "script_calls": 0})
+        server_version = self.get_server_version(node_client)
+        if server_version < self.LUA_VERSION:
+            raise ValueError("--lua needs Redis {} or later, {} runs {}".format(
+                ".".join(map(str, self.LUA_VERSION)), node["name"], ".".join(map(str, server_version))))
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        expire_script = node_client.register_script(self.EXPIRE_SCRIPT)
+        if not self.checkpoint.is_complete(node["name"]):
+            cursor = self.checkpoint.get_cursor(node["name"])
+            while True:
+                call_start = time.time()
+                cursor, keys_scanned, keys_expired = expire_script(args=[cursor, self.pattern, tuner.scan_count, self.ttl,
+                                                                         int(self.no_ttl_only), self.time_budget])
+                # Replies are bytes unless the client decodes them, the cursor is checkpointed as JSON
+                cursor = int(cursor)
+                tuner.record_page(time.time() - call_start, keys_scanned)
+                statistics["keys_scanned"] += keys_scanned
+                statistics["keys_deleted"] += keys_expired
+                statistics["script_calls"] += 1
+                # Every call is atomic, the cursor returned can always be checkpointed
+                self.update_checkpoint(node, cursor, statistics)
+                throttle.throttle(keys_scanned)
+                if int(cursor) == 0:
+                    break
+        result = dict(statistics)
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def set_ttl_pattern(self):
         start_time = time.time()
-        for key_value in self.redis_client.scan_iter(match=self.pattern, count=self.DEFAULT_COUNT):
-            if (keys_deleted > 0 and
-                    self.DEFAULT_SLEEP > 0 and
-                    keys_deleted % self.DEFAULT_SLEEP_BATCH == 0):
-                time.sleep(self.DEFAULT_SLEEP)
-                self.redis_pipeline.execute()
-                sleep_counter += 1
-            # Begin deletion for non-TTL set
-            if self.no_ttl_only and self.redis_client.ttl(key_value) == self.NO_TTL_SET:
-                keys_deleted += 1
-                self.redis_pipeline.expire(key_value, self.ttl)
-                cumulative_keys.append(key_value)
-                continue
-            keys_deleted += 1
-            self.redis_pipeline.expire(key_value, self.ttl)
-            cumulative_keys.append(key_value)
-        self.redis_pipeline.execute()
+        result = self.scan_nodes(self.set_ttl_lua_node if self.lua else self.set_ttl_pattern_node)
         end_time = time.time()
         # Calculate statistics
         total_time = end_time - start_time
-        sleep_time = self.DEFAULT_SLEEP * sleep_counter
-        execution_time = total_time - sleep_time
-        result = {"total_time": total_time,
-                  "sleep_time": sleep_time,
-                  "execution_time": execution_time,
-                  "keys_deleted": keys_deleted,
-                  "pattern": self.pattern,
-                  "ttl": self.ttl,
-                  "no_ttl_only": self.no_ttl_only}
-        if self.print_keys:
-            result["keys"] = cumulative_keys
+        execution_time = total_time - result["sleep_time"]
+        result.update({"total_time": total_time,
+                       "execution_time": execution_time,
+                       "effective_rate": result["operations"] / total_time if total_time > 0 else 0,
+                       "keys_per_second": result["keys_scanned"] / execution_time if execution_time > 0 else 0,
+                       "round_trips_saved": result["keys_scanned"] - result.get("ttl_round_trips", 0) if self.no_ttl_only else 0,
+                       "pattern": self.pattern,
+                       "ttl": self.ttl,
+                       "no_ttl_only": self.no_ttl_only})
         return result
 
     def set_ttl_single(self):
@@ -119,6 +206,31 @@ def get_arguments():
     parser.add_argument("--no_ttl_only", action="store_true", help="Expire only keys without TTL")
     parser.add_argument("--ttl", type=int, required=True, help="Set TTL")
     parser.add_argument("--print_keys", action="store_true", required=False, help="Print key(s)")
+    parser.add_argument("--max_connections", type=int,
+                        help="Connections per node pool, waiting for a free connection beyond it - Defaults to unbounded, {} per cluster client".format(str(RedisCommon.DEFAULT_MAX_CONNECTION)))
+    parser.add_argument("--read_preference", type=str, choices=READ_PREFERENCES, default=PRIMARY, required=False,
+                        help="Node(s) SCAN and TTL / TYPE reads go to, writes always going to the master - Defaults to {}".format(PRIMARY))
+    parser.add_argument("--max_replication_lag", type=int, default=DEFAULT_MAX_REPLICATION_LAG, required=False,
+                        help="Seconds since a replica last acknowledged its master beyond which it is not read from - Defaults to {}".format(str(DEFAULT_MAX_REPLICATION_LAG)))
+    parser.add_argument("--concurrency", type=int, default=RedisNodeExecutor.DEFAULT_CONCURRENCY,
+                        help="Number of master nodes scanned concurrently - Defaults to {}".format(str(RedisNodeExecutor.DEFAULT_CONCURRENCY)))
+    parser.add_argument("--output_keys", type=str,
+                        help="Stream matched key(s) to this file as they are found, {} for stdout".format(STDOUT))
+    parser.add_argument("--output_format", type=str, choices=OUTPUT_FORMATS, default=PLAIN,
+                        help="Format of key(s) streamed by --output_keys")
+    parser.add_argument("--compress_output", action="store_true", help="Gzip key(s) streamed by --output_keys")
+    parser.add_argument("--checkpoint", type=str, help="File to periodically persist SCAN cursor(s) and statistics to")
+    parser.add_argument("--resume", action="store_true", help="Resume from the cursor(s) persisted in --checkpoint")
+    parser.add_argument("--auto_tune", action="store_true", help="Tune SCAN COUNT and pipeline batch size to --target_latency")
+    parser.add_argument("--target_latency", type=float, default=AutoBatchTuner.DEFAULT_TARGET_LATENCY,
+                        help="Target seconds per SCAN page and per pipeline flush when auto tuning")
+    parser.add_argument("--lua", action="store_true", help="Scan, match and expire server side in a Lua script, paged by --time_budget")
+    parser.add_argument("--time_budget", type=int, default=RedisExpire.DEFAULT_TIME_BUDGET,
+                        help="Milliseconds each --lua script call may run before returning its cursor - Defaults to {}".format(str(RedisExpire.DEFAULT_TIME_BUDGET)))
+    parser.add_argument("--throttle", type=str, choices=THROTTLE_MODES, default=FIXED,
+                        help="Throttle pacing each node - Defaults to {}".format(FIXED))
+    parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC,
+                        help="Target keys per second per node for token_bucket / feedback throttle - Defaults to {}".format(str(DEFAULT_OPS_PER_SEC)))
     # Check if cluster mode or not
     cluster_mode_group = parser.add_mutually_exclusive_group(required=True)
     cluster_mode_group.add_argument("--cluster_mode_enabled",
@@ -130,14 +242,19 @@ def get_arguments():
                                     dest="cluster_mode",
                                     help="Indicate that Redis instance is cluster mode disabled")
     parser.add_argument("--decode_responses", type=bool, default=False, help="Authentication required for Redis")
+    add_filter_arguments(parser)
+    add_instrumentation_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = get_arguments()
-    task = RedisExpire(**vars(args))
-    result = task.execute()
-    pprint(result)
+    instrumentation = pop_instrumentation_arguments(args)
+    key_filter = pop_filter_arguments(args)
+    task = RedisExpire(key_filter=key_filter, **vars(args))
+    result = task.run(**instrumentation)
+    # Keep the summary apart from key(s) streamed to stdout
+    pprint(result, stream=sys.stderr if args.output_keys == STDOUT else sys.stdout)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Client-side key predicates beyond what SCAN MATCH glob patterns can express,
+   evaluated page by page in worker processes so that matching scales with cores rather than the GIL"""
+import multiprocessing
+import re
+
+from concurrent.futures import Future, ProcessPoolExecutor
+
+DEFAULT_FILTER_PROCESSES = 0
+KEY_TYPES = ("string", "list", "set", "zset", "hash", "stream")
+NO_TTL_SET = -1
+
+
+class KeyFilter:
+    """Every predicate given has to hold. Regular expression, prefixes and length only need the key itself and
+       are evaluated first, TTL range and type need a lookup and are only checked for keys passing the former.
+       Keys without TTL never fall within a TTL range. Length counts bytes when the client does not decode
+       responses and characters when it does, which differ for keys outside ASCII"""
+
+    def __init__(self, regex=None, prefixes=None, min_length=None, max_length=None, min_ttl=None, max_ttl=None, types=None):
+        self.regex = regex
+        self.prefixes = tuple(prefixes) if prefixes else None
+        self.min_length = min_length
+        self.max_length = max_length
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.types = frozenset(types) if types else None
+        # Keys are bytes or str depending on the client decoding responses, the regular expression is compiled for each
+        self.compiled = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["compiled"] = {}
+        return state
+
+    @property
+    def needs_ttl(self):
+        return self.min_ttl is not None or self.max_ttl is not None
+
+    @property
+    def needs_type(self):
+        return self.types is not None
+
+    def get_state(self):
+        """JSON serialisable predicates, e.g. to tell checkpoints of different filters apart"""
+        return {"regex": self.regex,
+                "prefixes": list(self.prefixes) if self.prefixes else None,
+                "min_length": self.min_length,
+                "max_length": self.max_length,
+                "min_ttl": self.min_ttl,
+                "max_ttl": self.max_ttl,
+                "types": sorted(self.types) if self.types else None}
+
+    def get_pattern(self, key_class):
+        pattern = self.compiled.get(key_class)
+        if pattern is None:
+            pattern = re.compile(self.regex.encode("utf-8") if key_class is bytes else self.regex)
+            self.compiled[key_class] = pattern
+        return pattern
+
+    def match(self, keys):
+        """Keys of a page satisfying the predicates on the key itself"""
+        if not keys:
+            return keys
+        key_class = type(keys[0])
+        if self.prefixes is not None:
+            prefixes = tuple(prefix.encode("utf-8") for prefix in self.prefixes) if key_class is bytes else self.prefixes
+            keys = [key_value for key_value in keys if key_value.startswith(prefixes)]
+        if self.min_length is not None:
+            keys = [key_value for key_value in keys if len(key_value) >= self.min_length]
+        if self.max_length is not None:
+            keys = [key_value for key_value in keys if len(key_value) <= self.max_length]
+        if self.regex is not None:
+            search = self.get_pattern(key_class).search
+            keys = [key_value for key_value in keys if search(key_value)]
+        return keys
+
+    def match_attributes(self, ttl=None, key_type=None):
+        """Whether TTL and type looked up for a key satisfy the predicates"""
+        if self.needs_ttl:
+            if ttl is None or ttl < 0:
+                return False
+            if (self.min_ttl is not None and ttl < self.min_ttl) or (self.max_ttl is not None and ttl > self.max_ttl):
+                return False
+        if self.needs_type:
+            if isinstance(key_type, bytes):
+                key_type = key_type.decode("utf-8")
+            return key_type in self.types
+        return True
+
+
+# Filter of the worker process, set once by the pool initializer rather than sent along with every page
+worker_filter = None
+
+
+def initialize_worker(key_filter):
+    global worker_filter
+    worker_filter = key_filter
+
+
+def match_page(keys):
+    return worker_filter.match(keys)
+
+
+class KeyFilterPool:
+    """Evaluate pages of keys with the filter in worker processes shared by every node, or in the calling thread
+       without processes. Callers keep up to max_pending pages in flight, scanning ahead while earlier pages are matched"""
+
+    def __init__(self, key_filter, processes=DEFAULT_FILTER_PROCESSES):
+        self.key_filter = key_filter
+        self.processes = processes
+        self.max_pending = 2 * processes if processes else 1
+        self.executor = None
+        if processes:
+            # Spawned rather than forked, as node workers run in threads
+            self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=initialize_worker, initargs=(key_filter,))
+
+    def submit(self, keys):
+        if self.executor is None:
+            future = Future()
+            future.set_result(self.key_filter.match(keys))
+            return future
+        return self.executor.submit(match_page, keys)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def add_filter_arguments(parser):
+    """Key filter arguments shared by the key walk tasks"""
+    parser.add_argument("--match_regex", type=str, help="Only keys a regular expression is found in, checked client side")
+    parser.add_argument("--match_prefix", type=str, nargs="+", help="Only keys starting with one of the prefix(es)")
+    parser.add_argument("--min_key_length", type=int, help="Only keys at least this long, in bytes or in characters with --decode_responses")
+    parser.add_argument("--max_key_length", type=int, help="Only keys at most this long, in bytes or in characters with --decode_responses")
+    parser.add_argument("--min_ttl", type=int, help="Only keys expiring in at least this many seconds")
+    parser.add_argument("--max_ttl", type=int, help="Only keys expiring in at most this many seconds")
+    parser.add_argument("--match_type", type=str, nargs="+", choices=KEY_TYPES, help="Only keys of the type(s)")
+    parser.add_argument("--filter_processes", type=int, default=DEFAULT_FILTER_PROCESSES,
+                        help="Processes matching pages of keys against the filter, 0 to match in the scanning thread - Defaults to {}".format(str(DEFAULT_FILTER_PROCESSES)))
+
+
+def pop_filter_arguments(args):
+    """Take the filter arguments out of the parsed arguments, as a KeyFilter or None when no predicate is given"""
+    arguments = vars(args)
+    if arguments.get("no_ttl_only") and (arguments["min_ttl"] is not None or arguments["max_ttl"] is not None):
+        raise ValueError("Keys without TTL never fall within a TTL range, --min_ttl and --max_ttl cannot be used with --no_ttl_only")
+    predicates = {"regex": arguments.pop("match_regex"),
+                  "prefixes": arguments.pop("match_prefix"),
+                  "min_length": arguments.pop("min_key_length"),
+                  "max_length": arguments.pop("max_key_length"),
+                  "min_ttl": arguments.pop("min_ttl"),
+                  "max_ttl": arguments.pop("max_ttl"),
+                  "types": arguments.pop("match_type")}
+    if all(value is None for value in predicates.values()):
+        return None
+    return KeyFilter(**predicates)
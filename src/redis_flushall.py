@@ -1,22 +1,88 @@
 # -*- coding: utf-8 -*-
 """Useful for Redis cluster with multiple master nodes
    as opposed to running FLUSHALL through redis-cli"""
+import sys
+import time
+
 from argparse import ArgumentParser
+from pprint import pprint
 from redis_common import RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
 
 DEFAULT_REDIS_PORT = 6379
 
 
 class RedisFlushall(RedisCommon):
-    def __init__(self, host, port, cluster_mode, authentication, decode_responses, flushall, asynchronous):
+    """FLUSHALL every master node concurrently, timing each node until its memory is reclaimed"""
+    # FLUSHALL ASYNC only exists from Redis 4.0
+    ASYNCHRONOUS_VERSION = (4, 0)
+    DEFAULT_POLL_INTERVAL = 0.1
+    DEFAULT_RECLAIM_TIMEOUT = 300
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, flushall, asynchronous,
+                 concurrency=RedisNodeExecutor.DEFAULT_CONCURRENCY, nodes=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 reclaim_timeout=DEFAULT_RECLAIM_TIMEOUT, progress=False):
         super().__init__(host, port, cluster_mode, authentication, decode_responses)
-        self.redis_client = self.get_redis_client()
         self.flushall = flushall
         self.asynchronous = asynchronous
+        self.concurrency = concurrency
+        self.nodes = nodes
+        self.poll_interval = poll_interval
+        self.reclaim_timeout = reclaim_timeout
+        self.progress = progress
+
+    @staticmethod
+    def get_memory(node_client):
+        memory = node_client.info("memory")
+        return int(memory["used_memory"]), int(memory.get("lazyfree_pending_objects", 0))
+
+    @staticmethod
+    def get_keys(node_client):
+        """Keys of every database, all of which FLUSHALL wipes - DBSIZE only counts the selected one"""
+        return sum(int(keyspace["keys"]) for keyspace in node_client.info("keyspace").values())
+
+    def wait_for_reclaim(self, node_client):
+        """Poll INFO memory until background freeing of a FLUSHALL ASYNC is done, or the timeout runs out"""
+        start_time = time.time()
+        used_memory, pending_objects = self.get_memory(node_client)
+        while pending_objects > 0 and time.time() - start_time < self.reclaim_timeout:
+            time.sleep(self.poll_interval)
+            used_memory, pending_objects = self.get_memory(node_client)
+        return used_memory, pending_objects, time.time() - start_time
+
+    def flushall_node(self, node, node_client):
+        keys_flushed = self.get_keys(node_client)
+        used_memory_before, _ = self.get_memory(node_client)
+        asynchronous = self.asynchronous and self.get_server_version(node_client) >= self.ASYNCHRONOUS_VERSION
+        flush_start = time.time()
+        node_client.flushall(asynchronous=asynchronous)
+        flush_time = time.time() - flush_start
+        used_memory_after, pending_objects, reclaim_time = self.wait_for_reclaim(node_client)
+        result = {"keys_flushed": keys_flushed,
+                  "used_memory_before": used_memory_before,
+                  "used_memory_after": used_memory_after,
+                  "memory_reclaimed": used_memory_before - used_memory_after,
+                  "lazyfree_pending_objects": pending_objects,
+                  "flush_time": flush_time,
+                  "reclaim_time": reclaim_time,
+                  "asynchronous": asynchronous}
+        if self.progress:
+            print("{} flushed {} key(s) in {:.3f}s, memory reclaimed in {:.3f}s".format(node["name"], keys_flushed, flush_time, reclaim_time),
+                  file=sys.stderr, flush=True)
+        return result
 
     def execute(self):
-        if self.flushall:
-            self.redis_client.flushall(asynchronous=self.asynchronous)
+        if not self.flushall:
+            return {}
+        start_time = time.time()
+        result = RedisNodeExecutor(self, self.concurrency, self.nodes).execute(self.flushall_node)
+        # Nodes are flushed concurrently, so the slowest node is what the whole FLUSHALL took
+        for field in ("flush_time", "reclaim_time"):
+            result[field] = max(node_result[field] for node_result in result["nodes"].values())
+        result.update({"total_time": time.time() - start_time,
+                       "asynchronous": self.asynchronous})
+        return result
 
 
 def get_arguments():
@@ -37,12 +103,24 @@ def get_arguments():
     parser.add_argument("--decode_responses", type=bool, default=False, help="Authentication required for Redis")
     parser.add_argument("--flushall", action="store_true", required=True, help="Confirmation to run FLUSHALL - required argument")
     parser.add_argument("--asynchronous", action="store_true", required=False, help="Run FLUSHALL asynchronously")
+    parser.add_argument("--concurrency", type=int, default=RedisNodeExecutor.DEFAULT_CONCURRENCY,
+                        help="Number of master nodes flushed concurrently - Defaults to {}".format(str(RedisNodeExecutor.DEFAULT_CONCURRENCY)))
+    parser.add_argument("--poll_interval", type=float, default=RedisFlushall.DEFAULT_POLL_INTERVAL,
+                        help="Seconds between INFO memory polls while memory is reclaimed - Defaults to {}".format(str(RedisFlushall.DEFAULT_POLL_INTERVAL)))
+    parser.add_argument("--reclaim_timeout", type=float, default=RedisFlushall.DEFAULT_RECLAIM_TIMEOUT,
+                        help="Seconds to wait for memory to be reclaimed per node - Defaults to {}".format(str(RedisFlushall.DEFAULT_RECLAIM_TIMEOUT)))
+    parser.add_argument("--progress", action="store_true", required=False, help="Report every node as it is flushed")
+    add_instrumentation_arguments(parser)
     return parser.parse_args()
 
+
 def main():
     args = get_arguments()
-    RedisFlushall(**vars(args))
+    instrumentation = pop_instrumentation_arguments(args)
+    task = RedisFlushall(**vars(args))
+    result = task.run(**instrumentation)
+    pprint(result)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Fixed memory histogram with logarithmic buckets, in the spirit of HdrHistogram"""
+
+
+class LogHistogram:
+    """Every power of two is split into 2 ** significant_bits buckets, bounding the relative error
+       of a percentile to 2 ** -significant_bits regardless of how many values are recorded"""
+    DEFAULT_SIGNIFICANT_BITS = 5
+
+    def __init__(self, significant_bits=DEFAULT_SIGNIFICANT_BITS):
+        self.significant_bits = significant_bits
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+    def get_bucket(self, value):
+        value = int(value)
+        if value <= 0:
+            return 0
+        exponent = value.bit_length() - 1
+        shift = max(0, exponent - self.significant_bits)
+        return (exponent << self.significant_bits) + ((value >> shift) & ((1 << self.significant_bits) - 1)) + 1
+
+    def get_bucket_bounds(self, bucket):
+        """Lowest and highest value falling in the bucket"""
+        if bucket == 0:
+            return 0, 0
+        exponent, sub_bucket = divmod(bucket - 1, 1 << self.significant_bits)
+        shift = max(0, exponent - self.significant_bits)
+        if exponent < self.significant_bits:
+            # Small values are recorded exactly
+            lowest = (1 << exponent) | (sub_bucket & ((1 << exponent) - 1))
+            return lowest, lowest
+        lowest = ((1 << self.significant_bits) | sub_bucket) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, value, count=1):
+        bucket = self.get_bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def merge(self, histogram):
+        for bucket, count in histogram.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += histogram.count
+        self.total += histogram.total
+        for value in (histogram.minimum, histogram.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def percentile(self, percentile):
+        """Highest value of the bucket holding the percentile, capped by the maximum recorded"""
+        if self.count == 0:
+            return None
+        threshold = self.count * percentile / 100
+        cumulative = 0
+        for bucket in sorted(self.buckets):
+            cumulative += self.buckets[bucket]
+            if cumulative >= threshold:
+                return min(self.get_bucket_bounds(bucket)[1], self.maximum)
+        return self.maximum
+
+    def get_buckets(self):
+        """(lowest, highest, count) of every non-empty bucket in ascending order"""
+        return [self.get_bucket_bounds(bucket) + (self.buckets[bucket],) for bucket in sorted(self.buckets)]
+
+    def get_state(self):
+        """JSON serialisable state, e.g. to be persisted in a checkpoint"""
+        return {"significant_bits": self.significant_bits,
+                "buckets": [[bucket, count] for bucket, count in self.buckets.items()],
+                "count": self.count,
+                "total": self.total,
+                "minimum": self.minimum,
+                "maximum": self.maximum}
+
+    @classmethod
+    def from_state(cls, state):
+        histogram = cls(state["significant_bits"])
+        histogram.buckets = {bucket: count for bucket, count in state["buckets"]}
+        histogram.count = state["count"]
+        histogram.total = state["total"]
+        histogram.minimum = state["minimum"]
+        histogram.maximum = state["maximum"]
+        return histogram
+
+    def get_statistics(self):
+        return {"count": self.count,
+                "total": self.total,
+                "min": self.minimum,
+                "max": self.maximum,
+                "p50": self.percentile(50),
+                "p99": self.percentile(99)}
@@ -1,37 +1,66 @@
 # -*- coding: utf-8 -*-
+import json
 import re
+import time
 
 from argparse import ArgumentParser
+from collections import deque
 from pprint import pprint
 from redis_common import RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
 
 DEFAULT_REDIS_PORT = 6379
+PPRINT = "pprint"
+TABLE = "table"
+JSONL = "jsonl"
+OUTPUT_FORMATS = (PPRINT, TABLE, JSONL)
+
+
+def filter_info_log(log, filter_keys, cluster_mode):
+    """INFO fields matching the compiled filter_keys, per node in cluster mode - the whole log when nothing matches"""
+    processed_log = {}
+    if filter_keys is None:
+        processed_log = log
+    elif filter_keys and cluster_mode:
+        for redis_node, redis_info in log.items():
+            temporary_redis_info = {key: value for key, value in redis_info.items()
+                                    if filter_keys.search(key)}
+            processed_log[redis_node] = temporary_redis_info if temporary_redis_info != {} else redis_info
+    elif filter_keys and not cluster_mode:
+        temporary_redis_info = {key: value for key, value in log.items()
+                                if filter_keys.search(key)}
+        processed_log = temporary_redis_info if temporary_redis_info != {} else log
+    return processed_log
 
 
 class RedisInfo(RedisCommon):
-    def __init__(self, host, port, cluster_mode, authentication, decode_responses, filter_keys=None):
+    # Monotonic counters reported as deltas and rates in watch mode, alongside every cmdstat_* field below
+    COUNTER_FIELDS = frozenset(["total_connections_received", "total_commands_processed",
+                                "total_net_input_bytes", "total_net_output_bytes",
+                                "total_net_repl_input_bytes", "total_net_repl_output_bytes",
+                                "total_reads_processed", "total_writes_processed", "total_error_replies",
+                                "rejected_connections", "sync_full", "sync_partial_ok", "sync_partial_err",
+                                "expired_keys", "evicted_keys", "keyspace_hits", "keyspace_misses",
+                                "expired_time_cap_reached_count", "total_forks"])
+    COUNTER_PREFIX = "cmdstat_"
+    COUNTER_SUFFIXES = (".calls", ".usec", ".rejected_calls", ".failed_calls")
+    DEFAULT_WATCH_SECTIONS = ("default", "commandstats")
+    DEFAULT_HISTORY = 60
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, filter_keys=None,
+                 history=DEFAULT_HISTORY):
         super().__init__(host, port, cluster_mode, authentication, decode_responses)
         self.cluster_mode = cluster_mode
-        self.redis_client = self.get_redis_client()
         self.filter_keys = re.compile(filter_keys) if filter_keys is not None else None
+        # Ring buffer of the most recent intervals in watch mode
+        self.history = deque(maxlen=history)
 
     def get_info_log(self):
-        return self.redis_client.log()
+        return self.redis_client.info()
 
     def filter_info_log(self, log):
-        processed_log = {}
-        if self.filter_keys is None:
-            processed_log = log
-        elif self.filter_keys and self.cluster_mode:
-            for redis_node, redis_info in log.items():
-                temporary_redis_info = {key: value for key, value in redis_info.items()
-                                        if self.filter_keys.search(key)}
-                processed_log[redis_node] = temporary_redis_info if temporary_redis_info != {} else redis_info
-        elif self.filter_keys and not self.cluster_mode:
-            temporary_redis_info = {key: value for key, value in log.items()
-                                    if self.filter_keys.search(key)}
-            processed_log = temporary_redis_info if temporary_redis_info != {} else log
-        return processed_log
+        return filter_info_log(log, self.filter_keys, self.cluster_mode)
 
     def execute(self):
         # Get Redis info log
@@ -39,13 +68,164 @@ class RedisInfo(RedisCommon):
         processed_log = self.filter_info_log(logs)
         return processed_log
 
+    @staticmethod
+    def flatten_info_log(log):
+        """Flatten nested values such as cmdstat_get or db0 into cmdstat_get.calls, db0.keys"""
+        flattened_log = {}
+        for key, value in log.items():
+            if isinstance(value, dict):
+                flattened_log.update({"{}.{}".format(key, field): field_value for field, field_value in value.items()})
+            else:
+                flattened_log[key] = value
+        return flattened_log
+
+    def is_counter(self, key):
+        if key.startswith(self.COUNTER_PREFIX):
+            return key.endswith(self.COUNTER_SUFFIXES)
+        return key in self.COUNTER_FIELDS
+
+    def get_sample(self, sections=DEFAULT_WATCH_SECTIONS):
+        """Numeric INFO fields of the given sections, keyed by node"""
+        nodes_log = {}
+        for section in sections:
+            log = self.redis_client.info(section)
+            for node_name, node_log in (log.items() if self.cluster_mode else [(self.name, log)]):
+                nodes_log.setdefault(node_name, {}).update(self.flatten_info_log(node_log))
+        nodes_log = self.filter_info_log(nodes_log if self.cluster_mode else nodes_log[self.name])
+        nodes_log = nodes_log if self.cluster_mode else {self.name: nodes_log}
+        return {node_name: {key: value for key, value in node_log.items()
+                            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+                for node_name, node_log in nodes_log.items()}
+
+    def select_counters(self, samples):
+        """Only counters of the previous sample need to be kept between polls"""
+        return {node_name: {key: value for key, value in sample.items() if self.is_counter(key)}
+                for node_name, sample in samples.items()}
+
+    def compute_rates(self, previous_sample, sample, elapsed_time):
+        """Deltas and per-second rates of counters, current values of everything else"""
+        deltas = {}
+        rates = {}
+        values = {}
+        for key, value in sample.items():
+            if not self.is_counter(key):
+                values[key] = value
+                continue
+            if key not in previous_sample:
+                continue
+            # A counter going backwards implies the node restarted or CONFIG RESETSTAT was run
+            delta = value - previous_sample[key] if value >= previous_sample[key] else value
+            deltas[key] = delta
+            rates[key] = delta / elapsed_time if elapsed_time > 0 else 0
+        return {"deltas": deltas, "rates": rates, "values": values}
+
+    def watch(self, interval, count=None, sections=DEFAULT_WATCH_SECTIONS):
+        """Poll INFO every interval seconds, yielding deltas and rates for every interval"""
+        previous_time = time.time()
+        next_time = previous_time + interval
+        previous_samples = self.select_counters(self.get_sample(sections))
+        intervals = 0
+        while count is None or intervals < count:
+            time.sleep(max(0, next_time - time.time()))
+            # Schedule against the previous target rather than the current time, so polls do not drift
+            next_time += interval
+            samples = self.get_sample(sections)
+            sample_time = time.time()
+            elapsed_time = sample_time - previous_time
+            nodes = {node_name: self.compute_rates(previous_samples.get(node_name, {}), sample, elapsed_time)
+                     for node_name, sample in samples.items()}
+            record = {"timestamp": sample_time, "interval": elapsed_time}
+            if self.cluster_mode:
+                record["nodes"] = nodes
+            else:
+                record.update(nodes[self.name])
+            self.history.append(record)
+            yield record
+            previous_time = sample_time
+            previous_samples = self.select_counters(samples)
+            intervals += 1
+
+
+class RedisInfoFleet:
+    """INFO from many standalone endpoints listed in an inventory file, fetched by a bounded worker pool"""
+    DEFAULT_CONCURRENCY = 16
+    COMMENT = "#"
+
+    def __init__(self, inventory, authentication=None, decode_responses=True, filter_keys=None,
+                 concurrency=DEFAULT_CONCURRENCY):
+        self.nodes = self.read_inventory(inventory)
+        self.authentication = authentication
+        self.decode_responses = decode_responses
+        self.concurrency = concurrency
+        # Compiled once for the whole fleet
+        self.filter_keys = re.compile(filter_keys) if filter_keys is not None else None
+
+    def read_inventory(self, inventory):
+        """One host[:port] per line, blank lines and lines starting with # are skipped"""
+        nodes = []
+        with open(inventory) as inventory_file:
+            for line in inventory_file:
+                line = line.strip()
+                if not line or line.startswith(self.COMMENT):
+                    continue
+                host, _, port = line.partition(":")
+                port = int(port) if port else DEFAULT_REDIS_PORT
+                nodes.append({"host": host, "port": port, "name": "{}:{}".format(host, port)})
+        return nodes
+
+    def get_node_client(self, node):
+        """Pools are shared per endpoint, so that repeated collection reuses their connections"""
+        return RedisCommon.pool_registry.get_client(node["host"], node["port"], self.authentication, self.decode_responses)
+
+    def get_node_info(self, node, node_client):
+        try:
+            return {"info": filter_info_log(node_client.info(), self.filter_keys, False)}
+        except Exception as error:
+            return {"error": "{}: {}".format(type(error).__name__, error)}
+
+    def execute(self):
+        executor = RedisNodeExecutor(self, self.concurrency, self.nodes)
+        return {node_name: node_result for node_name, node_result in executor.map(self.get_node_info)}
+
+    @staticmethod
+    def format_jsonl(result):
+        lines = []
+        for node_name, node_result in result.items():
+            row = {"endpoint": node_name, "node_time": node_result["node_time"]}
+            row.update(node_result.get("info", {}))
+            if "error" in node_result:
+                row["error"] = node_result["error"]
+            lines.append(json.dumps(row, default=str))
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_table(result):
+        """One row per endpoint, one column per INFO field found on any endpoint"""
+        fields = []
+        for node_result in result.values():
+            fields.extend(field for field in node_result.get("info", {}) if field not in fields)
+        header = ["endpoint", "node_time"] + fields + ["error"]
+        rows = [header]
+        for node_name, node_result in result.items():
+            info = node_result.get("info", {})
+            row = [node_name, "{:.4f}".format(node_result["node_time"])]
+            row.extend(str(info.get(field, "")) for field in fields)
+            row.append(node_result.get("error", ""))
+            rows.append(row)
+        widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+        return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
 def get_arguments():
     parser = ArgumentParser(description="Obtain INFO log from Redis instances")
-    parser.add_argument("--host", type=str, required=True, help="Redis Host")
+    # Check if single endpoint or fleet
+    endpoint_group = parser.add_mutually_exclusive_group(required=True)
+    endpoint_group.add_argument("--host", type=str, help="Redis Host")
+    endpoint_group.add_argument("--inventory", type=str, help="File listing host:port of standalone Redis instances, one per line")
     parser.add_argument("--port", type=int, default=DEFAULT_REDIS_PORT, help="Redis Port - Defaults to {}".format(str(DEFAULT_REDIS_PORT)))
     parser.add_argument("--authentication", type=str, help="Authentication required for Redis")
-    # Check if cluster mode or not
-    cluster_mode_group = parser.add_mutually_exclusive_group(required=True)
+    # Check if cluster mode or not - only required for a single endpoint, the inventory lists standalone instances
+    cluster_mode_group = parser.add_mutually_exclusive_group()
     cluster_mode_group.add_argument("--cluster_mode_enabled",
                                     action="store_true",
                                     dest="cluster_mode",
@@ -54,16 +234,51 @@ def get_arguments():
                                     action="store_false",
                                     dest="cluster_mode",
                                     help="Indicate Redis instance is cluster mode disabled")
+    parser.set_defaults(cluster_mode=None)
     parser.add_argument("--decode_responses", type=bool, default=False, help="Authentication required for Redis")
-    parser.add_argument("--filter_keys", type=str, default=False, help="Regex expression for desired keys")
+    parser.add_argument("--filter_keys", type=str, default=None, help="Regex expression for desired keys")
+    parser.add_argument("--concurrency", type=int, default=RedisInfoFleet.DEFAULT_CONCURRENCY,
+                        help="Number of endpoints queried concurrently with --inventory - Defaults to {}".format(str(RedisInfoFleet.DEFAULT_CONCURRENCY)))
+    parser.add_argument("--output_format", type=str, choices=OUTPUT_FORMATS, default=PPRINT,
+                        help="Output format with --inventory - Defaults to {}".format(PPRINT))
+    parser.add_argument("--watch", type=float, help="Poll INFO every given seconds, printing deltas and rates as JSON lines")
+    parser.add_argument("--watch_count", type=int, help="Number of intervals to print with --watch - Defaults to until interrupted")
+    parser.add_argument("--history", type=int, default=RedisInfo.DEFAULT_HISTORY,
+                        help="Number of intervals kept in memory with --watch - Defaults to {}".format(str(RedisInfo.DEFAULT_HISTORY)))
 
-    return parser.parse_args()
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    if args.host is not None and args.cluster_mode is None:
+        parser.error("one of the arguments --cluster_mode_enabled --cluster_mode_disabled is required with --host")
+    # Instrumentation wraps a single execute(), which neither the fleet nor the watch loop go through
+    if (args.inventory is not None or args.watch is not None) and (args.metrics or args.metrics_output is not None or args.profile is not None):
+        parser.error("--metrics, --metrics_output and --profile cannot be used with --inventory or --watch")
+    return args
 
 def main():
     args = get_arguments()
-    task = RedisInfo(**vars(args))
+    instrumentation = pop_instrumentation_arguments(args)
+    if args.inventory is None and args.watch is not None:
+        task = RedisInfo(args.host, args.port, args.cluster_mode, args.authentication, args.decode_responses, args.filter_keys,
+                         args.history)
+        try:
+            for record in task.watch(args.watch, args.watch_count):
+                print(json.dumps(record), flush=True)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.inventory is None:
+        task = RedisInfo(args.host, args.port, args.cluster_mode, args.authentication, args.decode_responses, args.filter_keys)
+        pprint(task.run(**instrumentation))
+        return
+    task = RedisInfoFleet(args.inventory, args.authentication, args.decode_responses, args.filter_keys, args.concurrency)
     result = task.execute()
-    pprint(result)
+    if args.output_format == TABLE:
+        print(task.format_table(result))
+    elif args.output_format == JSONL:
+        print(task.format_jsonl(result))
+    else:
+        pprint(result)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import heapq
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis_common import DEFAULT_MAX_REPLICATION_LAG, PRIMARY, READ_PREFERENCES, RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
+from redis_scan import RedisScan
+from redis_sink import StreamKeySink
+from redis_throttle import DEFAULT_OPS_PER_SEC, FIXED, THROTTLE_MODES
+from redis_tuner import AutoBatchTuner
+
+DEFAULT_REDIS_PORT = 6379
+
+
+class RedisMemory(RedisScan):
+    """Find the keys using the most memory, and the memory used per key prefix, in memory bounded by
+       the number of largest keys and prefixes kept rather than by the number of keys walked"""
+    DEFAULT_TOP = 20
+    # Same default as MEMORY USAGE itself - 0 samples every element of nested types
+    DEFAULT_SAMPLES = 5
+    DEFAULT_SAMPLE_RATE = 1
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, top=DEFAULT_TOP,
+                 samples=DEFAULT_SAMPLES, sample_rate=DEFAULT_SAMPLE_RATE, delimiter=RedisScan.DEFAULT_DELIMITER,
+                 prefix_depth=RedisScan.DEFAULT_PREFIX_DEPTH, max_prefixes=RedisScan.DEFAULT_MAX_PREFIXES, **kwargs):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, pattern, False, False, **kwargs)
+        # Arguments for sampling memory usage
+        self.top = top
+        self.samples = samples
+        self.sample_rate = max(1, sample_rate)
+        self.delimiter = delimiter
+        self.prefix_depth = prefix_depth
+        self.max_prefixes = max_prefixes
+        if self.key_filter is not None:
+            raise ValueError("Estimates of sampled memory assume every key scanned is matched, key filters cannot be used")
+
+    def get_memory_usage(self, node_client, keys):
+        """MEMORY USAGE and TYPE of a page of keys in a single round trip, skipping keys gone since the SCAN"""
+        memory_pipeline = node_client.pipeline(transaction=False)
+        for key_value in keys:
+            memory_pipeline.memory_usage(key_value, samples=self.samples)
+            memory_pipeline.type(key_value)
+        replies = memory_pipeline.execute()
+        return [(key_value, memory, StreamKeySink.decode(key_type))
+                for key_value, memory, key_type in zip(keys, replies[0::2], replies[1::2]) if memory is not None]
+
+    def record_prefix(self, prefixes, key_value, memory):
+        prefix = self.get_key_prefix(key_value, self.delimiter, self.prefix_depth)
+        prefix = self.get_prefix_name(prefixes, prefix, self.max_prefixes)
+        aggregate = prefixes.setdefault(prefix, {"keys": 0, "memory": 0})
+        aggregate["keys"] += 1
+        aggregate["memory"] += memory
+
+    def snapshot_statistics(self, statistics):
+        """Copy of the largest keys and prefixes as of the cursor, only needed when checkpointing"""
+        if self.checkpoint_path is None:
+            return statistics
+        snapshot = dict(statistics)
+        snapshot["largest_keys"] = [list(entry) for entry in statistics["largest_keys"]]
+        snapshot["prefixes"] = {prefix: dict(aggregate) for prefix, aggregate in statistics["prefixes"].items()}
+        return snapshot
+
+    def memory_pattern_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_scanned": 0,
+                                                     "keys_sampled": 0,
+                                                     "memory_sampled": 0,
+                                                     "largest_keys": [],
+                                                     "prefixes": {}})
+        # Min-heap of [memory, key, type] - the smallest of the largest keys is evicted first
+        largest_keys = statistics["largest_keys"]
+        heapq.heapify(largest_keys)
+        prefixes = statistics["prefixes"]
+        read_client = self.get_read_client(node, node_client, statistics)
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        for cursor, keys in self.scan_node_pages(node, read_client, throttle, tuner):
+            # Sample every Nth key of the node, carrying the position over page boundaries
+            offset = (-statistics["keys_scanned"]) % self.sample_rate
+            statistics["keys_scanned"] += len(keys)
+            keys = keys[offset::self.sample_rate]
+            if keys:
+                flush_start = time.time()
+                usage = self.get_memory_usage(read_client, keys)
+                tuner.record_flush(time.time() - flush_start, len(keys))
+                for key_value, memory, key_type in usage:
+                    key_value = StreamKeySink.decode(key_value)
+                    statistics["keys_sampled"] += 1
+                    statistics["memory_sampled"] += memory
+                    self.record_prefix(prefixes, key_value, memory)
+                    if len(largest_keys) < self.top:
+                        heapq.heappush(largest_keys, [memory, key_value, key_type])
+                    elif memory > largest_keys[0][0]:
+                        heapq.heapreplace(largest_keys, [memory, key_value, key_type])
+            self.update_checkpoint(node, cursor, self.snapshot_statistics(statistics))
+        result = {key: value for key, value in statistics.items() if key not in ("largest_keys", "prefixes")}
+        result["largest_keys"] = [{"key": key_value, "memory": memory, "type": key_type, "node": node["name"]}
+                                  for memory, key_value, key_type in largest_keys]
+        result["prefixes"] = [{"prefix": prefix, "keys": aggregate["keys"], "memory": aggregate["memory"]}
+                              for prefix, aggregate in prefixes.items()]
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def merge_prefixes(self, node_prefixes):
+        """Merge per-node aggregates, scaled up to estimates of the whole keyspace when sampling"""
+        prefixes = {}
+        for node_prefix in node_prefixes:
+            aggregate = prefixes.setdefault(node_prefix["prefix"], {"prefix": node_prefix["prefix"], "keys": 0, "memory": 0})
+            aggregate["keys"] += node_prefix["keys"]
+            aggregate["memory"] += node_prefix["memory"]
+        for aggregate in prefixes.values():
+            aggregate["estimated_keys"] = aggregate["keys"] * self.sample_rate
+            aggregate["estimated_memory"] = aggregate["memory"] * self.sample_rate
+        return sorted(prefixes.values(), key=lambda x: x["memory"], reverse=True)[:self.max_prefixes]
+
+    def memory_pattern(self):
+        start_time = time.time()
+        result = self.scan_nodes(self.memory_pattern_node)
+        # End statistic
+        end_time = time.time()
+        # Calculate statistics
+        total_time = end_time - start_time
+        keys_sampled = result.get("keys_sampled", 0)
+        result.update({"total_time": total_time,
+                       "execution_time": total_time - result.get("sleep_time", 0),
+                       "largest_keys": sorted(result.get("largest_keys", []), key=lambda x: x["memory"], reverse=True)[:self.top],
+                       "prefixes": self.merge_prefixes(result.get("prefixes", [])),
+                       "estimated_memory": result.get("memory_sampled", 0) * result.get("keys_scanned", 0) / keys_sampled if keys_sampled else 0,
+                       "pattern": self.pattern,
+                       "samples": self.samples,
+                       "sample_rate": self.sample_rate})
+        return result
+
+    def execute(self):
+        return self.memory_pattern()
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Find the keys and key prefixes using the most memory")
+    parser.add_argument("--host", type=str, required=True, help="Redis instance / cluster endpoint")
+    parser.add_argument("--port", type=int, default=DEFAULT_REDIS_PORT, help="Redis instance / cluster port - Defaults to {}".format(str(DEFAULT_REDIS_PORT)))
+    # Check if cluster mode or not
+    cluster_mode_group = parser.add_mutually_exclusive_group(required=True)
+    cluster_mode_group.add_argument("--cluster_mode_enabled",
+                                    action="store_true",
+                                    dest="cluster_mode",
+                                    help="Indicate that Redis instance is cluster mode enabled")
+    cluster_mode_group.add_argument("--cluster_mode_disabled",
+                                    action="store_false",
+                                    dest="cluster_mode",
+                                    help="Indicate that Redis instance is cluster mode disabled")
+    parser.add_argument("--authentication", type=str, required=False, help="Authentication required for Redis")
+    parser.add_argument("--decode_responses", type=bool, default=False, required=False, help="Decode responses from Redis")
+    parser.add_argument("--pattern", type=str, default=RedisScan.WILDCARD, help="Pattern to match desired key(s) - Defaults to every key")
+    parser.add_argument("--top", type=int, default=RedisMemory.DEFAULT_TOP,
+                        help="Number of largest keys reported - Defaults to {}".format(str(RedisMemory.DEFAULT_TOP)))
+    parser.add_argument("--samples", type=int, default=RedisMemory.DEFAULT_SAMPLES,
+                        help="Elements sampled by MEMORY USAGE for nested types, 0 for all - Defaults to {}".format(str(RedisMemory.DEFAULT_SAMPLES)))
+    parser.add_argument("--sample_rate", type=int, default=RedisMemory.DEFAULT_SAMPLE_RATE,
+                        help="Only inspect every Nth key scanned - Defaults to {}".format(str(RedisMemory.DEFAULT_SAMPLE_RATE)))
+    parser.add_argument("--delimiter", type=str, default=RedisMemory.DEFAULT_DELIMITER,
+                        help="Delimiter between key segments - Defaults to {}".format(RedisMemory.DEFAULT_DELIMITER))
+    parser.add_argument("--prefix_depth", type=int, default=RedisMemory.DEFAULT_PREFIX_DEPTH,
+                        help="Number of key segments forming a prefix - Defaults to {}".format(str(RedisMemory.DEFAULT_PREFIX_DEPTH)))
+    parser.add_argument("--max_prefixes", type=int, default=RedisMemory.DEFAULT_MAX_PREFIXES,
+                        help="Number of distinct prefixes tracked per node - Defaults to {}".format(str(RedisMemory.DEFAULT_MAX_PREFIXES)))
+    parser.add_argument("--max_connections", type=int, required=False,
+                        help="Connections per node pool, waiting for a free connection beyond it - Defaults to unbounded, {} per cluster client".format(str(RedisCommon.DEFAULT_MAX_CONNECTION)))
+    parser.add_argument("--read_preference", type=str, choices=READ_PREFERENCES, default=PRIMARY, required=False,
+                        help="Node(s) SCAN and TTL / TYPE reads go to, writes always going to the master - Defaults to {}".format(PRIMARY))
+    parser.add_argument("--max_replication_lag", type=int, default=DEFAULT_MAX_REPLICATION_LAG, required=False,
+                        help="Seconds since a replica last acknowledged its master beyond which it is not read from - Defaults to {}".format(str(DEFAULT_MAX_REPLICATION_LAG)))
+    parser.add_argument("--concurrency", type=int, default=RedisNodeExecutor.DEFAULT_CONCURRENCY, required=False,
+                        help="Number of master nodes scanned concurrently")
+    parser.add_argument("--checkpoint", type=str, required=False, help="File to periodically persist SCAN cursor(s) and statistics to")
+    parser.add_argument("--resume", action="store_true", required=False, help="Resume from the cursor(s) persisted in --checkpoint")
+    parser.add_argument("--auto_tune", action="store_true", required=False, help="Tune SCAN COUNT to --target_latency")
+    parser.add_argument("--target_latency", type=float, default=AutoBatchTuner.DEFAULT_TARGET_LATENCY, required=False,
+                        help="Target seconds per SCAN page when auto tuning")
+    parser.add_argument("--throttle", type=str, choices=THROTTLE_MODES, default=FIXED, required=False,
+                        help="Throttle pacing each node")
+    parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC, required=False,
+                        help="Target keys per second per node for token_bucket / feedback throttle")
+    add_instrumentation_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    instrumentation = pop_instrumentation_arguments(args)
+    task = RedisMemory(**vars(args))
+    result = task.run(**instrumentation)
+    pprint(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Per command latency histograms, pipeline sizes, bytes on the wire and client CPU time of a task"""
+import json
+import threading
+import time
+
+from redis import Redis
+from redis.client import Pipeline
+from redis.connection import Connection
+from redis_histogram import LogHistogram
+
+JSON = "json"
+PROMETHEUS = "prometheus"
+METRICS_FORMATS = (JSON, PROMETHEUS)
+PIPELINE = "PIPELINE"
+MICROSECONDS_PER_SECOND = 1000000
+
+
+class CountingSocket:
+    """Socket counting the bytes received into the connection owning it"""
+
+    def __init__(self, sock, connection):
+        self._sock = sock
+        self._connection = connection
+
+    def recv(self, *args, **kwargs):
+        data = self._sock.recv(*args, **kwargs)
+        self._connection.bytes_received += len(data)
+        return data
+
+    def recv_into(self, buffer, *args, **kwargs):
+        received = self._sock.recv_into(buffer, *args, **kwargs)
+        self._connection.bytes_received += received
+        return received
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class InstrumentedConnection(Connection):
+    """Bytes sent and received, and start time, of the request last sent on the connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.request_start = None
+
+    def _connect(self):
+        return CountingSocket(super()._connect(), self)
+
+    def send_packed_command(self, command, check_health=True):
+        # Single commands and whole pipelines are sent in one call, resetting the counters per request
+        self.request_start = time.perf_counter()
+        self.bytes_received = 0
+        self.bytes_sent = len(command) if isinstance(command, (str, bytes)) else sum(len(item) for item in command)
+        super().send_packed_command(command, check_health)
+
+
+class InstrumentedRedis(Redis):
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def parse_response(self, connection, command_name, **options):
+        try:
+            return super().parse_response(connection, command_name, **options)
+        finally:
+            if getattr(connection, "request_start", None) is not None:
+                self.metrics.record_command(command_name, time.perf_counter() - connection.request_start,
+                                            connection.bytes_sent, connection.bytes_received)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint, metrics=self.metrics)
+
+
+class InstrumentedPipeline(Pipeline):
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def record_pipeline(self, connection, commands):
+        if getattr(connection, "request_start", None) is not None:
+            self.metrics.record_pipeline([args[0] for args, _ in commands], time.perf_counter() - connection.request_start,
+                                         connection.bytes_sent, connection.bytes_received)
+
+    def _execute_pipeline(self, connection, commands, raise_on_error):
+        try:
+            return super()._execute_pipeline(connection, commands, raise_on_error)
+        finally:
+            self.record_pipeline(connection, commands)
+
+    def _execute_transaction(self, connection, commands, raise_on_error):
+        try:
+            return super()._execute_transaction(connection, commands, raise_on_error)
+        finally:
+            self.record_pipeline(connection, commands)
+
+
+class RedisMetrics:
+    """Fixed memory per command type - latencies in microseconds are kept in logarithmic histograms"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.commands = {}
+        self.pipeline_sizes = LogHistogram()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.start_time = time.time()
+        self.start_cpu_time = time.process_time()
+        self.end_time = None
+        self.end_cpu_time = None
+
+    @staticmethod
+    def get_command_name(command_name):
+        if isinstance(command_name, bytes):
+            command_name = command_name.decode("utf-8", errors="replace")
+        return str(command_name).upper()
+
+    def record_request(self, name, latency, bytes_sent, bytes_received):
+        self.latencies.setdefault(name, LogHistogram()).record(int(latency * MICROSECONDS_PER_SECOND))
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+    def record_command(self, command_name, latency, bytes_sent, bytes_received):
+        name = self.get_command_name(command_name)
+        with self.lock:
+            self.record_request(name, latency, bytes_sent, bytes_received)
+            self.commands[name] = self.commands.get(name, 0) + 1
+
+    def record_pipeline(self, command_names, latency, bytes_sent, bytes_received):
+        """A pipeline is timed as a whole, while its commands are counted one by one"""
+        with self.lock:
+            self.record_request(PIPELINE, latency, bytes_sent, bytes_received)
+            self.pipeline_sizes.record(len(command_names))
+            for command_name in command_names:
+                name = self.get_command_name(command_name)
+                self.commands[name] = self.commands.get(name, 0) + 1
+
+    def stop(self):
+        self.end_time = time.time()
+        self.end_cpu_time = time.process_time()
+
+    def get_statistics(self):
+        with self.lock:
+            end_time = self.end_time if self.end_time is not None else time.time()
+            end_cpu_time = self.end_cpu_time if self.end_cpu_time is not None else time.process_time()
+            return {"commands": dict(self.commands),
+                    "latency_in_microsec": {name: histogram.get_statistics() for name, histogram in self.latencies.items()},
+                    "pipeline_size": self.pipeline_sizes.get_statistics(),
+                    "bytes_sent": self.bytes_sent,
+                    "bytes_received": self.bytes_received,
+                    "wall_time": end_time - self.start_time,
+                    "cpu_time": end_cpu_time - self.start_cpu_time}
+
+    @staticmethod
+    def format_labels(labels):
+        return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels.items())
+
+    def format_prometheus(self, labels=None):
+        """Prometheus text exposition format, e.g. for the node exporter textfile collector"""
+        labels = labels or {}
+        statistics = self.get_statistics()
+        lines = ["# TYPE redis_troubleshoot_commands_total counter"]
+        for name, count in sorted(statistics["commands"].items()):
+            lines.append("redis_troubleshoot_commands_total{{{}}} {}".format(self.format_labels(dict(labels, command=name)), count))
+        lines.append("# TYPE redis_troubleshoot_request_latency_microseconds summary")
+        for name, histogram in sorted(self.latencies.items()):
+            for quantile in (0.5, 0.99):
+                quantile_labels = self.format_labels(dict(labels, command=name, quantile=quantile))
+                lines.append("redis_troubleshoot_request_latency_microseconds{{{}}} {}".format(quantile_labels, histogram.percentile(quantile * 100)))
+            name_labels = self.format_labels(dict(labels, command=name))
+            lines.append("redis_troubleshoot_request_latency_microseconds_sum{{{}}} {}".format(name_labels, histogram.total))
+            lines.append("redis_troubleshoot_request_latency_microseconds_count{{{}}} {}".format(name_labels, histogram.count))
+        for metric, field in (("bytes_sent_total", "bytes_sent"), ("bytes_received_total", "bytes_received"),
+                              ("cpu_seconds_total", "cpu_time"), ("wall_seconds_total", "wall_time")):
+            lines.append("# TYPE redis_troubleshoot_{} counter".format(metric))
+            lines.append("redis_troubleshoot_{}{{{}}} {}".format(metric, self.format_labels(labels), statistics[field]))
+        return "\n".join(lines) + "\n"
+
+    def format_json(self):
+        return json.dumps(self.get_statistics())
+
+    def write(self, output, metrics_format=JSON, labels=None):
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError("Expect metrics format to be one of {}".format(", ".join(METRICS_FORMATS)))
+        content = self.format_prometheus(labels) if metrics_format == PROMETHEUS else self.format_json() + "\n"
+        with open(output, "w") as metrics_file:
+            metrics_file.write(content)
+
+
+def add_instrumentation_arguments(parser):
+    """Instrumentation arguments shared by every task"""
+    parser.add_argument("--metrics", action="store_true", help="Attach per command latency, pipeline sizes, bytes and CPU time to the result")
+    parser.add_argument("--metrics_output", type=str, help="File to write the metrics to once the task is done")
+    parser.add_argument("--metrics_format", type=str, choices=METRICS_FORMATS, default=JSON,
+                        help="Format of --metrics_output - Defaults to {}".format(JSON))
+    parser.add_argument("--profile", type=str, help="File to dump cProfile statistics of the task to, for pstats or snakeviz")
+
+
+def pop_instrumentation_arguments(args):
+    """Take the instrumentation arguments out of the parsed arguments, leaving those of the task"""
+    return {name: vars(args).pop(name) for name in ("metrics", "metrics_output", "metrics_format", "profile")}
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""Answer the questions of RedisVerify from RDB snapshots on disk rather than from the live server,
+   streaming through memory-mapped files so that memory stays bounded whatever their size"""
+import heapq
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+from argparse import ArgumentParser
+from pprint import pprint
+from redis_scan import RedisScan
+from redis_sink import OUTPUT_FORMATS, PLAIN, STDOUT, StreamKeySink, create_key_sink
+from redis_verify import merge_prefixes, record_prefixes
+
+# Opcodes
+SLOT_INFO = 0xF4
+MODULE_AUX = 0xF7
+IDLE = 0xF8
+FREQ = 0xF9
+AUX = 0xFA
+RESIZEDB = 0xFB
+EXPIRETIME_MS = 0xFC
+EXPIRETIME = 0xFD
+SELECTDB = 0xFE
+EOF = 0xFF
+FUNCTION2 = 0xF5
+
+# Value types
+STRING = 0
+LIST = 1
+SET = 2
+ZSET = 3
+HASH = 4
+ZSET_2 = 5
+MODULE_2 = 7
+QUICKLIST = 14
+STREAM_LISTPACKS = 15
+QUICKLIST_2 = 18
+STREAM_LISTPACKS_2 = 19
+STREAM_LISTPACKS_3 = 21
+# Hashes with field TTLs from Redis 7.4, the release candidate types without the minimum expiry of the hash
+HASH_METADATA_PRE_GA = 22
+HASH_LISTPACK_EX_PRE_GA = 23
+HASH_METADATA = 24
+HASH_LISTPACK_EX = 25
+# Types stored as a single blob - zipmap, ziplist, intset and listpack encodings
+BLOB_TYPES = (9, 10, 11, 12, 13, 16, 17, 20, HASH_LISTPACK_EX_PRE_GA)
+TYPE_NAMES = {STRING: "string", LIST: "list", SET: "set", ZSET: "zset", HASH: "hash", ZSET_2: "zset", MODULE_2: "module",
+              9: "hash", 10: "list", 11: "set", 12: "zset", 13: "hash", QUICKLIST: "list", STREAM_LISTPACKS: "stream",
+              16: "hash", 17: "zset", QUICKLIST_2: "list", STREAM_LISTPACKS_2: "stream", 20: "set", STREAM_LISTPACKS_3: "stream",
+              HASH_METADATA_PRE_GA: "hash", HASH_LISTPACK_EX_PRE_GA: "hash", HASH_METADATA: "hash", HASH_LISTPACK_EX: "hash"}
+
+# Special string encodings
+ENCODING_INT8 = 0
+ENCODING_INT16 = 1
+ENCODING_INT32 = 2
+ENCODING_LZF = 3
+
+MODULE_OPCODE_EOF = 0
+MODULE_OPCODE_SINT = 1
+MODULE_OPCODE_UINT = 2
+MODULE_OPCODE_FLOAT = 3
+MODULE_OPCODE_DOUBLE = 4
+MODULE_OPCODE_STRING = 5
+
+MAX_RDB_VERSION = 12
+
+
+def lzf_decompress(data, length):
+    """LZF as used by Redis for strings over 20 bytes - only needed for keys, values are skipped compressed"""
+    output = bytearray()
+    position = 0
+    while position < len(data):
+        control = data[position]
+        position += 1
+        if control < 32:
+            # Literal run of control + 1 bytes
+            output += data[position:position + control + 1]
+            position += control + 1
+            continue
+        # Back reference of length + 2 bytes
+        run = control >> 5
+        if run == 7:
+            run += data[position]
+            position += 1
+        reference = len(output) - ((control & 0x1F) << 8) - data[position] - 1
+        position += 1
+        for index in range(reference, reference + run + 2):
+            output.append(output[index])
+    if len(output) != length:
+        raise ValueError("LZF string expected to be {} bytes, found {} bytes instead".format(length, len(output)))
+    return bytes(output)
+
+
+def compile_pattern(pattern):
+    """Regular expression matching keys as Redis glob-style patterns do for SCAN MATCH"""
+    expression = []
+    position = 0
+    while position < len(pattern):
+        character = pattern[position]
+        position += 1
+        if character == "*":
+            expression.append(".*")
+        elif character == "?":
+            expression.append(".")
+        elif character == "\\" and position < len(pattern):
+            expression.append(re.escape(pattern[position]))
+            position += 1
+        elif character == "[" and "]" in pattern[position:]:
+            members = []
+            if pattern[position] == "^":
+                members.append("^")
+                position += 1
+            while pattern[position] != "]":
+                if pattern[position] == "\\" and position + 1 < len(pattern):
+                    position += 1
+                    members.append(re.escape(pattern[position]))
+                elif pattern[position] == "-" and len(members) > 0 and pattern[position + 1] != "]":
+                    members.append("-")
+                else:
+                    members.append(re.escape(pattern[position]))
+                position += 1
+            position += 1
+            expression.append("[{}]".format("".join(members)))
+        else:
+            expression.append(re.escape(character))
+    return re.compile("".join(expression).encode("utf-8"), re.DOTALL)
+
+
+class RdbParser:
+    """Walk the entries of an RDB file, decoding keys and skipping over values while measuring their encoded size.
+       The file is memory-mapped and read once front to back, so the page cache rather than the process holds it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.data = None
+        self.position = 0
+        self.version = None
+        self.aux = {}
+
+    def __enter__(self):
+        self.file = open(self.path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.data, "madvise"):
+            self.data.madvise(mmap.MADV_SEQUENTIAL)
+        return self
+
+    def __exit__(self, *args):
+        self.data.close()
+        self.file.close()
+
+    def read_byte(self):
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def read(self, length):
+        value = self.data[self.position:self.position + length]
+        self.position += length
+        return value
+
+    def read_length(self):
+        """Length, or special encoding of a string when the second value is True"""
+        first = self.data[self.position]
+        kind = first >> 6
+        if kind == 0:
+            self.position += 1
+            return first, False
+        elif kind == 1:
+            self.position += 2
+            return ((first & 0x3F) << 8) | self.data[self.position - 1], False
+        self.position += 1
+        if kind == 3:
+            return first & 0x3F, True
+        elif first == 0x80:
+            return struct.unpack(">I", self.read(4))[0], False
+        elif first == 0x81:
+            return struct.unpack(">Q", self.read(8))[0], False
+        raise ValueError("Unknown length encoding {:#x} at offset {} of {}".format(first, self.position - 1, self.path))
+
+    def read_string(self):
+        # Most keys are shorter than 64 bytes, their length fitting in a single byte
+        first = self.data[self.position]
+        if first < 0x40:
+            self.position += first + 1
+            return self.data[self.position - first:self.position]
+        length, encoded = self.read_length()
+        if not encoded:
+            return self.read(length)
+        elif length == ENCODING_INT8:
+            return str(struct.unpack("<b", self.read(1))[0]).encode("utf-8")
+        elif length == ENCODING_INT16:
+            return str(struct.unpack("<h", self.read(2))[0]).encode("utf-8")
+        elif length == ENCODING_INT32:
+            return str(struct.unpack("<i", self.read(4))[0]).encode("utf-8")
+        elif length == ENCODING_LZF:
+            compressed_length = self.read_length()[0]
+            uncompressed_length = self.read_length()[0]
+            return lzf_decompress(self.read(compressed_length), uncompressed_length)
+        raise ValueError("Unknown string encoding {} at offset {} of {}".format(length, self.position, self.path))
+
+    def skip_string(self):
+        first = self.data[self.position]
+        if first < 0x40:
+            self.position += first + 1
+            return
+        length, encoded = self.read_length()
+        if not encoded:
+            self.position += length
+        elif length == ENCODING_INT8:
+            self.position += 1
+        elif length == ENCODING_INT16:
+            self.position += 2
+        elif length == ENCODING_INT32:
+            self.position += 4
+        elif length == ENCODING_LZF:
+            compressed_length = self.read_length()[0]
+            self.read_length()
+            self.position += compressed_length
+        else:
+            raise ValueError("Unknown string encoding {} at offset {} of {}".format(length, self.position, self.path))
+
+    def skip_strings(self, count):
+        for _ in range(count):
+            self.skip_string()
+
+    def skip_double(self):
+        """Double of the original zset encoding, as a length prefixed string or 253 - 255 for NaN and infinities"""
+        length = self.read_byte()
+        if length < 253:
+            self.position += length
+
+    def skip_module(self):
+        """Module values and module aux data saved with module opcodes are self-describing"""
+        while True:
+            opcode = self.read_length()[0]
+            if opcode == MODULE_OPCODE_EOF:
+                return
+            elif opcode in (MODULE_OPCODE_SINT, MODULE_OPCODE_UINT):
+                self.read_length()
+            elif opcode == MODULE_OPCODE_FLOAT:
+                self.position += 4
+            elif opcode == MODULE_OPCODE_DOUBLE:
+                self.position += 8
+            elif opcode == MODULE_OPCODE_STRING:
+                self.skip_string()
+            else:
+                raise ValueError("Unknown module opcode {} at offset {} of {}".format(opcode, self.position, self.path))
+
+    def skip_stream(self, value_type):
+        # Listpacks keyed by their master entry ID
+        self.skip_strings(2 * self.read_length()[0])
+        # Length and last entry ID, then first entry ID, max deleted entry ID and entries added from version 2
+        for _ in range(3 if value_type == STREAM_LISTPACKS else 8):
+            self.read_length()
+        for _ in range(self.read_length()[0]):
+            # Consumer group name, last delivered ID and, from version 2, entries read
+            self.skip_string()
+            for _ in range(2 if value_type == STREAM_LISTPACKS else 3):
+                self.read_length()
+            # Pending entries: raw ID, delivery time and delivery count
+            for _ in range(self.read_length()[0]):
+                self.position += 24
+                self.read_length()
+            for _ in range(self.read_length()[0]):
+                # Consumer name, seen time, active time from version 3, and raw IDs of its pending entries
+                self.skip_string()
+                self.position += 16 if value_type == STREAM_LISTPACKS_3 else 8
+                pending_entries = self.read_length()[0]
+                self.position += 16 * pending_entries
+
+    def skip_value(self, value_type):
+        if value_type == STRING or value_type in BLOB_TYPES:
+            self.skip_string()
+        elif value_type in (LIST, SET, QUICKLIST):
+            self.skip_strings(self.read_length()[0])
+        elif value_type == HASH:
+            self.skip_strings(2 * self.read_length()[0])
+        elif value_type == ZSET:
+            for _ in range(self.read_length()[0]):
+                self.skip_string()
+                self.skip_double()
+        elif value_type == ZSET_2:
+            for _ in range(self.read_length()[0]):
+                self.skip_string()
+                self.position += 8
+        elif value_type == QUICKLIST_2:
+            for _ in range(self.read_length()[0]):
+                # Container format, then the node itself
+                self.read_length()
+                self.skip_string()
+        elif value_type in (STREAM_LISTPACKS, STREAM_LISTPACKS_2, STREAM_LISTPACKS_3):
+            self.skip_stream(value_type)
+        elif value_type == MODULE_2:
+            # Module ID, then opcodes
+            self.read_length()
+            self.skip_module()
+        elif value_type in (HASH_METADATA, HASH_METADATA_PRE_GA):
+            if value_type == HASH_METADATA:
+                # Minimum expiry of the fields in milliseconds
+                self.position += 8
+            for _ in range(self.read_length()[0]):
+                # TTL of the field, then field and value
+                self.read_length()
+                self.skip_strings(2)
+        elif value_type == HASH_LISTPACK_EX:
+            # Minimum expiry of the fields in milliseconds, then the listpack
+            self.position += 8
+            self.skip_string()
+        else:
+            raise ValueError("Unsupported value type {} at offset {} of {}".format(value_type, self.position, self.path))
+
+    def read_header(self):
+        magic = self.read(9)
+        if magic[:5] != b"REDIS":
+            raise ValueError("{} is not an RDB file".format(self.path))
+        self.version = int(magic[5:])
+        if self.version > MAX_RDB_VERSION:
+            raise ValueError("RDB version {} of {} is not supported, up to {} is".format(self.version, self.path, MAX_RDB_VERSION))
+
+    def entries(self):
+        """(db, key, type, expiry in milliseconds or None, encoded size of key and value) of every key"""
+        self.position = 0
+        self.read_header()
+        db = 0
+        expire_time = None
+        while True:
+            opcode = self.data[self.position]
+            self.position += 1
+            if opcode == EOF:
+                return
+            elif opcode == SELECTDB:
+                db = self.read_length()[0]
+            elif opcode == RESIZEDB:
+                self.read_length()
+                self.read_length()
+            elif opcode == AUX:
+                name = self.read_string()
+                self.aux[name.decode("utf-8", errors="backslashreplace")] = self.read_string()
+            elif opcode == EXPIRETIME_MS:
+                expire_time = struct.unpack("<Q", self.read(8))[0]
+            elif opcode == EXPIRETIME:
+                expire_time = struct.unpack("<I", self.read(4))[0] * 1000
+            elif opcode == IDLE:
+                self.read_length()
+            elif opcode == FREQ:
+                self.position += 1
+            elif opcode == MODULE_AUX:
+                # Module ID, when the aux data is loaded, then opcodes
+                self.read_length()
+                self.read_length()
+                self.read_length()
+                self.skip_module()
+            elif opcode == FUNCTION2:
+                self.skip_string()
+            elif opcode == SLOT_INFO:
+                # Slot, its number of keys and of keys with an expiry, in cluster mode snapshots
+                self.read_length()
+                self.read_length()
+                self.read_length()
+            else:
+                start = self.position
+                key_value = self.read_string()
+                self.skip_value(opcode)
+                yield db, key_value, opcode, expire_time, self.position - start
+                expire_time = None
+
+    def get_snapshot_time(self):
+        """Time the snapshot was taken in milliseconds, from its ctime aux field or else the file itself,
+           only known once the aux fields at the start of the file are read"""
+        ctime = self.aux.get("ctime")
+        if ctime is not None:
+            return int(ctime) * 1000
+        return int(os.path.getmtime(self.path) * 1000)
+
+
+class RedisRdb:
+    """Offline counterpart of RedisVerify over RDB files, e.g. one per shard of a cluster, with memory per prefix.
+       Memory is the encoded size of keys and values in the snapshot, a lower bound of their size in memory"""
+    DEFAULT_TOP = 20
+
+    def __init__(self, rdb, pattern=RedisScan.WILDCARD, no_ttl_only=False, print_keys=False, db=0, prefix_depth=None,
+                 delimiter=RedisScan.DEFAULT_DELIMITER, max_prefixes=RedisScan.DEFAULT_MAX_PREFIXES, ttl_buckets=False,
+                 top=DEFAULT_TOP, output_keys=None, output_format=PLAIN, compress_output=False):
+        self.paths = [rdb] if isinstance(rdb, str) else list(rdb)
+        self.pattern = pattern
+        self.no_ttl_only = no_ttl_only
+        self.print_keys = print_keys
+        self.db = db
+        self.prefix_depth = prefix_depth
+        self.delimiter = delimiter
+        self.max_prefixes = max_prefixes
+        self.ttl_buckets = ttl_buckets
+        self.top = top
+        self.output_keys = output_keys
+        self.output_format = output_format
+        self.compress_output = compress_output
+        self.key_sink = None
+
+    def analyse_file(self, path, matcher):
+        statistics = {"keys_scanned": 0,
+                      "keys_encountered": 0,
+                      "expired_keys": 0,
+                      "memory": 0,
+                      "bytes_read": os.path.getsize(path)}
+        prefixes = {}
+        # Min-heap of [memory, key, type] - the smallest of the largest keys is evicted first
+        largest_keys = []
+        # Matched keys are handed to the key sink in pages, as RedisVerify does per SCAN page
+        keys = []
+        collect_keys = self.print_keys or self.output_keys is not None
+        with RdbParser(path) as parser:
+            snapshot_time = None
+            for db, key_value, value_type, expire_time, memory in parser.entries():
+                if self.db is not None and db != self.db:
+                    continue
+                statistics["keys_scanned"] += 1
+                if matcher is not None and not matcher.fullmatch(key_value):
+                    continue
+                if snapshot_time is None:
+                    snapshot_time = parser.get_snapshot_time()
+                if expire_time is None:
+                    ttl = RedisScan.NO_TTL_SET
+                elif expire_time <= snapshot_time:
+                    # Expired before the snapshot, dropped when loaded
+                    statistics["expired_keys"] += 1
+                    continue
+                elif self.no_ttl_only:
+                    continue
+                else:
+                    ttl = (expire_time - snapshot_time) // 1000
+                statistics["keys_encountered"] += 1
+                statistics["memory"] += memory
+                if collect_keys:
+                    keys.append(key_value)
+                    if len(keys) >= RedisScan.DEFAULT_COUNT:
+                        self.key_sink.write(keys, path)
+                        keys = []
+                if self.prefix_depth is not None:
+                    record_prefixes(prefixes, StreamKeySink.decode(key_value), self.delimiter, self.prefix_depth, self.max_prefixes,
+                                    ttl if self.ttl_buckets else None, memory)
+                if self.top:
+                    # Keys are only decoded once reported
+                    if len(largest_keys) < self.top:
+                        heapq.heappush(largest_keys, [memory, key_value, value_type])
+                    elif memory > largest_keys[0][0]:
+                        heapq.heapreplace(largest_keys, [memory, key_value, value_type])
+            self.key_sink.write(keys, path)
+            statistics.update({"rdb_version": parser.version,
+                               "snapshot_time": parser.get_snapshot_time() // 1000})
+        statistics["largest_keys"] = [{"key": StreamKeySink.decode(key_value), "memory": memory,
+                                       "type": TYPE_NAMES.get(value_type, str(value_type)), "node": path}
+                                      for memory, key_value, value_type in largest_keys]
+        statistics["prefixes"] = [dict(aggregate, prefix=prefix) for prefix, aggregate in prefixes.items()]
+        return statistics
+
+    def analyse(self):
+        start_time = time.time()
+        # Every key matches the wildcard, which needs no matching at all
+        matcher = compile_pattern(self.pattern) if self.pattern != RedisScan.WILDCARD else None
+        self.key_sink = create_key_sink(self.print_keys, self.output_keys, self.output_format, self.compress_output)
+        result = {"nodes": {}}
+        try:
+            for path in self.paths:
+                statistics = self.analyse_file(path, matcher)
+                for key, value in statistics.items():
+                    if isinstance(value, list):
+                        result.setdefault(key, []).extend(value)
+                    elif key not in ("rdb_version", "snapshot_time"):
+                        result[key] = result.get(key, 0) + value
+                result["nodes"][path] = {key: value for key, value in statistics.items() if not isinstance(value, list)}
+        finally:
+            self.key_sink.close()
+        result.update(self.key_sink.get_statistics())
+        # End statistic
+        end_time = time.time()
+        # Calculate statistics
+        total_time = end_time - start_time
+        result.update({"total_time": total_time,
+                       "sleep_time": 0,
+                       "execution_time": total_time,
+                       "megabytes_per_second": result.get("bytes_read", 0) / total_time / 1000000 if total_time > 0 else 0,
+                       "largest_keys": sorted(result.get("largest_keys", []), key=lambda x: x["memory"], reverse=True)[:self.top],
+                       "pattern": self.pattern,
+                       "no_ttl_only": self.no_ttl_only})
+        if self.prefix_depth is not None:
+            result.update({"prefixes": merge_prefixes(result.get("prefixes", []), sort_field="memory"),
+                           "prefix_depth": self.prefix_depth})
+        else:
+            result.pop("prefixes", None)
+        return result
+
+    def execute(self):
+        return self.analyse()
+
+
+def get_arguments():
+    parser = ArgumentParser(description="Check keys available in RDB file(s), without touching the Redis instance")
+    parser.add_argument("--rdb", type=str, nargs="+", required=True, help="RDB file(s), e.g. one per shard")
+    parser.add_argument("--pattern", type=str, default=RedisScan.WILDCARD, help="Pattern to match desired key(s) - Defaults to every key")
+    parser.add_argument("--db", type=int, default=0, help="Database to check, -1 for every database - Defaults to 0")
+    parser.add_argument("--no_ttl_only", action="store_true", required=False, help="Check keys without TTL")
+    parser.add_argument("--print_keys", action="store_true", required=False, help="Print key(s)")
+    parser.add_argument("--prefix_depth", type=int, required=False,
+                        help="Break keys matched and their memory down by prefix, up to this number of key segments")
+    parser.add_argument("--delimiter", type=str, default=RedisScan.DEFAULT_DELIMITER, required=False,
+                        help="Delimiter between key segments - Defaults to {}".format(RedisScan.DEFAULT_DELIMITER))
+    parser.add_argument("--max_prefixes", type=int, default=RedisScan.DEFAULT_MAX_PREFIXES, required=False,
+                        help="Number of distinct prefixes tracked per file with --prefix_depth")
+    parser.add_argument("--ttl_buckets", action="store_true", required=False, help="Break each prefix down by TTL with --prefix_depth")
+    parser.add_argument("--top", type=int, default=RedisRdb.DEFAULT_TOP,
+                        help="Number of largest keys reported - Defaults to {}".format(str(RedisRdb.DEFAULT_TOP)))
+    parser.add_argument("--output_keys", type=str, required=False,
+                        help="Stream matched key(s) to this file as they are found, {} for stdout".format(STDOUT))
+    parser.add_argument("--output_format", type=str, choices=OUTPUT_FORMATS, default=PLAIN, required=False,
+                        help="Format of key(s) streamed by --output_keys")
+    parser.add_argument("--compress_output", action="store_true", required=False, help="Gzip key(s) streamed by --output_keys")
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    if args.db < 0:
+        args.db = None
+    task = RedisRdb(**vars(args))
+    result = task.execute()
+    # Keep the summary apart from key(s) streamed to stdout
+    pprint(result, stream=sys.stderr if args.output_keys == STDOUT else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import time
+
+from collections import deque
+from redis_checkpoint import RedisCheckpoint
+from redis_common import DEFAULT_MAX_REPLICATION_LAG, PRIMARY, RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_filter import DEFAULT_FILTER_PROCESSES, KeyFilterPool
+from redis_sink import PLAIN, create_key_sink
+from redis_throttle import DEFAULT_OPS_PER_SEC, FIXED, create_throttle
+from redis_tuner import AutoBatchTuner, BatchTuner
+
+
+class RedisScan(RedisCommon):
+    """Common base for tasks walking the keyspace by pattern"""
+    NO_TTL_SET = -1
+    DEFAULT_COUNT = 1000
+    DEFAULT_PIPELINE_BATCH = 1000
+
+    WILDCARD = "*"
+
+    DEFAULT_DELIMITER = ":"
+    DEFAULT_PREFIX_DEPTH = 1
+    DEFAULT_MAX_PREFIXES = 1000
+    NO_PREFIX = "(none)"
+    OTHER_PREFIX = "(other)"
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys,
+                 concurrency=RedisNodeExecutor.DEFAULT_CONCURRENCY, nodes=None, throttle=FIXED, ops_per_sec=DEFAULT_OPS_PER_SEC,
+                 output_keys=None, output_format=PLAIN, compress_output=False, checkpoint=None, resume=False,
+                 auto_tune=False, target_latency=AutoBatchTuner.DEFAULT_TARGET_LATENCY, max_connections=None,
+                 read_preference=PRIMARY, max_replication_lag=DEFAULT_MAX_REPLICATION_LAG, key_filter=None,
+                 filter_processes=DEFAULT_FILTER_PROCESSES):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, max_connections,
+                         read_preference, max_replication_lag)
+        # Parameters for walking the keyspace
+        self.pattern = pattern
+        self.no_ttl_only = no_ttl_only
+        self.print_keys = print_keys
+        self.concurrency = concurrency
+        self.nodes = nodes
+        self.throttle_mode = throttle
+        self.ops_per_sec = ops_per_sec
+        self.output_keys = output_keys
+        self.output_format = output_format
+        self.compress_output = compress_output
+        self.checkpoint_path = checkpoint
+        self.resume = resume
+        self.auto_tune = auto_tune
+        self.target_latency = target_latency
+        self.key_filter = key_filter
+        self.filter_processes = filter_processes
+        self.key_sink = None
+        self.checkpoint = None
+        self.filter_pool = None
+
+    def get_read_client(self, node, node_client, statistics):
+        """Client for the SCAN, TTL, TYPE and MEMORY USAGE reads of a node, writes staying on node_client.
+           The read node is kept in the statistics, as a resumed walk has to carry on where its cursor was taken"""
+        read_node = self.get_read_node(node, node_client, statistics.get("read_node"))
+        statistics["read_node"] = read_node["name"]
+        if read_node["name"] == node["name"]:
+            return node_client
+        return self.get_node_client(read_node, readonly=True)
+
+    def get_ttls(self, client, keys):
+        """Look up TTL for a page of keys in a single round trip"""
+        ttl_pipeline = client.pipeline(transaction=False)
+        for key_value in keys:
+            ttl_pipeline.ttl(key_value)
+        return ttl_pipeline.execute()
+
+    def get_keys_without_ttl(self, client, keys):
+        return [key_value for key_value, ttl in zip(keys, self.get_ttls(client, keys)) if ttl == self.NO_TTL_SET]
+
+    @staticmethod
+    def get_key_prefix(key_value, delimiter, depth):
+        """First depth segments of a key, always leaving out the last segment - None for a key without delimiter"""
+        segments = key_value.split(delimiter, depth)
+        if len(segments) == 1:
+            return None
+        return delimiter.join(segments[:min(depth, len(segments) - 1)])
+
+    @classmethod
+    def get_prefix_name(cls, prefixes, prefix, max_prefixes):
+        """Name a prefix is aggregated under, folding prefixes beyond the cap into a single bucket"""
+        if prefix is None:
+            prefix = cls.NO_PREFIX
+        if prefix not in prefixes and len(prefixes) >= max_prefixes:
+            prefix = cls.OTHER_PREFIX
+        return prefix
+
+    def create_throttle(self):
+        """Each node worker paces itself with its own throttle"""
+        return create_throttle(self.throttle_mode, self.ops_per_sec)
+
+    def create_tuner(self):
+        """Each node worker tunes its own batch sizes"""
+        if self.auto_tune:
+            return AutoBatchTuner(self.DEFAULT_COUNT, self.DEFAULT_PIPELINE_BATCH, self.target_latency)
+        return BatchTuner(self.DEFAULT_COUNT, self.DEFAULT_PIPELINE_BATCH)
+
+    def scan_node_pages(self, node, node_client, throttle, tuner):
+        """SCAN a node page by page with an explicit cursor, starting from the checkpointed cursor when resuming.
+           Only the SCAN call is timed for the tuner, the page being paced by the throttle once the caller is done with it"""
+        if self.checkpoint.is_complete(node["name"]):
+            return
+        cursor = self.checkpoint.get_cursor(node["name"])
+        while True:
+            page_start = time.time()
+            cursor, keys = node_client.scan(cursor=cursor, match=self.pattern, count=tuner.scan_count)
+            tuner.record_page(time.time() - page_start, len(keys))
+            yield cursor, keys
+            throttle.throttle(len(keys))
+            if int(cursor) == 0:
+                break
+
+    def get_filtered_keys(self, node_client, keys):
+        """Keys of a page matched by the filter whose TTL and type also satisfy it, looked up in a single round trip"""
+        if not keys or not (self.key_filter.needs_ttl or self.key_filter.needs_type):
+            return keys
+        lookup_pipeline = node_client.pipeline(transaction=False)
+        for key_value in keys:
+            if self.key_filter.needs_ttl:
+                lookup_pipeline.ttl(key_value)
+            if self.key_filter.needs_type:
+                lookup_pipeline.type(key_value)
+        replies = iter(lookup_pipeline.execute())
+        matched_keys = []
+        for key_value in keys:
+            ttl = next(replies) if self.key_filter.needs_ttl else None
+            key_type = next(replies) if self.key_filter.needs_type else None
+            if self.key_filter.match_attributes(ttl, key_type):
+                matched_keys.append(key_value)
+        return matched_keys
+
+    def match_node_pages(self, node, node_client, throttle, tuner):
+        """scan_node_pages narrowed down by the key filter, as (cursor, keys matched, number of keys scanned).
+           Pages are matched by the filter pool while the following pages are scanned, and handed back in order
+           so that the cursor of a page can still be checkpointed once the caller is done with it"""
+        pages = self.scan_node_pages(node, node_client, throttle, tuner)
+        if self.key_filter is None:
+            for cursor, keys in pages:
+                yield cursor, keys, len(keys)
+            return
+        pending_pages = deque()
+        for cursor, keys in pages:
+            pending_pages.append((cursor, len(keys), self.filter_pool.submit(keys)))
+            if len(pending_pages) >= self.filter_pool.max_pending:
+                cursor, keys_scanned, matched_keys = pending_pages.popleft()
+                yield cursor, self.get_filtered_keys(node_client, matched_keys.result()), keys_scanned
+        while pending_pages:
+            cursor, keys_scanned, matched_keys = pending_pages.popleft()
+            yield cursor, self.get_filtered_keys(node_client, matched_keys.result()), keys_scanned
+
+    def get_node_statistics(self, node, default_statistics):
+        return self.checkpoint.get_statistics(node["name"], default_statistics)
+
+    def update_checkpoint(self, node, cursor, statistics):
+        """Only to be called once every key up to the cursor has been fully processed"""
+        self.checkpoint.update(node["name"], cursor, statistics, complete=int(cursor) == 0)
+
+    def write_keys(self, keys, node):
+        """Hand a page of matched keys to the key sink of the current walk"""
+        self.key_sink.write(keys, node["name"])
+
+    def scan_nodes(self, worker):
+        """Run worker(node, node_client) against every master node concurrently"""
+        identity = {"task": type(self).__name__,
+                    "pattern": self.pattern,
+                    "no_ttl_only": self.no_ttl_only}
+        if self.key_filter is not None:
+            identity["key_filter"] = self.key_filter.get_state()
+            self.filter_pool = KeyFilterPool(self.key_filter, self.filter_processes)
+        self.checkpoint = RedisCheckpoint(self.checkpoint_path, self.resume, identity)
+        # Keys streamed before the interruption are kept when resuming
+        self.key_sink = create_key_sink(self.print_keys, self.output_keys, self.output_format, self.compress_output,
+                                        append=self.checkpoint.resumed)
+        try:
+            result = RedisNodeExecutor(self, self.concurrency, self.nodes).execute(worker)
+        finally:
+            self.key_sink.close()
+            self.checkpoint.save()
+            if self.filter_pool is not None:
+                self.filter_pool.close()
+                self.filter_pool = None
+        result.update(self.key_sink.get_statistics())
+        result["resumed"] = self.checkpoint.resumed
+        return result
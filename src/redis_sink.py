@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Destinations for keys matched during a key walk, shared by all node workers"""
+import gzip
+import io
+import json
+import sys
+import threading
+
+PLAIN = "plain"
+JSONL = "jsonl"
+OUTPUT_FORMATS = (PLAIN, JSONL)
+STDOUT = "-"
+
+
+class KeySink:
+    """Discard keys - used when keys are not requested"""
+
+    def write(self, keys, node_name=None):
+        pass
+
+    def close(self):
+        pass
+
+    def get_statistics(self):
+        return {}
+
+
+class ListKeySink(KeySink):
+    """Accumulate keys in memory to be returned in the result"""
+
+    def __init__(self):
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def write(self, keys, node_name=None):
+        with self.lock:
+            self.keys.extend(keys)
+
+    def get_statistics(self):
+        return {"keys": self.keys}
+
+
+class StreamKeySink(KeySink):
+    """Write keys out as each page is processed, keeping memory bounded by the page size"""
+
+    def __init__(self, output=STDOUT, output_format=PLAIN, compress=False, append=False):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Expect output format to be one of {}".format(", ".join(OUTPUT_FORMATS)))
+        self.output = output
+        self.output_format = output_format
+        self.keys_written = 0
+        self.lock = threading.Lock()
+        mode = "a" if append else "w"
+        if output == STDOUT and compress:
+            self.stream = io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"), encoding="utf-8")
+        elif output == STDOUT:
+            self.stream = sys.stdout
+        elif compress:
+            self.stream = gzip.open(output, mode + "t", encoding="utf-8")
+        else:
+            self.stream = open(output, mode, encoding="utf-8")
+
+    @staticmethod
+    def decode(key_value):
+        if isinstance(key_value, bytes):
+            return key_value.decode("utf-8", errors="backslashreplace")
+        return key_value
+
+    def format_key(self, key_value, node_name):
+        if self.output_format == JSONL:
+            return json.dumps({"key": self.decode(key_value), "node": node_name}) + "\n"
+        return self.decode(key_value) + "\n"
+
+    def write(self, keys, node_name=None):
+        if not keys:
+            return
+        lines = "".join(self.format_key(key_value, node_name) for key_value in keys)
+        with self.lock:
+            self.stream.write(lines)
+            self.keys_written += len(keys)
+
+    def close(self):
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+    def get_statistics(self):
+        return {"keys_written": self.keys_written,
+                "output_keys": self.output}
+
+
+def create_key_sink(print_keys=False, output_keys=None, output_format=PLAIN, compress_output=False, append=False):
+    if output_keys is not None:
+        return StreamKeySink(output_keys, output_format, compress_output, append)
+    elif print_keys:
+        return ListKeySink()
+    return KeySink()
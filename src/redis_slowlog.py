@@ -1,24 +1,147 @@
-import pytz
+import json
+import re
+import time
 
 from argparse import ArgumentParser
-from datetime import datetime
+from array import array
+from datetime import datetime, timezone
 from pprint import pprint
+from redis_checkpoint import RedisCheckpoint
 from redis_common import RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_histogram import LogHistogram
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
 
 
 DEFAULT_REDIS_PORT = 6379
+SECONDS_PER_DAY = 86400
+
+
+class SlowlogTimeFormatter:
+    """Format start times as %Y-%m-%d %H:%M:%S%z in UTC, formatting each distinct second only once.
+       Slowlog entries cluster within a few days, so only the date goes through datetime"""
+
+    def __init__(self):
+        self.days = {}
+        self.seconds = {}
+
+    def format(self, start_time):
+        readable_start_time = self.seconds.get(start_time)
+        if readable_start_time is None:
+            day, second = divmod(start_time, SECONDS_PER_DAY)
+            date = self.days.get(day)
+            if date is None:
+                date = datetime.utcfromtimestamp(day * SECONDS_PER_DAY).replace(tzinfo=timezone.utc).strftime("%Y-%m-%d")
+                self.days[day] = date
+            hour, second = divmod(second, 3600)
+            minute, second = divmod(second, 60)
+            readable_start_time = "{} {:02d}:{:02d}:{:02d}+0000".format(date, hour, minute, second)
+            self.seconds[start_time] = readable_start_time
+        return readable_start_time
+
+
+class SlowlogColumns:
+    """Slowlog entries held column by column - ids, start times and durations in typed arrays,
+       hosts as indexes into a list of distinct hosts - so that the bulk of the processing never builds a dict.
+       Rows are only materialized when iterated"""
+
+    def __init__(self, time_formatter=None):
+        self.ids = array("q")
+        self.start_times = array("q")
+        self.durations = array("q")
+        self.host_indexes = array("l")
+        self.commands = []
+        self.hosts = []
+        self.host_lookup = {}
+        self.order = None
+        self.time_formatter = time_formatter or SlowlogTimeFormatter()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_host_index(self, host):
+        host_index = self.host_lookup.get(host)
+        if host_index is None:
+            host_index = len(self.hosts)
+            self.hosts.append(host)
+            self.host_lookup[host] = host_index
+        return host_index
+
+    def extend(self, logs, host=None):
+        """Append entries as returned by SLOWLOG GET, taking their host from the entry when host is not given"""
+        host_index = self.get_host_index(host) if host is not None else None
+        for log in logs:
+            self.ids.append(log.get("id", 0))
+            self.start_times.append(int(log.get("start_time", 0)))
+            self.durations.append(log.get("duration", 0))
+            self.commands.append(log.get("command", ""))
+            self.host_indexes.append(host_index if host_index is not None else self.get_host_index(log.get("host")))
+        self.order = None
+
+    @classmethod
+    def from_logs(cls, logs):
+        """Entries of either a single node or of Cluster Mode, keyed by host"""
+        columns = cls()
+        if isinstance(logs, dict):
+            for host, slowlog_entries in logs.items():
+                columns.extend(slowlog_entries, host)
+        else:
+            columns.extend(logs)
+        return columns
+
+    def sort(self, reverse=True):
+        """Order rows by start time, newest first by default, without moving the columns"""
+        self.order = sorted(range(len(self.ids)), key=self.start_times.__getitem__, reverse=reverse)
+
+    def get_readable_start_times(self):
+        return [self.time_formatter.format(start_time) for start_time in self.start_times]
+
+    def get_durations_in_millisec(self):
+        return array("q", (duration // RedisSlowlog.MICROSECONDS_PER_MILLISECOND for duration in self.durations))
+
+    def iter_rows(self):
+        """Entries in the format of RedisSlowlog.append_logs followed by parse_string_codec"""
+        readable_start_times = self.get_readable_start_times()
+        durations_in_millisec = self.get_durations_in_millisec()
+        order = self.order if self.order is not None else range(len(self.ids))
+        for index in order:
+            command = self.commands[index]
+            row = {"command": str(command, "utf-8") if isinstance(command, bytes) else command,
+                   "duration_in_microsec": self.durations[index],
+                   "duration_in_millisec": durations_in_millisec[index],
+                   "id": self.ids[index],
+                   "readable_start_time": readable_start_times[index],
+                   "start_time": self.start_times[index]}
+            host = self.hosts[self.host_indexes[index]]
+            if host is not None:
+                row["host"] = host
+            yield row
 
 
 class RedisSlowlog(RedisCommon):
     MICROSECONDS_PER_MILLISECOND = 1000
-    DEFAULT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S%z"
+    DEFAULT_TOP = 20
+    DEFAULT_TAIL_BATCH = 128
 
-    def __init__(self, host, port, cluster_mode, authentication, decode_responses, entries=None):
+    # Commands whose first argument is a subcommand rather than a key
+    CONTAINER_COMMANDS = frozenset(["ACL", "CLIENT", "CLUSTER", "COMMAND", "CONFIG", "DEBUG", "FUNCTION", "LATENCY",
+                                    "MEMORY", "MODULE", "OBJECT", "SCRIPT", "SLOWLOG", "XGROUP", "XINFO"])
+    # Commands without a key as first argument
+    KEYLESS_COMMANDS = frozenset(["EVAL", "EVALSHA", "FCALL", "INFO", "PUBLISH", "SCAN", "SELECT", "FLUSHALL", "FLUSHDB",
+                                  "KEYS", "DBSIZE", "PING", "ECHO", "AUTH", "MULTI", "EXEC", "SUBSCRIBE", "PSUBSCRIBE"])
+    # UUIDs, long hexadecimal strings and numbers within a key are masked
+    LITERAL_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,}|[0-9]+")
+    MASK = "?"
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, entries=None, aggregate=False,
+                 top=DEFAULT_TOP):
         super().__init__(host, port, cluster_mode, authentication, decode_responses)
-        self.redis_client = self.get_redis_client()
-        self.redis_pipeline = self.get_redis_pipeline()
         # Parameter entered
         self.entries = entries
+        self.aggregate = aggregate
+        self.top = top
+        self.checkpoint = None
+        self.time_formatter = SlowlogTimeFormatter()
 
     def cluster_mode_processing(self, logs):
         """Standardise format returned by differing Cluster Mode"""
@@ -36,11 +159,7 @@ class RedisSlowlog(RedisCommon):
         """Append log with readable information"""
         for log in logs:
             if log.get("start_time", None) is not None:
-                start_time = int(log["start_time"])
-                log["readable_start_time"] = (datetime.
-                                              utcfromtimestamp(start_time).
-                                              replace(tzinfo=pytz.utc).
-                                              strftime(self.DEFAULT_DATETIME_FORMAT))
+                log["readable_start_time"] = self.time_formatter.format(int(log["start_time"]))
             if log.get("duration", None) is not None:
                 log["duration_in_microsec"] = log.pop("duration")
                 log["duration_in_millisec"] = int(log["duration_in_microsec"] / self.MICROSECONDS_PER_MILLISECOND)
@@ -48,19 +167,114 @@ class RedisSlowlog(RedisCommon):
 
     def parse_string_codec(self, logs):
         for log in logs:
-            log["command"] = str(log.get("command", ""), "utf-8")
+            command = log.get("command", "")
+            log["command"] = str(command, "utf-8") if isinstance(command, bytes) else command
         return logs
 
+    def tail_node(self, node, node_client):
+        """Entries of a node newer than its checkpointed cursor, i.e. the next slowlog id expected"""
+        cursor = self.checkpoint.get_cursor(node["name"])
+        statistics = self.checkpoint.get_statistics(node["name"], {"entries": 0, "missed": 0})
+        # Fetch newest entries first, doubling the batch only while every entry fetched is still new
+        count = self.DEFAULT_TAIL_BATCH
+        logs = node_client.slowlog_get(count)
+        while len(logs) == count and logs[-1]["id"] >= cursor:
+            count *= 2
+            logs = node_client.slowlog_get(count)
+        # Slowlog id restart from 0 when the node restarts
+        if logs and logs[0]["id"] < cursor - 1:
+            cursor = 0
+        logs = [log for log in logs if log["id"] >= cursor]
+        if logs:
+            # Entries between the cursor and the oldest entry fetched rotated out before this poll
+            if cursor > 0:
+                statistics["missed"] += logs[-1]["id"] - cursor
+            cursor = logs[0]["id"] + 1
+        statistics["entries"] += len(logs)
+        self.checkpoint.update(node["name"], cursor, statistics)
+        for log in logs:
+            log["host"] = node["name"]
+        return {"logs": logs}
+
+    def tail(self, interval, count=None, state_file=None):
+        """Poll every node every interval seconds, yielding only entries not seen before, oldest first.
+           Cursors are kept in state_file between runs when given"""
+        self.checkpoint = RedisCheckpoint(state_file, resume=True, identity={"task": type(self).__name__, "host": self.name})
+        executor = RedisNodeExecutor(self, nodes=self.get_all_nodes())
+        polls = 0
+        while count is None or polls < count:
+            if polls > 0:
+                time.sleep(interval)
+            logs = [log for _, node_result in executor.map(self.tail_node) for log in node_result["logs"]]
+            self.checkpoint.save()
+            logs = self.parse_string_codec(self.append_logs(logs))
+            yield from sorted(logs, key=lambda x: (x.get("start_time", 0), x.get("id", 0)))
+            polls += 1
+
+    def fingerprint_command(self, command):
+        """Command name followed by its key with literals masked, e.g. HMGET state:12345 a b as HMGET state:? ?"""
+        if isinstance(command, bytes):
+            command = command.decode("utf-8", errors="replace")
+        arguments = command.split(" ")
+        name = arguments[0].upper()
+        arguments = arguments[1:]
+        if name in self.CONTAINER_COMMANDS and arguments:
+            name = "{} {}".format(name, arguments[0].upper())
+            arguments = []
+        fingerprint = [name]
+        if arguments and name not in self.KEYLESS_COMMANDS:
+            fingerprint.append(self.LITERAL_PATTERN.sub(self.MASK, arguments[0]))
+            arguments = arguments[1:]
+        # Remaining arguments are collapsed, so that e.g. MGET of any number of keys share a fingerprint
+        if arguments:
+            fingerprint.append(self.MASK)
+        return " ".join(fingerprint)
+
+    def aggregate_logs(self, logs):
+        """Single pass over the entries, keeping one fixed memory duration histogram per fingerprint and per host"""
+        fingerprints = {}
+        hosts = {}
+        for log in logs:
+            host = log.get("host", self.name)
+            fingerprint = self.fingerprint_command(log.get("command", ""))
+            duration = log.get("duration", 0)
+            if fingerprint not in fingerprints:
+                fingerprints[fingerprint] = (LogHistogram(), {})
+            histogram, fingerprint_hosts = fingerprints[fingerprint]
+            histogram.record(duration)
+            fingerprint_hosts[host] = fingerprint_hosts.get(host, 0) + 1
+            hosts.setdefault(host, LogHistogram()).record(duration)
+        aggregated_fingerprints = []
+        for fingerprint, (histogram, fingerprint_hosts) in fingerprints.items():
+            statistics = self.get_duration_statistics(histogram)
+            statistics.update({"fingerprint": fingerprint,
+                               "hosts": fingerprint_hosts})
+            aggregated_fingerprints.append(statistics)
+        aggregated_fingerprints.sort(key=lambda x: x["total_duration_in_microsec"], reverse=True)
+        return {"entries": sum(histogram.count for histogram in hosts.values()),
+                "fingerprints": aggregated_fingerprints[:self.top],
+                "hosts": {host: self.get_duration_statistics(histogram) for host, histogram in hosts.items()}}
+
+    def get_duration_statistics(self, histogram):
+        return {"count": histogram.count,
+                "total_duration_in_microsec": histogram.total,
+                "p50_duration_in_microsec": histogram.percentile(50),
+                "p99_duration_in_microsec": histogram.percentile(99),
+                "max_duration_in_microsec": histogram.maximum}
+
+    def get_columns(self, logs):
+        columns = SlowlogColumns.from_logs(logs)
+        columns.time_formatter = self.time_formatter
+        # Construct complete slowlogs
+        columns.sort()
+        return columns
+
     def execute(self):
         # Get Redis slowlog
         logs = self.redis_client.slowlog_get(self.entries)
-        logs = self.cluster_mode_processing(logs)
-        logs = self.append_logs(logs)
-        # Prevent parsing issue
-        logs = self.parse_string_codec(logs)
-        # Construct complete slowlogs
-        slowlog_entries = sorted(logs, key=lambda x: x.get("start_time", ""), reverse=True)
-        return slowlog_entries
+        if self.aggregate:
+            return self.aggregate_logs(self.cluster_mode_processing(logs))
+        return list(self.get_columns(logs).iter_rows())
 
 
 def get_arguments():
@@ -79,13 +293,30 @@ def get_arguments():
                                     dest="cluster_mode",
                                     help="Indicate Redis instance is cluster mode disabled")
     parser.add_argument("--decode_responses", type=bool, default=False, help="Authentication required for Redis")
+    parser.add_argument("--entries", type=int, help="Number of slowlog entries to obtain from each node")
+    parser.add_argument("--aggregate", action="store_true", help="Aggregate entries by command fingerprint and host")
+    parser.add_argument("--top", type=int, default=RedisSlowlog.DEFAULT_TOP,
+                        help="Number of fingerprints reported with --aggregate - Defaults to {}".format(str(RedisSlowlog.DEFAULT_TOP)))
+    parser.add_argument("--tail", type=float, help="Poll every given seconds, printing only new entries as JSON lines")
+    parser.add_argument("--tail_count", type=int, help="Number of polls with --tail - Defaults to until interrupted")
+    parser.add_argument("--state_file", type=str, help="File keeping the last slowlog id seen per node between --tail runs")
+    add_instrumentation_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = get_arguments()
-    task = RedisSlowlog(**vars(args))
-    result = task.execute()
+    instrumentation = pop_instrumentation_arguments(args)
+    task = RedisSlowlog(args.host, args.port, args.cluster_mode, args.authentication, args.decode_responses,
+                        args.entries, args.aggregate, args.top)
+    if args.tail is not None:
+        try:
+            for log in task.tail(args.tail, args.tail_count, args.state_file):
+                print(json.dumps(log), flush=True)
+        except KeyboardInterrupt:
+            pass
+        return
+    result = task.run(**instrumentation)
     pprint(result)
 
 
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Throttles pacing the key walks, called once per batch of operations"""
+import time
+
+
+class RedisThrottle:
+    """No throttling - records statistics only"""
+
+    def __init__(self):
+        self.operations = 0
+        self.sleep_time = 0
+        self.start_time = time.time()
+
+    def sleep(self, duration):
+        time.sleep(duration)
+        self.sleep_time += duration
+
+    def wait(self, operations):
+        pass
+
+    def throttle(self, operations):
+        self.operations += operations
+        self.wait(operations)
+
+    def get_statistics(self):
+        elapsed_time = time.time() - self.start_time
+        return {"sleep_time": self.sleep_time,
+                "operations": self.operations,
+                "effective_rate": self.operations / elapsed_time if elapsed_time > 0 else 0}
+
+
+class FixedThrottle(RedisThrottle):
+    """Sleep for a fixed duration after every batch of operations"""
+    DEFAULT_SLEEP = 1
+    DEFAULT_SLEEP_BATCH = 1000
+
+    def __init__(self, sleep=DEFAULT_SLEEP, sleep_batch=DEFAULT_SLEEP_BATCH):
+        super().__init__()
+        self.sleep_duration = sleep
+        self.sleep_batch = sleep_batch
+        self.operations_since_sleep = 0
+
+    def wait(self, operations):
+        self.operations_since_sleep += operations
+        if self.sleep_duration > 0 and self.operations_since_sleep >= self.sleep_batch:
+            self.sleep(self.sleep_duration)
+            self.operations_since_sleep = 0
+
+
+class TokenBucketThrottle(RedisThrottle):
+    """Hold the walk to a target rate of operations per second, allowing bursts of up to one second"""
+
+    def __init__(self, ops_per_sec):
+        super().__init__()
+        self.rate = float(ops_per_sec)
+        self.capacity = float(ops_per_sec)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def wait(self, operations):
+        self.refill()
+        # Tokens may go into debt for a large batch, which is then repaid by sleeping
+        self.tokens -= operations
+        if self.tokens < 0:
+            self.sleep(-self.tokens / self.rate)
+            self.refill()
+
+
+class FeedbackThrottle(TokenBucketThrottle):
+    """Token bucket whose rate backs off when the measured time per operation rises above its baseline"""
+    BACKOFF_THRESHOLD = 2.0
+    BACKOFF_FACTOR = 0.5
+    INCREASE_STEP = 0.05
+    MINIMUM_RATE_RATIO = 0.01
+    SMOOTHING = 0.2
+
+    def __init__(self, ops_per_sec):
+        super().__init__(ops_per_sec)
+        self.maximum_rate = float(ops_per_sec)
+        self.minimum_rate = self.maximum_rate * self.MINIMUM_RATE_RATIO
+        self.baseline_latency = None
+        self.smoothed_latency = None
+        self.rate_adjustments = 0
+        self.last_throttle = time.monotonic()
+        self.last_sleep_time = 0
+
+    def adjust_rate(self, latency):
+        """Additive increase while latency stays near its baseline, multiplicative decrease otherwise"""
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency = (1 - self.SMOOTHING) * self.smoothed_latency + self.SMOOTHING * latency
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        if self.smoothed_latency > self.baseline_latency * self.BACKOFF_THRESHOLD:
+            rate = max(self.minimum_rate, self.rate * self.BACKOFF_FACTOR)
+            # Restart smoothing from the baseline so a single spike backs off only once
+            self.smoothed_latency = self.baseline_latency
+        else:
+            rate = min(self.maximum_rate, self.rate + self.maximum_rate * self.INCREASE_STEP)
+        if rate != self.rate:
+            self.rate_adjustments += 1
+        self.rate = rate
+
+    def wait(self, operations):
+        # Time spent outside the throttle since the previous batch, i.e. waiting on the server
+        now = time.monotonic()
+        busy_time = now - self.last_throttle - (self.sleep_time - self.last_sleep_time)
+        if operations > 0 and busy_time > 0:
+            self.adjust_rate(busy_time / operations)
+        super().wait(operations)
+        self.last_throttle = time.monotonic()
+        self.last_sleep_time = self.sleep_time
+
+    def get_statistics(self):
+        statistics = super().get_statistics()
+        statistics.update({"rate_adjustments": self.rate_adjustments,
+                           "final_rate": self.rate})
+        return statistics
+
+
+NO_THROTTLE = "none"
+FIXED = "fixed"
+TOKEN_BUCKET = "token_bucket"
+FEEDBACK = "feedback"
+
+THROTTLE_MODES = (NO_THROTTLE, FIXED, TOKEN_BUCKET, FEEDBACK)
+DEFAULT_OPS_PER_SEC = 1000
+
+
+def create_throttle(mode=FIXED, ops_per_sec=DEFAULT_OPS_PER_SEC):
+    if mode == NO_THROTTLE:
+        return RedisThrottle()
+    elif mode == FIXED:
+        return FixedThrottle()
+    elif mode == TOKEN_BUCKET:
+        return TokenBucketThrottle(ops_per_sec)
+    elif mode == FEEDBACK:
+        return FeedbackThrottle(ops_per_sec)
+    raise ValueError("Expect throttle mode to be one of {}".format(", ".join(THROTTLE_MODES)))
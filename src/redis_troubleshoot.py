@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Single entry point for every task, importing only the module of the task chosen
+   so that startup stays cheap when invoked many times, e.g. from cron or alerting hooks"""
+import importlib
+import sys
+
+from argparse import REMAINDER, ArgumentParser, RawDescriptionHelpFormatter
+
+# Module and description of every subcommand - modules are only imported once chosen
+SUBCOMMANDS = {"info": ("redis_info", "Obtain INFO log from Redis instances"),
+               "slowlog": ("redis_slowlog", "Obtain slowlog from Redis instances"),
+               "verify": ("redis_verify", "Check keys available in the Redis instance"),
+               "expire": ("redis_expire", "Expire keys by pattern"),
+               "delete": ("redis_delete", "Delete keys by pattern"),
+               "memory": ("redis_memory", "Find the keys and key prefixes using the most memory"),
+               "flushall": ("redis_flushall", "Run FLUSHALL on every master node"),
+               "rdb": ("redis_rdb", "Check keys available in RDB file(s), without touching the Redis instance")}
+
+
+def get_arguments(argv=None):
+    parser = ArgumentParser(description="Troubleshoot Redis instances - run <subcommand> --help for its arguments",
+                            formatter_class=RawDescriptionHelpFormatter,
+                            epilog="subcommands:\n" + "\n".join("  {:<10}{}".format(name, description) for name, (_, description) in SUBCOMMANDS.items()))
+    parser.add_argument("subcommand", choices=SUBCOMMANDS, help="Task to run")
+    parser.add_argument("arguments", nargs=REMAINDER, help="Arguments of the task")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_arguments(argv)
+    module = importlib.import_module(SUBCOMMANDS[args.subcommand][0])
+    # Every task parses its own arguments from sys.argv
+    sys.argv = ["{} {}".format(sys.argv[0], args.subcommand)] + args.arguments
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
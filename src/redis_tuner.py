@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Choose SCAN COUNT and pipeline batch size for the key walks"""
+import time
+
+from collections import deque
+
+
+class BatchTuner:
+    """Fixed SCAN COUNT and pipeline batch size"""
+
+    def __init__(self, scan_count, pipeline_batch):
+        self.scan_count = scan_count
+        self.pipeline_batch = pipeline_batch
+
+    def record_page(self, latency, keys):
+        pass
+
+    def record_flush(self, latency, commands):
+        pass
+
+    def get_statistics(self):
+        return {"tuning": {"scan_count": self.scan_count,
+                           "pipeline_batch": self.pipeline_batch}}
+
+
+class AutoBatchTuner(BatchTuner):
+    """Scale SCAN COUNT and pipeline batch size so that every page and every pipeline flush
+       takes roughly the target latency - sparse patterns scan more per call, dense ones flush less per call"""
+    DEFAULT_TARGET_LATENCY = 0.05
+    MINIMUM_SCAN_COUNT = 100
+    MAXIMUM_SCAN_COUNT = 50000
+    MINIMUM_PIPELINE_BATCH = 100
+    MAXIMUM_PIPELINE_BATCH = 10000
+    # Bound each adjustment so a single outlier cannot swing the batch size
+    MAXIMUM_STEP = 2.0
+    # Only changes of at least this ratio are recorded in the history
+    HISTORY_THRESHOLD = 0.1
+    HISTORY_LENGTH = 100
+
+    def __init__(self, scan_count, pipeline_batch, target_latency=DEFAULT_TARGET_LATENCY):
+        super().__init__(scan_count, pipeline_batch)
+        self.target_latency = target_latency
+        self.start_time = time.time()
+        self.history = deque(maxlen=self.HISTORY_LENGTH)
+        self.record_history()
+
+    def scale(self, value, latency, minimum, maximum):
+        ratio = self.target_latency / latency if latency > 0 else self.MAXIMUM_STEP
+        ratio = min(self.MAXIMUM_STEP, max(1 / self.MAXIMUM_STEP, ratio))
+        return int(min(maximum, max(minimum, value * ratio)))
+
+    def record_history(self):
+        if self.history:
+            last_entry = self.history[-1]
+            changes = [abs(self.scan_count - last_entry["scan_count"]) / last_entry["scan_count"],
+                       abs(self.pipeline_batch - last_entry["pipeline_batch"]) / last_entry["pipeline_batch"]]
+            if max(changes) < self.HISTORY_THRESHOLD:
+                return
+        self.history.append({"elapsed_time": time.time() - self.start_time,
+                             "scan_count": self.scan_count,
+                             "pipeline_batch": self.pipeline_batch})
+
+    def record_page(self, latency, keys):
+        self.scan_count = self.scale(self.scan_count, latency, self.MINIMUM_SCAN_COUNT, self.MAXIMUM_SCAN_COUNT)
+        self.record_history()
+
+    def record_flush(self, latency, commands):
+        # Scale from the commands actually flushed, which may exceed the batch size by up to a page
+        self.pipeline_batch = self.scale(max(commands, 1), latency, self.MINIMUM_PIPELINE_BATCH, self.MAXIMUM_PIPELINE_BATCH)
+        self.record_history()
+
+    def get_statistics(self):
+        statistics = super().get_statistics()
+        statistics["tuning"]["history"] = list(self.history)
+        return statistics
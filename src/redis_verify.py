@@ -1,87 +1,219 @@
 # -*- coding: utf-8 -*-
+import sys
 import time
 
 from argparse import ArgumentParser
 from pprint import pprint
-from redis_common import RedisCommon
+from redis_common import DEFAULT_MAX_REPLICATION_LAG, PRIMARY, READ_PREFERENCES, RedisCommon
+from redis_executor import RedisNodeExecutor
+from redis_filter import add_filter_arguments, pop_filter_arguments
+from redis_histogram import LogHistogram
+from redis_metrics import add_instrumentation_arguments, pop_instrumentation_arguments
+from redis_scan import RedisScan
+from redis_sink import OUTPUT_FORMATS, PLAIN, STDOUT, StreamKeySink
+from redis_throttle import DEFAULT_OPS_PER_SEC, FIXED, THROTTLE_MODES
+from redis_tuner import AutoBatchTuner
 
+# Upper bound in seconds of each TTL bucket, keys beyond the last bound are counted under OVER_TTL_BUCKET
+TTL_BUCKETS = ((60, "under_1m"), (3600, "under_1h"), (86400, "under_1d"))
+OVER_TTL_BUCKET = "over_1d"
+NO_TTL_BUCKET = "no_ttl"
 
-class RedisVerify(RedisCommon):
-    NO_TTL_SET = -1
-    DEFAULT_SLEEP = 1
-    DEFAULT_SLEEP_BATCH = 1000
-    DEFAULT_COUNT = 1000
 
-    WILDCARD = "*"
+def get_ttl_bucket(ttl):
+    if ttl == RedisScan.NO_TTL_SET:
+        return NO_TTL_BUCKET
+    for upper_bound, bucket in TTL_BUCKETS:
+        if ttl < upper_bound:
+            return bucket
+    return OVER_TTL_BUCKET
 
-    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys):
-        super().__init__(host, port, cluster_mode, authentication, decode_responses)
-        self.redis_client = self.get_redis_client()
-        self.redis_pipeline = self.get_redis_pipeline()
-        # Parameters for verification
-        self.pattern = pattern
-        self.no_ttl_only = no_ttl_only
-        self.print_keys = print_keys
 
-    def verify_pattern_naive(self):
-        sleep_counter = 0
-        cumulative_keys = []
-        start_time = time.time()
+def record_prefixes(prefixes, key_value, delimiter, prefix_depth, max_prefixes, ttl=None, memory=None):
+    """Count the key under each of its prefixes up to the prefix depth, e.g. a:b:c under a and a:b,
+       so that a prefix counts every key its pattern prefix:* would match. With memory, its size is added up as well"""
+    segments = key_value.split(delimiter, prefix_depth)
+    key_prefixes = [delimiter.join(segments[:level]) for level in range(1, min(prefix_depth, len(segments) - 1) + 1)]
+    for prefix in key_prefixes or [None]:
+        prefix = RedisScan.get_prefix_name(prefixes, prefix, max_prefixes)
+        aggregate = prefixes.setdefault(prefix, {"keys": 0} if memory is None else {"keys": 0, "memory": 0})
+        aggregate["keys"] += 1
+        if memory is not None:
+            aggregate["memory"] += memory
+        # Keys expired since the SCAN are left out of the TTL distribution
+        if ttl is not None and ttl >= RedisScan.NO_TTL_SET:
+            bucket = get_ttl_bucket(ttl)
+            aggregate[bucket] = aggregate.get(bucket, 0) + 1
+
+
+def merge_prefixes(node_prefixes, sort_field="keys"):
+    """Sum per-node aggregates of every prefix, largest first"""
+    prefixes = {}
+    for node_prefix in node_prefixes:
+        aggregate = prefixes.setdefault(node_prefix["prefix"], {"prefix": node_prefix["prefix"]})
+        for field, count in node_prefix.items():
+            if field != "prefix":
+                aggregate[field] = aggregate.get(field, 0) + count
+    return sorted(prefixes.values(), key=lambda x: x[sort_field], reverse=True)
+
+
+class RedisVerify(RedisScan):
+    # TTL profile buckets every power of two seconds, and schedules expiries per minute over the next hour
+    TTL_SIGNIFICANT_BITS = 0
+    SCHEDULE_INTERVAL = 60
+    SCHEDULE_LENGTH = 60
+
+    def __init__(self, host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys,
+                 prefix_depth=None, delimiter=RedisScan.DEFAULT_DELIMITER, max_prefixes=RedisScan.DEFAULT_MAX_PREFIXES,
+                 ttl_buckets=False, ttl_profile=False, **kwargs):
+        super().__init__(host, port, cluster_mode, authentication, decode_responses, pattern, no_ttl_only, print_keys, **kwargs)
+        if prefix_depth is not None and ttl_profile:
+            raise ValueError("TTL profile cannot be combined with a prefix depth, use TTL buckets to break prefixes down by TTL")
+        # Arguments for breaking keys down by prefix in a single pass
+        self.prefix_depth = prefix_depth
+        self.delimiter = delimiter
+        self.max_prefixes = max_prefixes
+        self.ttl_buckets = ttl_buckets
+        self.ttl_profile = ttl_profile
+
+    def verify_pattern_prefixes_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_encountered": 0,
+                                                     "prefixes": {}})
+        prefixes = statistics["prefixes"]
+        read_client = self.get_read_client(node, node_client, statistics)
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
         # Begin iterating through Redis
-        for scan_counter, key_value in enumerate(self.redis_client.scan_iter(match=self.pattern, count=self.DEFAULT_COUNT)):
-            if (scan_counter > 0) and (self.DEFAULT_SLEEP > 0) and (scan_counter % self.DEFAULT_SLEEP_BATCH == 0):
-                time.sleep(self.DEFAULT_SLEEP)
-                sleep_counter += 1
-            cumulative_keys.append(key_value)
-        # End statistic
-        end_time = time.time()
-        # Calculate statistics
-        total_time = end_time - start_time
-        sleep_time = self.DEFAULT_SLEEP * sleep_counter
-        execution_time = total_time - sleep_time
-        result = {"total_time": total_time,
-                  "sleep_time": sleep_time,
-                  "execution_time": execution_time,
-                  "keys_encountered": len(cumulative_keys),
-                  "pattern": self.pattern,
-                  "no_ttl_only": self.no_ttl_only}
-        if self.print_keys:
-            result["keys"] = cumulative_keys
+        for cursor, keys, _ in self.match_node_pages(node, read_client, throttle, tuner):
+            # TTLs are looked up once per page, whether for keeping keys without TTL, for the TTL buckets or both
+            ttls = self.get_ttls(read_client, keys) if keys and (self.no_ttl_only or self.ttl_buckets) else [None] * len(keys)
+            if self.no_ttl_only:
+                keys = [key_value for key_value, ttl in zip(keys, ttls) if ttl == self.NO_TTL_SET]
+                ttls = [self.NO_TTL_SET] * len(keys)
+            if not self.ttl_buckets:
+                ttls = [None] * len(keys)
+            for key_value, ttl in zip(keys, ttls):
+                record_prefixes(prefixes, StreamKeySink.decode(key_value), self.delimiter, self.prefix_depth, self.max_prefixes, ttl)
+            statistics["keys_encountered"] += len(keys)
+            self.write_keys(keys, node)
+            snapshot = dict(statistics)
+            if self.checkpoint_path is not None:
+                snapshot["prefixes"] = {prefix: dict(aggregate) for prefix, aggregate in prefixes.items()}
+            self.update_checkpoint(node, cursor, snapshot)
+        result = {"keys_encountered": statistics["keys_encountered"],
+                  "read_node": statistics["read_node"],
+                  "prefixes": [dict(aggregate, prefix=prefix) for prefix, aggregate in prefixes.items()]}
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
         return result
 
-    def verify_pattern_without_ttl(self):
-        sleep_counter = 0
-        cumulative_keys = []
-        temp_cumulative_keys = []
-        start_time = time.time()
+    def verify_pattern_ttl_profile_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_encountered": 0,
+                                                     "persistent_keys": 0,
+                                                     "expired_keys": 0,
+                                                     "expiry_schedule": [0] * self.SCHEDULE_LENGTH,
+                                                     "ttl_histogram": LogHistogram(self.TTL_SIGNIFICANT_BITS).get_state()})
+        histogram = LogHistogram.from_state(statistics["ttl_histogram"])
+        schedule = statistics["expiry_schedule"]
+        read_client = self.get_read_client(node, node_client, statistics)
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
         # Begin iterating through Redis
-        for scan_counter, key_value in enumerate(self.redis_client.scan_iter(match=self.pattern, count=self.DEFAULT_COUNT)):
-            self.redis_pipeline.ttl(key_value)
-            temp_cumulative_keys.append(key_value)
-            if (scan_counter > 0) and (self.DEFAULT_SLEEP > 0) and (scan_counter % self.DEFAULT_SLEEP_BATCH == 0):
-                time.sleep(self.DEFAULT_SLEEP)
-                sleep_counter += 1
-                # Execute
-                resp = self.redis_pipeline.execute()
-                cumulative_keys.extend([key for key, ttl in zip(temp_cumulative_keys, resp) if ttl == self.NO_TTL_SET])
-                temp_cumulative_keys = []
-        # Final loop
-        resp = self.redis_pipeline.execute()
-        cumulative_keys.extend([key for key, ttl in zip(temp_cumulative_keys, resp) if ttl == self.NO_TTL_SET])
+        for cursor, keys, _ in self.match_node_pages(node, read_client, throttle, tuner):
+            for ttl in (self.get_ttls(read_client, keys) if keys else []):
+                if ttl == self.NO_TTL_SET:
+                    statistics["persistent_keys"] += 1
+                elif ttl < 0:
+                    # Expired since the SCAN
+                    statistics["expired_keys"] += 1
+                else:
+                    histogram.record(ttl)
+                    slot = ttl // self.SCHEDULE_INTERVAL
+                    if slot < self.SCHEDULE_LENGTH:
+                        schedule[slot] += 1
+            statistics["keys_encountered"] += len(keys)
+            self.write_keys(keys, node)
+            statistics["ttl_histogram"] = histogram.get_state()
+            self.update_checkpoint(node, cursor, dict(statistics, expiry_schedule=list(schedule)))
+        result = {key: statistics[key] for key in ("keys_encountered", "persistent_keys", "expired_keys", "read_node")}
+        # Wrapped in lists to be collected rather than merged across nodes
+        result.update({"ttl_histograms": [histogram],
+                       "expiry_schedules": [schedule]})
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def verify_pattern_naive_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_encountered": 0})
+        read_client = self.get_read_client(node, node_client, statistics)
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        # Begin iterating through Redis
+        for cursor, keys, _ in self.match_node_pages(node, read_client, throttle, tuner):
+            statistics["keys_encountered"] += len(keys)
+            self.write_keys(keys, node)
+            self.update_checkpoint(node, cursor, statistics)
+        result = dict(statistics)
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def verify_pattern_without_ttl_node(self, node, node_client):
+        statistics = self.get_node_statistics(node, {"keys_encountered": 0})
+        read_client = self.get_read_client(node, node_client, statistics)
+        throttle = self.create_throttle()
+        tuner = self.create_tuner()
+        # Begin iterating through Redis
+        for cursor, keys, _ in self.match_node_pages(node, read_client, throttle, tuner):
+            if keys:
+                keys = self.get_keys_without_ttl(read_client, keys)
+            statistics["keys_encountered"] += len(keys)
+            self.write_keys(keys, node)
+            self.update_checkpoint(node, cursor, statistics)
+        result = dict(statistics)
+        result.update(throttle.get_statistics())
+        result.update(tuner.get_statistics())
+        return result
+
+    def verify_pattern(self, worker):
+        start_time = time.time()
+        result = self.scan_nodes(worker)
         # End statistic
         end_time = time.time()
         # Calculate statistics
         total_time = end_time - start_time
-        sleep_time = self.DEFAULT_SLEEP * sleep_counter
-        execution_time = total_time - sleep_time
-        result = {"total_time": total_time,
-                  "sleep_time": sleep_time,
-                  "execution_time": execution_time,
-                  "keys_encountered": len(cumulative_keys),
-                  "pattern": self.pattern,
-                  "no_ttl_only": self.no_ttl_only}
-        if self.print_keys:
-            result["keys"] = cumulative_keys
+        result.update({"total_time": total_time,
+                       "execution_time": total_time - result["sleep_time"],
+                       "effective_rate": result["operations"] / total_time if total_time > 0 else 0,
+                       "pattern": self.pattern,
+                       "no_ttl_only": self.no_ttl_only})
+        return result
+
+    def verify_pattern_naive(self):
+        return self.verify_pattern(self.verify_pattern_naive_node)
+
+    def verify_pattern_without_ttl(self):
+        return self.verify_pattern(self.verify_pattern_without_ttl_node)
+
+    def verify_pattern_prefixes(self):
+        """Single scan breaking the keys matched down by prefix, instead of one scan per prefix pattern"""
+        result = self.verify_pattern(self.verify_pattern_prefixes_node)
+        result.update({"prefixes": merge_prefixes(result.get("prefixes", [])),
+                       "prefix_depth": self.prefix_depth})
+        return result
+
+    def verify_pattern_ttl_profile(self):
+        """Single scan profiling the remaining TTL of the keys matched, to tell an expiry storm coming ahead of time"""
+        result = self.verify_pattern(self.verify_pattern_ttl_profile_node)
+        histogram = LogHistogram(self.TTL_SIGNIFICANT_BITS)
+        for node_histogram in result.pop("ttl_histograms", []):
+            histogram.merge(node_histogram)
+        schedules = result.pop("expiry_schedules", [])
+        result.update({"ttl_histogram": [{"min_ttl": lowest, "max_ttl": highest, "keys": count}
+                                         for lowest, highest, count in histogram.get_buckets()],
+                       "ttl_statistics": histogram.get_statistics(),
+                       # Keys expiring in each minute from now, over the next hour
+                       "expiry_schedule": [sum(counts) for counts in zip(*schedules)] if schedules else [0] * self.SCHEDULE_LENGTH})
         return result
 
     def verify_single(self):
@@ -111,6 +243,10 @@ class RedisVerify(RedisCommon):
         result = {}
         if (self.WILDCARD not in self.pattern):
             result = self.verify_single()
+        elif self.prefix_depth is not None:
+            result = self.verify_pattern_prefixes()
+        elif self.ttl_profile:
+            result = self.verify_pattern_ttl_profile()
         elif (self.WILDCARD in self.pattern) and (not self.no_ttl_only):
             result = self.verify_pattern_naive()
         elif (self.WILDCARD in self.pattern) and (self.no_ttl_only):
@@ -133,17 +269,54 @@ def get_arguments():
                                     dest="cluster_mode",
                                     help="Indicate that Redis instance is cluster mode disabled")
     parser.add_argument("--authentication", type=str, required=False, help="Authentication required for Redis")
+    parser.add_argument("--decode_responses", type=bool, default=False, required=False, help="Decode responses from Redis")
     parser.add_argument("--pattern", type=str, required=True, help="Pattern to match desired key(s)")
     parser.add_argument("--no_ttl_only", action="store_true", required=False, help="Check keys without TTL")
     parser.add_argument("--print_keys", action="store_true", required=False, help="Print key(s)")
+    parser.add_argument("--prefix_depth", type=int, required=False,
+                        help="Break keys matched down by prefix, up to this number of key segments, in a single scan")
+    parser.add_argument("--delimiter", type=str, default=RedisScan.DEFAULT_DELIMITER, required=False,
+                        help="Delimiter between key segments - Defaults to {}".format(RedisScan.DEFAULT_DELIMITER))
+    parser.add_argument("--max_prefixes", type=int, default=RedisScan.DEFAULT_MAX_PREFIXES, required=False,
+                        help="Number of distinct prefixes tracked per node with --prefix_depth")
+    parser.add_argument("--ttl_buckets", action="store_true", required=False, help="Break each prefix down by TTL with --prefix_depth")
+    parser.add_argument("--ttl_profile", action="store_true", required=False,
+                        help="Report the distribution of remaining TTL and the expiries per minute over the next hour")
+    parser.add_argument("--max_connections", type=int, required=False,
+                        help="Connections per node pool, waiting for a free connection beyond it - Defaults to unbounded, {} per cluster client".format(str(RedisCommon.DEFAULT_MAX_CONNECTION)))
+    parser.add_argument("--read_preference", type=str, choices=READ_PREFERENCES, default=PRIMARY, required=False,
+                        help="Node(s) SCAN and TTL / TYPE reads go to, writes always going to the master - Defaults to {}".format(PRIMARY))
+    parser.add_argument("--max_replication_lag", type=int, default=DEFAULT_MAX_REPLICATION_LAG, required=False,
+                        help="Seconds since a replica last acknowledged its master beyond which it is not read from - Defaults to {}".format(str(DEFAULT_MAX_REPLICATION_LAG)))
+    parser.add_argument("--concurrency", type=int, default=RedisNodeExecutor.DEFAULT_CONCURRENCY, required=False,
+                        help="Number of master nodes scanned concurrently")
+    parser.add_argument("--output_keys", type=str, required=False,
+                        help="Stream matched key(s) to this file as they are found, {} for stdout".format(STDOUT))
+    parser.add_argument("--output_format", type=str, choices=OUTPUT_FORMATS, default=PLAIN, required=False,
+                        help="Format of key(s) streamed by --output_keys")
+    parser.add_argument("--compress_output", action="store_true", required=False, help="Gzip key(s) streamed by --output_keys")
+    parser.add_argument("--checkpoint", type=str, required=False, help="File to periodically persist SCAN cursor(s) and statistics to")
+    parser.add_argument("--resume", action="store_true", required=False, help="Resume from the cursor(s) persisted in --checkpoint")
+    parser.add_argument("--auto_tune", action="store_true", required=False, help="Tune SCAN COUNT and pipeline batch size to --target_latency")
+    parser.add_argument("--target_latency", type=float, default=AutoBatchTuner.DEFAULT_TARGET_LATENCY, required=False,
+                        help="Target seconds per SCAN page and per pipeline flush when auto tuning")
+    parser.add_argument("--throttle", type=str, choices=THROTTLE_MODES, default=FIXED, required=False,
+                        help="Throttle pacing each node")
+    parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC, required=False,
+                        help="Target keys per second per node for token_bucket / feedback throttle")
+    add_filter_arguments(parser)
+    add_instrumentation_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = get_arguments()
-    task = RedisVerify(**vars(args))
-    result = task.execute()
-    pprint(result)
+    instrumentation = pop_instrumentation_arguments(args)
+    key_filter = pop_filter_arguments(args)
+    task = RedisVerify(key_filter=key_filter, **vars(args))
+    result = task.run(**instrumentation)
+    # Keep the summary apart from key(s) streamed to stdout
+    pprint(result, stream=sys.stderr if args.output_keys == STDOUT else sys.stdout)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import copy
+import os
+import tempfile
+import unittest
+
+from src.redis_async import (AsyncRedisConnection, AsyncRedisExpire, AsyncRedisFlushall, AsyncRedisInfo, AsyncRedisSlowlog, AsyncRedisVerify,
+                             execute_concurrently)
+from src.redis_common import RedisCommon
+
+
+class TestRedisAsync(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+        self.redis_client.set("AT", 2)
+        self.redis_client.set("A", 1)
+
+    def test_info_several_endpoints(self):
+        tasks = []
+        for port in ("6379", "6380"):
+            args = copy.deepcopy(self.COMMON_ARG)
+            args.update({"port": port,
+                         "filter_keys": "^role$"})
+            tasks.append(AsyncRedisInfo(**args))
+        output = asyncio.run(execute_concurrently(tasks))
+        expected_output = [{"role": "master"}, {"role": "slave"}]
+        assert output == expected_output, f"The output {expected_output} is expected, however, output {output} was found"
+
+    def test_slowlog(self):
+        threshold = self.redis_client.config_get("slowlog-log-slower-than")["slowlog-log-slower-than"]
+        self.redis_client.config_set("slowlog-log-slower-than", 0)
+        try:
+            self.redis_client.get("WHEAT")
+            args = copy.deepcopy(self.COMMON_ARG)
+            args.update({"entries": 128})
+            output = asyncio.run(execute_concurrently([AsyncRedisSlowlog(**args)]))[0]
+        finally:
+            self.redis_client.config_set("slowlog-log-slower-than", threshold)
+        commands = [entry["command"] for entry in output]
+        assert "GET WHEAT" in commands, f"Slowlog is expected to contain GET WHEAT, found {commands} instead"
+        assert all("duration_in_millisec" in entry for entry in output), "Slowlog entries are expected to be appended with readable information"
+
+    def test_verify_pattern(self):
+        self.redis_client.expire("HEAT", 100)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": True,
+                     "print_keys": True})
+        result = asyncio.run(execute_concurrently([AsyncRedisVerify(**args)]))[0]
+        assert result["keys_encountered"] == 2, f"Number of keys encountered differ. 2 key(s) expected, found {result['keys_encountered']} key(s) instead."
+        assert sorted(result["keys"]) == ["EAT", "WHEAT"], f"Keys encountered differ, found {result['keys']} instead."
+
+    def test_expire_pattern(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "ttl": 100,
+                     "print_keys": False})
+        result = asyncio.run(execute_concurrently([AsyncRedisExpire(**args)]))[0]
+        assert result["keys_deleted"] == 3, f"Number of keys deleted differ. 3 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert self.redis_client.ttl("WHEAT") > 0, "WHEAT is expected to have a TTL set"
+        assert self.redis_client.ttl("AT") == -1, "AT is not expected to have a TTL set"
+
+    def test_expire_output_keys(self):
+        output_path = os.path.join(tempfile.mkdtemp(), "keys.txt")
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "ttl": 100,
+                     "print_keys": False,
+                     "output_keys": output_path})
+        result = asyncio.run(execute_concurrently([AsyncRedisExpire(**args)]))[0]
+        with open(output_path) as output_file:
+            keys = sorted(output_file.read().split())
+        os.remove(output_path)
+        os.rmdir(os.path.dirname(output_path))
+        assert result["keys_written"] == 3, f"3 key(s) expected to be written, found {result['keys_written']} instead"
+        assert keys == ["EAT", "HEAT", "WHEAT"], f"Keys written differ, found {keys} instead"
+
+    def test_unsupported_options(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "print_keys": False})
+        with self.assertRaises(ValueError):
+            AsyncRedisVerify(throttle="fixed", **args)
+        with self.assertRaises(ValueError):
+            AsyncRedisVerify(checkpoint="checkpoint.json", **args)
+
+    def test_connection_shared_on_first_use(self):
+        async def first_use():
+            connection = AsyncRedisConnection("127.0.0.1", 6379)
+            client_ids = await asyncio.gather(*[connection.execute_command("CLIENT", "ID") for _ in range(10)])
+            await connection.close()
+            return client_ids
+        client_ids = asyncio.run(first_use())
+        assert len(set(client_ids)) == 1, f"Commands sent concurrently on first use are expected to share a socket, found client ids {client_ids}"
+
+    def test_connection_reset_on_error(self):
+        async def stalled_then_garbled():
+            replies = [None, b"?garbled\r\n"]
+
+            async def handle(reader, writer):
+                await reader.read(1024)
+                reply = replies.pop(0)
+                if reply is not None:
+                    writer.write(reply)
+                    await writer.drain()
+                await reader.read()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            connection = AsyncRedisConnection("127.0.0.1", server.sockets[0].getsockname()[1], timeout=0.2)
+            errors = []
+            for _ in range(2):
+                try:
+                    await connection.execute_command("PING")
+                except Exception as error:
+                    errors.append(type(error).__name__)
+                errors.append(connection.writer is None)
+            server.close()
+            return errors
+        errors = asyncio.run(stalled_then_garbled())
+        assert errors == ["TimeoutError", True, "ConnectionError", True], f"A stalled or garbled reply is expected to time out or fail and drop the socket, found {errors} instead"
+
+    def test_flushall(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"flushall": True,
+                     "asynchronous": False})
+        asyncio.run(execute_concurrently([AsyncRedisFlushall(**args)]))
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
+
+    def tearDown(self):
+        self.redis_client.flushall()
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+from src.redis_checkpoint import RedisCheckpoint
+from src.redis_common import RedisCommon
+from src.redis_expire import RedisExpire
+from src.redis_verify import RedisVerify
+
+
+class TestRedisCheckpoint(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+    IDENTITY = {"task": "RedisVerify",
+                "pattern": "*EAT",
+                "no_ttl_only": False}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+        self.checkpoint_directory = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.checkpoint_directory.name, "checkpoint.json")
+
+    def test_save_and_resume(self):
+        checkpoint = RedisCheckpoint(self.checkpoint_path, identity=self.IDENTITY)
+        checkpoint.update("10.10.0.0:6379", 1234, {"keys_encountered": 10})
+        checkpoint.save()
+        resumed_checkpoint = RedisCheckpoint(self.checkpoint_path, resume=True, identity=self.IDENTITY)
+        assert resumed_checkpoint.get_cursor("10.10.0.0:6379") == 1234, f"Cursor 1234 expected, found {resumed_checkpoint.get_cursor('10.10.0.0:6379')} instead"
+        statistics = resumed_checkpoint.get_statistics("10.10.0.0:6379", {"keys_encountered": 0, "keys_deleted": 0})
+        assert statistics == {"keys_encountered": 10, "keys_deleted": 0}, f"Statistics differ, found {statistics} instead"
+
+    def test_resume_different_walk(self):
+        checkpoint = RedisCheckpoint(self.checkpoint_path, identity=self.IDENTITY)
+        checkpoint.save()
+        with self.assertRaises(ValueError):
+            RedisCheckpoint(self.checkpoint_path, resume=True, identity={"task": "RedisExpire", "pattern": "*"})
+
+    def test_verify_resume_completed_node(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "checkpoint": self.checkpoint_path})
+        result = RedisVerify(**args).verify_pattern_naive()
+        with open(self.checkpoint_path) as checkpoint_file:
+            node_checkpoint = json.load(checkpoint_file)["nodes"]["127.0.0.1:6379"]
+        assert node_checkpoint["complete"], "Node is expected to be marked complete"
+        assert node_checkpoint["statistics"]["keys_encountered"] == 3, f"3 key(s) expected to be checkpointed, found {node_checkpoint['statistics']} instead"
+        # Keys added after completion are not scanned again on resume
+        self.redis_client.set("CHEAT", 6)
+        args.update({"resume": True})
+        resumed_result = RedisVerify(**args).verify_pattern_naive()
+        assert resumed_result["resumed"], "Result is expected to be resumed"
+        assert resumed_result["keys_encountered"] == result["keys_encountered"], f"Number of keys encountered differ. {result['keys_encountered']} key(s) expected, found {resumed_result['keys_encountered']} key(s) instead."
+
+    def test_expire_lua_resume_completed_node(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        # Script replies are bytes without decoding, the cursor still has to be checkpointed as JSON
+        args.update({"decode_responses": False,
+                     "pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "ttl": 100,
+                     "print_keys": False,
+                     "lua": True,
+                     "throttle": "none",
+                     "checkpoint": self.checkpoint_path})
+        result = RedisExpire(**args).execute()
+        with open(self.checkpoint_path) as checkpoint_file:
+            node_checkpoint = json.load(checkpoint_file)["nodes"]["127.0.0.1:6379"]
+        assert node_checkpoint["complete"] and node_checkpoint["cursor"] == 0, f"Node is expected to be checkpointed complete, found {node_checkpoint} instead"
+        assert node_checkpoint["statistics"]["keys_deleted"] == 3, f"3 key(s) expected to be checkpointed, found {node_checkpoint['statistics']} instead"
+        self.redis_client.set("CHEAT", 6)
+        args.update({"resume": True})
+        resumed_result = RedisExpire(**args).execute()
+        assert resumed_result["resumed"], "Result is expected to be resumed"
+        assert resumed_result["keys_deleted"] == result["keys_deleted"], f"Number of keys deleted differ. {result['keys_deleted']} key(s) expected, found {resumed_result['keys_deleted']} key(s) instead."
+        assert self.redis_client.ttl("CHEAT") == -1, "Key added after completion is not expected to be expired on resume"
+
+    def tearDown(self):
+        self.checkpoint_directory.cleanup()
+        self.redis_client.flushall()
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import copy
+import unittest
+
+from src.redis_common import PRIMARY, REPLICA, REPLICA_PREFERRED, RedisCommon, RedisPoolRegistry
+
+
+class TestRedisCommon(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.pool_registry = RedisPoolRegistry()
+
+    def create_redis_common(self, **kwargs):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update(kwargs)
+        redis_common = RedisCommon(**args)
+        redis_common.pool_registry = self.pool_registry
+        return redis_common
+
+    def test_lazy_client(self):
+        redis_common = self.create_redis_common()
+        statistics = self.pool_registry.get_statistics()
+        assert statistics["pool_creations"] == 0, f"No pool expected before the client is used, found {statistics} instead"
+        assert redis_common.redis_client.ping(), "Client is expected to be connected on first use"
+        assert redis_common.get_redis_client() is redis_common.redis_client, "Client is expected to be built only once"
+
+    def test_shared_pool(self):
+        first_client = self.create_redis_common().get_redis_client()
+        second_client = self.create_redis_common().get_redis_client()
+        other_client = self.create_redis_common(max_connections=2).get_redis_client()
+        statistics = self.pool_registry.get_statistics()
+        assert first_client.connection_pool is second_client.connection_pool, "Tasks against the same endpoint are expected to share a pool"
+        assert other_client.connection_pool is not first_client.connection_pool, "Pools of different sizes are not expected to be shared"
+        assert other_client.connection_pool.max_connections == 2, f"Pool of 2 connections expected, found {other_client.connection_pool.max_connections} instead"
+        assert (statistics["pool_creations"], statistics["pool_hits"]) == (2, 1), f"2 pool creations and 1 hit expected, found {statistics} instead"
+
+    def test_clear(self):
+        self.create_redis_common().get_redis_client().ping()
+        self.pool_registry.clear()
+        statistics = self.pool_registry.get_statistics()
+        assert statistics["pools"] == 0, f"No pool expected once cleared, found {statistics} instead"
+
+    def test_read_node(self):
+        node = {"host": "127.0.0.1", "port": 6379, "name": "127.0.0.1:6379"}
+        primary = self.create_redis_common(read_preference=PRIMARY)
+        replica = self.create_redis_common(read_preference=REPLICA)
+        lagging = self.create_redis_common(read_preference=REPLICA, max_replication_lag=-1)
+        preferred = self.create_redis_common(read_preference=REPLICA_PREFERRED, max_replication_lag=-1)
+        node_client = primary.get_node_client(node)
+        assert primary.get_read_node(node, node_client) == node, "Primary read preference is expected to read from the master"
+        read_node = replica.get_read_node(node, node_client)
+        assert read_node["name"] == "127.0.0.1:6380", f"Replica 127.0.0.1:6380 expected, found {read_node['name']} instead"
+        assert replica.get_node_client(read_node).info("replication")["role"] == "slave", "Read node is expected to be a replica"
+        with self.assertRaises(ConnectionError):
+            lagging.get_read_node(node, node_client)
+        assert preferred.get_read_node(node, node_client) == node, "Master expected when no replica is within the replication lag"
+        with self.assertRaises(ValueError):
+            self.create_redis_common(read_preference="nearest")
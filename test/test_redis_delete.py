@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import copy
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_delete import RedisDelete
+
+
+class TestRedisDelete(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+        self.redis_client.set("AT", 2)
+        self.redis_client.set("A", 1)
+
+    def test_single_existing_key(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "HEAT",
+                     "no_ttl_only": False,
+                     "print_keys": True})
+        result = RedisDelete(**args).execute()
+        assert result["keys_deleted"] == 1, f"Number of keys deleted differ. 1 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert result["keys"] == ["HEAT"], f"Keys deleted differ. ['HEAT'] expected, found {result['keys']} instead."
+        assert not self.redis_client.exists("HEAT"), "HEAT is expected to be deleted"
+
+    def test_pattern_existing_keys_no_ttl(self):
+        self.redis_client.expire("HEAT", 100)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": True,
+                     "print_keys": True,
+                     "throttle": "none"})
+        result = RedisDelete(**args).execute()
+        assert result["keys_deleted"] == 2, f"Number of keys deleted differ. 2 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        result["keys"] = sorted([key.decode("utf-8") for key in result["keys"]])
+        assert result["keys"] == ["EAT", "WHEAT"], f"Keys deleted differ. ['EAT', 'WHEAT'] expected, found {result['keys']} instead."
+        assert result["nodes"]["127.0.0.1:6379"]["delete_command"] == "UNLINK", f"UNLINK expected, found {result['nodes']} instead."
+        assert self.redis_client.exists("HEAT", "AT") == 2, "Keys with TTL or not matching the pattern are not expected to be deleted"
+        assert self.redis_client.exists("EAT", "WHEAT") == 0, "Matched keys are expected to be deleted"
+
+    def test_pattern_dry_run(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "dry_run": True,
+                     "throttle": "none"})
+        result = RedisDelete(**args).execute()
+        assert result["keys_matched"] == 3, f"Number of keys matched differ. 3 key(s) expected, matched {result['keys_matched']} key(s) instead."
+        assert result["keys_deleted"] == 0, f"No key expected to be deleted, deleted {result['keys_deleted']} key(s) instead."
+        assert self.redis_client.exists("EAT", "HEAT", "WHEAT") == 3, "No key is expected to be deleted on dry run"
+
+    def tearDown(self):
+        self.redis_client.flushall()
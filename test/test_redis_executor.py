@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import copy
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_executor import RedisNodeExecutor
+
+
+class TestRedisExecutor(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": 6379,
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+    NODES = [{"host": "127.0.0.1", "port": 6379, "name": "127.0.0.1:6379"},
+             {"host": "127.0.0.1", "port": 6380, "name": "127.0.0.1:6380"}]
+
+    def setUp(self):
+        self.redis_common = RedisCommon(**self.COMMON_ARG)
+
+    def test_merge_results(self):
+        executor = RedisNodeExecutor(self.redis_common, nodes=copy.deepcopy(self.NODES))
+        output = executor.merge_results([("10.10.0.0:6379", {"keys_encountered": 2, "sleep_time": 1, "no_ttl_only": True, "keys": ["A", "B"]}),
+                                         ("10.10.0.1:6379", {"keys_encountered": 3, "sleep_time": 2, "no_ttl_only": True, "keys": ["C"]})])
+        expected_output = {"keys_encountered": 5,
+                           "sleep_time": 2,
+                           "keys": ["A", "B", "C"],
+                           "nodes": {"10.10.0.0:6379": {"keys_encountered": 2, "sleep_time": 1, "no_ttl_only": True},
+                                     "10.10.0.1:6379": {"keys_encountered": 3, "sleep_time": 2, "no_ttl_only": True}}}
+        assert output == expected_output, f"The output {expected_output} is expected, however, output {output} was found"
+
+    def test_execute_several_nodes(self):
+        executor = RedisNodeExecutor(self.redis_common, concurrency=2, nodes=copy.deepcopy(self.NODES))
+        output = executor.execute(lambda node, node_client: {"ping": int(node_client.ping())})
+        assert output["ping"] == 2, f"Expected both nodes to respond, however, {output['ping']} node(s) responded"
+        assert sorted(output["nodes"]) == ["127.0.0.1:6379", "127.0.0.1:6380"], f"Per-node statistics differ, found {output['nodes']} instead"
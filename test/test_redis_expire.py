@@ -3,8 +3,11 @@ import copy
 import time
 import unittest
 
+from redis import Redis
+from unittest import mock
 from src.redis_common import RedisCommon
 from src.redis_expire import RedisExpire
+from src.redis_filter import KeyFilter
 
 class TestRedisExpire(unittest.TestCase):
     COMMON_ARG = {"host": "127.0.0.1",
@@ -73,6 +76,94 @@ class TestRedisExpire(unittest.TestCase):
         assert result["keys_deleted"] == expected_result["keys_deleted"], f"Number of keys deleted differ. {result['keys_deleted']} key(s) expected, deleted {result['keys_deleted']} key(s) instead."
         assert result["keys"] == expected_result["keys"], f"Keys encountered differ. {expected_result['keys']} key(s) expected, found {result['keys']} key(s) instead."
 
+    def test_pattern_existing_keys_no_ttl(self):
+        pattern_to_be_tested = "*EAT"
+        self.redis_client.expire("HEAT", 100)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": pattern_to_be_tested,
+                     "no_ttl_only": True,
+                     "ttl": 1,
+                     "print_keys": True})
+        redis_verify_functionality = RedisExpire(**args)
+        result = redis_verify_functionality.set_ttl_pattern()
+        result["keys"] = sorted([key.decode("utf-8") for key in result["keys"]])
+        expected_result = {"keys_deleted": 2,
+                           "round_trips_saved": 2,
+                           "keys": sorted(["EAT", "WHEAT"])}
+        assert result["keys_deleted"] == expected_result["keys_deleted"], f"Number of keys deleted differ. {expected_result['keys_deleted']} key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert result["keys"] == expected_result["keys"], f"Keys encountered differ. {expected_result['keys']} key(s) expected, found {result['keys']} key(s) instead."
+        assert result["round_trips_saved"] == expected_result["round_trips_saved"], f"Round trips saved differ. {expected_result['round_trips_saved']} expected, found {result['round_trips_saved']} instead."
+        assert self.redis_client.ttl("HEAT") > 1, "Key with existing TTL is not expected to be modified"
+
+    def test_pattern_pipeline_not_transactional(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "ttl": 50,
+                     "print_keys": False,
+                     "throttle": "none"})
+        # MULTI / EXEC would fail with CROSSSLOT in cluster mode once keys span several slots
+        with mock.patch.object(Redis, "pipeline", autospec=True, side_effect=Redis.pipeline) as pipeline:
+            result = RedisExpire(**args).set_ttl_pattern()
+        transactions = [call.kwargs.get("transaction", call.args[1] if len(call.args) > 1 else True) for call in pipeline.call_args_list]
+        assert result["keys_deleted"] == 3, f"Number of keys deleted differ. 3 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert transactions and not any(transactions), f"Expire pipelines are not expected to be transactions, found {transactions} instead"
+
+    def test_pattern_lua(self):
+        pattern_to_be_tested = "*EAT"
+        self.redis_client.expire("HEAT", 100)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": pattern_to_be_tested,
+                     "no_ttl_only": True,
+                     "ttl": 50,
+                     "print_keys": False,
+                     "lua": True,
+                     "throttle": "none"})
+        redis_verify_functionality = RedisExpire(**args)
+        result = redis_verify_functionality.set_ttl_pattern()
+        assert result["keys_deleted"] == 2, f"Number of keys deleted differ. 2 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert result["keys_scanned"] == 3, f"Number of keys scanned differ. 3 key(s) expected, scanned {result['keys_scanned']} key(s) instead."
+        assert 0 < self.redis_client.ttl("WHEAT") <= 50, "Key without TTL is expected to be expired"
+        assert self.redis_client.ttl("HEAT") > 50, "Key with existing TTL is not expected to be modified"
+        assert self.redis_client.ttl("AT") == -1, "Key not matching the pattern is not expected to be modified"
+
+    def test_pattern_filter(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "ttl": 50,
+                     "print_keys": False,
+                     "key_filter": KeyFilter(regex="^W?HEAT$"),
+                     "filter_processes": 2,
+                     "throttle": "none"})
+        redis_verify_functionality = RedisExpire(**args)
+        result = redis_verify_functionality.set_ttl_pattern()
+        assert result["keys_deleted"] == 2, f"Number of keys deleted differ. 2 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert result["keys_scanned"] == 3, f"Number of keys scanned differ. 3 key(s) expected, scanned {result['keys_scanned']} key(s) instead."
+        assert 0 < self.redis_client.ttl("HEAT") <= 50, "Key matched by the filter is expected to be expired"
+        assert self.redis_client.ttl("EAT") == -1, "Key not matched by the filter is not expected to be modified"
+        with self.assertRaises(ValueError):
+            RedisExpire(**dict(args, lua=True))
+
+    def test_pattern_replica(self):
+        pattern_to_be_tested = "*EAT"
+        self.redis_client.expire("HEAT", 100)
+        # Wait for the replica to catch up with the keys set
+        self.redis_client.wait(1, 1000)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": pattern_to_be_tested,
+                     "no_ttl_only": True,
+                     "ttl": 50,
+                     "print_keys": False,
+                     "read_preference": "replica",
+                     "throttle": "none"})
+        redis_verify_functionality = RedisExpire(**args)
+        result = redis_verify_functionality.set_ttl_pattern()
+        read_node = result["nodes"]["127.0.0.1:6379"]["read_node"]
+        assert result["keys_deleted"] == 2, f"Number of keys deleted differ. 2 key(s) expected, deleted {result['keys_deleted']} key(s) instead."
+        assert read_node == "127.0.0.1:6380", f"TTL expected to be read from the replica, read from {read_node} instead."
+        assert 0 < self.redis_client.ttl("WHEAT") <= 50, "Key without TTL is expected to be expired on the master"
+        assert self.redis_client.ttl("HEAT") > 50, "Key with existing TTL is not expected to be modified"
 
     def tearDown(self):
         self.redis_client.flushall()
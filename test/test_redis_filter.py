@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from argparse import ArgumentParser
+from src.redis_filter import KeyFilter, KeyFilterPool, add_filter_arguments, pop_filter_arguments
+
+
+class TestRedisFilter(unittest.TestCase):
+    KEYS = ["user:1:name", "user:22:name", "session:1", "user:1:email", "cart:333"]
+
+    def test_match(self):
+        key_filter = KeyFilter(regex=r":\d{1}:", prefixes=["user:", "cart:"], max_length=11)
+        expected_keys = ["user:1:name"]
+        assert key_filter.match(self.KEYS) == expected_keys, f"{expected_keys} expected, found {key_filter.match(self.KEYS)} instead"
+        bytes_keys = key_filter.match([key_value.encode("utf-8") for key_value in self.KEYS])
+        assert bytes_keys == [b"user:1:name"], f"Keys undecoded by the client are expected to match alike, found {bytes_keys} instead"
+
+    def test_match_attributes(self):
+        key_filter = KeyFilter(min_ttl=10, max_ttl=100, types=["hash"])
+        assert key_filter.match_attributes(50, b"hash"), "Hash expiring within the range is expected to match"
+        assert not key_filter.match_attributes(50, "string"), "String is not expected to match"
+        assert not key_filter.match_attributes(5, "hash"), "Key expiring before the range is not expected to match"
+        assert not key_filter.match_attributes(-1, "hash"), "Key without TTL is not expected to fall within a TTL range"
+
+    def test_pool(self):
+        key_filter = KeyFilter(regex="name$")
+        expected_keys = key_filter.match(self.KEYS)
+        for processes in (0, 2):
+            pool = KeyFilterPool(key_filter, processes)
+            try:
+                futures = [pool.submit(self.KEYS) for _ in range(4)]
+                pages = [future.result() for future in futures]
+            finally:
+                pool.close()
+            assert pages == [expected_keys] * 4, f"Pages matched with {processes} processes differ. {expected_keys} expected, found {pages} instead"
+
+    def test_arguments(self):
+        parser = ArgumentParser()
+        add_filter_arguments(parser)
+        args = parser.parse_args(["--match_prefix", "user:", "cart:", "--max_ttl", "60", "--filter_processes", "2"])
+        key_filter = pop_filter_arguments(args)
+        assert key_filter.get_state()["prefixes"] == ["user:", "cart:"], f"Prefixes expected, found {key_filter.get_state()} instead"
+        assert key_filter.needs_ttl and not key_filter.needs_type, "Only TTL is expected to be looked up"
+        assert vars(args) == {"filter_processes": 2}, f"Only the processes are expected to be left for the task, found {vars(args)} instead"
+        assert pop_filter_arguments(parser.parse_args([])) is None, "No filter expected without predicates"
+        parser.add_argument("--no_ttl_only", action="store_true")
+        with self.assertRaises(ValueError):
+            pop_filter_arguments(parser.parse_args(["--no_ttl_only", "--min_ttl", "60"]))
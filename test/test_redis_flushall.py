@@ -30,6 +30,28 @@ class TestRedisFlushall(unittest.TestCase):
         redis_flushall_functionality.execute()
         assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
 
+    def test_flushall_every_database(self):
+        self.redis_client.execute_command("SELECT", 1)
+        self.redis_client.set("other:db", 1)
+        self.redis_client.execute_command("SELECT", 0)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"flushall": True,
+                     "asynchronous": False})
+        result = RedisFlushall(**args).execute()
+        assert result["keys_flushed"] == 6, f"Keys of every database, 6, expected to be flushed, found {result['keys_flushed']} key(s) instead"
+
+    def test_flushall_asynchronous(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"flushall": True,
+                     "asynchronous": True})
+        redis_flushall_functionality = RedisFlushall(**args)
+        result = redis_flushall_functionality.execute()
+        node_result = result["nodes"]["127.0.0.1:6379"]
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
+        assert result["keys_flushed"] == 5, f"5 key(s) expected to be flushed, found {result['keys_flushed']} key(s) instead"
+        assert node_result["asynchronous"], "FLUSHALL ASYNC is expected on Redis 4.0 onwards"
+        assert node_result["lazyfree_pending_objects"] == 0, f"Memory is expected to be reclaimed, found {node_result} instead"
+
     def tearDown(self):
         self.redis_client.flushall()
         assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from src.redis_histogram import LogHistogram
+
+
+class TestRedisHistogram(unittest.TestCase):
+    def test_bucket_bounds(self):
+        histogram = LogHistogram(significant_bits=3)
+        for value in list(range(0, 2000)) + [10 ** 6, 10 ** 9]:
+            lowest, highest = histogram.get_bucket_bounds(histogram.get_bucket(value))
+            assert lowest <= value <= highest, f"Value {value} is expected to fall within bucket [{lowest}, {highest}]"
+
+    def test_percentile(self):
+        histogram = LogHistogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        statistics = histogram.get_statistics()
+        assert statistics["count"] == 10000, f"10000 values expected, found {statistics['count']} instead"
+        assert statistics["max"] == 10000, f"Maximum of 10000 expected, found {statistics['max']} instead"
+        assert abs(statistics["p50"] - 5000) <= 5000 / 32, f"p50 expected within 1/32 of 5000, found {statistics['p50']} instead"
+        assert abs(statistics["p99"] - 9900) <= 9900 / 32, f"p99 expected within 1/32 of 9900, found {statistics['p99']} instead"
+
+    def test_merge(self):
+        histogram = LogHistogram()
+        histogram.record(5)
+        other_histogram = LogHistogram()
+        other_histogram.record(500, count=3)
+        histogram.merge(other_histogram)
+        assert histogram.count == 4, f"4 values expected, found {histogram.count} instead"
+        assert (histogram.minimum, histogram.maximum) == (5, 500), f"Range [5, 500] expected, found [{histogram.minimum}, {histogram.maximum}] instead"
+        assert histogram.percentile(50) == 500, f"p50 of 500 expected, found {histogram.percentile(50)} instead"
+
+    def test_state(self):
+        histogram = LogHistogram(significant_bits=0)
+        for value in (1, 3, 100, 1000):
+            histogram.record(value)
+        restored_histogram = LogHistogram.from_state(json.loads(json.dumps(histogram.get_state())))
+        assert restored_histogram.get_buckets() == histogram.get_buckets(), f"Buckets differ. Expected {histogram.get_buckets()}, found {restored_histogram.get_buckets()} instead"
+        assert restored_histogram.get_statistics() == histogram.get_statistics(), f"Statistics differ. Expected {histogram.get_statistics()}, found {restored_histogram.get_statistics()} instead"
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 import copy
+import json
+import os
+import sys
+import tempfile
 import unittest
 
-from src.redis_info import RedisInfo
+from unittest import mock
+from src.redis_info import RedisInfo, RedisInfoFleet, get_arguments
 
 
 class TestRedisInfo(unittest.TestCase):
@@ -133,3 +138,60 @@ class TestRedisInfo(unittest.TestCase):
         # TODO: END
         clustered_output = redis_info_functionality.filter_info_log(clustered_sample_info_log)
         assert clustered_output == clustered_sample_info_log, f"The output {clustered_sample_info_log} is expected, however, output {clustered_output} was found"
+
+    def test_fleet_info(self):
+        with tempfile.TemporaryDirectory() as inventory_directory:
+            inventory = os.path.join(inventory_directory, "inventory.txt")
+            with open(inventory, "w") as inventory_file:
+                inventory_file.write("# Local instances\n127.0.0.1:6379\n127.0.0.1:6380\n\n127.0.0.1:1\n")
+            redis_info_functionality = RedisInfoFleet(inventory, filter_keys="^role$", concurrency=2)
+            output = redis_info_functionality.execute()
+        assert list(output) == ["127.0.0.1:6379", "127.0.0.1:6380", "127.0.0.1:1"], f"Endpoints differ, found {list(output)} instead"
+        assert output["127.0.0.1:6379"]["info"] == {"role": "master"}, f"Master INFO differ, found {output['127.0.0.1:6379']} instead"
+        assert output["127.0.0.1:6380"]["info"] == {"role": "slave"}, f"Replica INFO differ, found {output['127.0.0.1:6380']} instead"
+        assert "error" in output["127.0.0.1:1"], f"Unreachable endpoint is expected to report an error, found {output['127.0.0.1:1']} instead"
+        assert all("node_time" in node_result for node_result in output.values()), "Every endpoint is expected to be timed"
+        rows = [json.loads(line) for line in redis_info_functionality.format_jsonl(output).splitlines()]
+        assert [row.get("role") for row in rows] == ["master", "slave", None], f"JSONL rows differ, found {rows} instead"
+        table = redis_info_functionality.format_table(output).splitlines()
+        assert table[0].split() == ["endpoint", "node_time", "role", "error"], f"Table header differ, found {table[0]} instead"
+        assert len(table) == 4, f"Table is expected to have a header and 3 rows, found {table} instead"
+
+    def test_cluster_mode_only_required_with_host(self):
+        with mock.patch.object(sys, "argv", ["redis_info.py", "--inventory", "inventory.txt"]):
+            args = get_arguments()
+        assert args.cluster_mode is None, f"Cluster mode is not expected with --inventory, found {args.cluster_mode} instead"
+        with mock.patch.object(sys, "argv", ["redis_info.py", "--host", "127.0.0.1"]), mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                get_arguments()
+
+    def test_instrumentation_rejected_with_fleet_and_watch(self):
+        for mode in (["--inventory", "inventory.txt"], ["--host", "127.0.0.1", "--cluster_mode_disabled", "--watch", "1"]):
+            with mock.patch.object(sys, "argv", ["redis_info.py"] + mode + ["--metrics"]), mock.patch("sys.stderr"):
+                with self.assertRaises(SystemExit):
+                    get_arguments()
+
+    def test_compute_rates(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"cluster_mode": False})
+        redis_info_functionality = RedisInfo(**args)
+        previous_sample = {"keyspace_hits": 100, "evicted_keys": 50, "cmdstat_get.calls": 10}
+        sample = {"keyspace_hits": 300, "evicted_keys": 5, "cmdstat_get.calls": 30, "cmdstat_get.usec_per_call": 1.5, "used_memory": 1024}
+        output = redis_info_functionality.compute_rates(previous_sample, sample, 2)
+        expected_output = {"deltas": {"keyspace_hits": 200, "evicted_keys": 5, "cmdstat_get.calls": 20},
+                           "rates": {"keyspace_hits": 100, "evicted_keys": 2.5, "cmdstat_get.calls": 10},
+                           "values": {"cmdstat_get.usec_per_call": 1.5, "used_memory": 1024}}
+        assert output == expected_output, f"The output {expected_output} is expected, however, output {output} was found"
+
+    def test_watch(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"cluster_mode": False,
+                     "filter_keys": "total_commands_processed|used_memory$",
+                     "history": 1})
+        redis_info_functionality = RedisInfo(**args)
+        records = list(redis_info_functionality.watch(0.1, count=2))
+        assert len(records) == 2, f"2 intervals expected, found {len(records)} instead"
+        for record in records:
+            assert record["deltas"]["total_commands_processed"] >= 1, f"INFO polls are expected to be counted, found {record} instead"
+            assert list(record["values"]) == ["used_memory"], f"Only used_memory is expected as value, found {record['values']} instead"
+        assert list(redis_info_functionality.history) == records[-1:], "Only the last interval is expected to be kept in history"
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import copy
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_memory import RedisMemory
+
+
+class TestRedisMemory(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        for index in range(10):
+            self.redis_client.set("MEMORY:SMALL:{}".format(index), "x")
+        self.redis_client.set("MEMORY:LARGE:0", "x" * 10000)
+        self.redis_client.rpush("MEMORY:LIST", *range(100))
+
+    def tearDown(self):
+        self.redis_client.delete(*self.redis_client.keys("MEMORY:*"))
+
+    def test_get_key_prefix(self):
+        prefixes = {("user:1:name", 1): "user",
+                    ("user:1:name", 2): "user:1",
+                    ("user:1", 2): "user",
+                    ("user", 1): None}
+        output = {arguments: RedisMemory.get_key_prefix(arguments[0], ":", arguments[1]) for arguments in prefixes}
+        assert output == prefixes, f"Output differ. Expected {prefixes}, found {output} instead."
+
+    def test_largest_keys(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "MEMORY:*",
+                     "top": 2,
+                     "prefix_depth": 2,
+                     "throttle": "none"})
+        result = RedisMemory(**args).execute()
+        largest_keys = [(entry["key"], entry["type"]) for entry in result["largest_keys"]]
+        prefixes = {entry["prefix"]: entry["keys"] for entry in result["prefixes"]}
+        assert largest_keys == [("MEMORY:LARGE:0", "string"), ("MEMORY:LIST", "list")], f"Largest keys differ, found {largest_keys} instead"
+        assert result["keys_sampled"] == 12, f"12 keys expected to be sampled, found {result['keys_sampled']} instead"
+        assert prefixes == {"MEMORY:SMALL": 10, "MEMORY:LARGE": 1, "MEMORY": 1}, f"Prefixes differ, found {prefixes} instead"
+
+    def test_sample_rate(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "MEMORY:SMALL:*",
+                     "sample_rate": 5,
+                     "throttle": "none"})
+        result = RedisMemory(**args).execute()
+        assert result["keys_scanned"] == 10, f"10 keys expected to be scanned, found {result['keys_scanned']} instead"
+        assert result["keys_sampled"] == 2, f"2 keys expected to be sampled, found {result['keys_sampled']} instead"
+        assert result["prefixes"][0]["estimated_keys"] == 10, f"10 keys expected to be estimated, found {result['prefixes']} instead"
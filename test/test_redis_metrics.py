@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import pstats
+import tempfile
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_metrics import PROMETHEUS, RedisMetrics
+from src.redis_verify import RedisVerify
+
+
+class TestRedisMetrics(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+
+    def create_redis_verify(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": True,
+                     "print_keys": False,
+                     "throttle": "none"})
+        return RedisVerify(**args)
+
+    def test_run_metrics(self):
+        result = self.create_redis_verify().run(metrics=True)
+        metrics = result["metrics"]
+        assert metrics["commands"].get("SCAN", 0) >= 1, f"SCAN expected to be counted, found {metrics['commands']} instead"
+        assert metrics["commands"].get("TTL", 0) == 3, f"3 TTL expected to be counted, found {metrics['commands']} instead"
+        assert metrics["pipeline_size"]["max"] == 3, f"Pipeline of 3 TTL expected, found {metrics['pipeline_size']} instead"
+        assert metrics["latency_in_microsec"]["PIPELINE"]["count"] >= 1, f"Pipeline latency expected, found {metrics['latency_in_microsec']} instead"
+        assert metrics["bytes_sent"] > 0 and metrics["bytes_received"] > 0, f"Bytes expected on the wire, found {metrics} instead"
+
+    def test_run_metrics_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "metrics.prom")
+            result = self.create_redis_verify().run(metrics_output=output, metrics_format=PROMETHEUS)
+            with open(output) as metrics_file:
+                content = metrics_file.read()
+        assert "metrics" not in result, "Metrics are only expected to be attached to the result when requested"
+        assert 'redis_troubleshoot_commands_total{task="RedisVerify",endpoint="127.0.0.1:6379",command="TTL"} 3' in content, f"TTL count expected, found {content} instead"
+
+    def test_run_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profile = os.path.join(directory, "verify.prof")
+            self.create_redis_verify().run(profile=profile)
+            functions = [function for _, _, function in pstats.Stats(profile).stats]
+        assert "scan_node_pages" in functions, "Node workers are expected to be profiled"
+
+    def test_format_prometheus(self):
+        metrics = RedisMetrics()
+        metrics.record_command("GET", 0.001, 10, 20)
+        metrics.record_pipeline(["TTL", "TTL"], 0.002, 30, 40)
+        statistics = metrics.get_statistics()
+        content = metrics.format_prometheus({"task": "test"})
+        assert statistics["commands"] == {"GET": 1, "TTL": 2}, f"Commands differ, found {statistics['commands']} instead"
+        assert (statistics["bytes_sent"], statistics["bytes_received"]) == (40, 60), f"Bytes differ, found {statistics} instead"
+        assert 'redis_troubleshoot_request_latency_microseconds_count{task="test",command="PIPELINE"} 1' in content, f"Pipeline latency expected, found {content} instead"
+
+    def tearDown(self):
+        self.redis_client.flushall()
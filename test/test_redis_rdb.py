@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import tempfile
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_rdb import RedisRdb, compile_pattern
+from src.redis_verify import RedisVerify
+
+
+# Snapshot of the keyspace below, saved by Redis 6.2 so that the RDB is produced by a real server without
+# having to take one from the server under test
+RDB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "keyspace.rdb")
+
+
+class TestRedisRdb(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+    LONG_KEY = "user:3:" + "profile" * 10
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+        self.redis_client.set("AT", 2)
+        self.redis_client.set("A", 1)
+        self.redis_client.set("12345", "integer key")
+        # Compressed with LZF, key and value alike
+        self.redis_client.set(self.LONG_KEY, "x" * 1000)
+        self.redis_client.set("user:1:name", "wheat", ex=30)
+        self.redis_client.set("user:2:name", "heat", ex=7200)
+        self.redis_client.rpush("list:small", *range(10))
+        self.redis_client.rpush("list:large", *["item{}".format(index) for index in range(1000)])
+        self.redis_client.sadd("set:intset", *range(10))
+        self.redis_client.sadd("set:large", *["member{}".format(index) for index in range(1000)])
+        self.redis_client.zadd("zset:small", {"a": 1, "b": 2.5})
+        self.redis_client.zadd("zset:large", {"member{}".format(index): index / 3 for index in range(1000)})
+        self.redis_client.hset("hash:small", mapping={"field": "value"})
+        self.redis_client.hset("hash:large", mapping={"field{}".format(index): "value" * 10 for index in range(1000)})
+        self.redis_client.xadd("stream", {"field": "value"})
+        self.redis_client.xgroup_create("stream", "group", id="0")
+        self.redis_client.xreadgroup("group", "consumer", {"stream": ">"})
+        self.redis_client.execute_command("SELECT", 1)
+        self.redis_client.set("other:db", 1)
+        self.redis_client.execute_command("SELECT", 0)
+        self.rdb_path = RDB_PATH
+
+    def test_pattern(self):
+        for pattern in ("*", "*EAT", "user:*", "[lh]*:small", "?EAT*"):
+            result = RedisRdb(self.rdb_path, pattern=pattern).execute()
+            args = copy.deepcopy(self.COMMON_ARG)
+            args.update({"pattern": pattern,
+                         "no_ttl_only": False,
+                         "print_keys": False,
+                         "throttle": "none"})
+            expected_result = RedisVerify(**args).execute()
+            assert result["keys_encountered"] == expected_result["keys_encountered"], f"Number of keys encountered for {pattern} differ. {expected_result['keys_encountered']} key(s) expected, found {result['keys_encountered']} key(s) instead."
+        assert result["keys_scanned"] == self.redis_client.dbsize(), f"Every key of db 0 is expected to be scanned, found {result['keys_scanned']} key(s) instead."
+
+    def test_keys_without_ttl(self):
+        result = RedisRdb(self.rdb_path, pattern="user:*", no_ttl_only=True, print_keys=True).execute()
+        keys = sorted(key.decode("utf-8") for key in result["keys"])
+        assert keys == [self.LONG_KEY], f"Keys encountered differ. {[self.LONG_KEY]} expected, found {keys} instead."
+
+    def test_prefixes(self):
+        result = RedisRdb(self.rdb_path, pattern="*", prefix_depth=1, ttl_buckets=True, top=3, db=None).execute()
+        prefixes = {entry["prefix"]: entry for entry in result["prefixes"]}
+        largest_keys = [(entry["key"], entry["type"]) for entry in result["largest_keys"]]
+        assert prefixes["user"]["keys"] == 3, f"3 key(s) expected under user, found {prefixes['user']['keys']} instead."
+        assert (prefixes["user"]["no_ttl"], prefixes["user"]["under_1m"], prefixes["user"]["under_1d"]) == (1, 1, 1), f"TTL buckets of user differ, found {prefixes['user']} instead."
+        assert prefixes["other"]["keys"] == 1, "Keys of every database are expected when db is None"
+        assert sum(entry["memory"] for entry in result["prefixes"]) == result["memory"], "Memory of prefixes is expected to add up to the memory of keys"
+        assert largest_keys[0] == ("hash:large", "hash"), f"hash:large expected to be the largest key, found {largest_keys} instead."
+        assert {key_type for _, key_type in largest_keys} == {"hash", "set", "zset"}, f"Largest keys of every collection type expected, found {largest_keys} instead."
+
+    def test_field_ttl_hashes_and_slot_info(self):
+        """Version 12 snapshot of a cluster node, as written by Redis 7.4, built by hand as the server under test is older"""
+        def encode_string(value):
+            return bytes([len(value)]) + value
+        min_expire = (2 ** 40).to_bytes(8, "little")
+        content = b"".join([b"REDIS0012",
+                            b"\xfe\x00",
+                            # Slot 5 holds 4 keys, 1 of them with an expiry
+                            b"\xf4\x05\x04\x01",
+                            b"\x18", encode_string(b"hash:metadata"), min_expire, b"\x02",
+                            b"\x00", encode_string(b"field1"), encode_string(b"value1"),
+                            b"\x01", encode_string(b"field2"), encode_string(b"value2"),
+                            b"\x19", encode_string(b"hash:listpack"), min_expire, encode_string(b"listpack"),
+                            b"\x16", encode_string(b"hash:metadata_pre_ga"), b"\x01",
+                            b"\x40\x10", encode_string(b"field"), encode_string(b"value"),
+                            b"\x17", encode_string(b"hash:listpack_pre_ga"), encode_string(b"listpack"),
+                            b"\x00", encode_string(b"string"), encode_string(b"value"),
+                            b"\xff", bytes(8)])
+        with tempfile.TemporaryDirectory() as rdb_dir:
+            rdb_path = os.path.join(rdb_dir, "cluster.rdb")
+            with open(rdb_path, "wb") as rdb_file:
+                rdb_file.write(content)
+            result = RedisRdb(rdb_path, pattern="hash:*", top=10).execute()
+        key_types = {entry["key"]: entry["type"] for entry in result["largest_keys"]}
+        expected_key_types = {"hash:metadata": "hash", "hash:listpack": "hash", "hash:metadata_pre_ga": "hash", "hash:listpack_pre_ga": "hash"}
+        assert result["keys_scanned"] == 5, f"Every key is expected to be scanned, found {result['keys_scanned']} key(s) instead."
+        assert key_types == expected_key_types, f"Hashes with field TTLs differ. Expected {expected_key_types}, found {key_types} instead."
+
+    def test_compile_pattern(self):
+        for pattern, key_value, expected in (("h?llo", b"hello", True), ("h[ae]llo", b"hallo", True), ("h[^e]llo", b"hello", False),
+                                             ("h[a-b]llo", b"hbllo", True), ("a\\*", b"a*", True), ("a\\*", b"ab", False), ("a.b", b"axb", False)):
+            assert bool(compile_pattern(pattern).fullmatch(key_value)) == expected, f"{pattern} matching {key_value} expected to be {expected}"
+
+    def tearDown(self):
+        self.redis_client.flushall()
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
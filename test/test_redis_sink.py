@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import copy
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from src.redis_common import RedisCommon
+from src.redis_sink import JSONL, StreamKeySink
+from src.redis_verify import RedisVerify
+
+
+class TestRedisSink(unittest.TestCase):
+    COMMON_ARG = {"host": "127.0.0.1",
+                  "port": "6379",
+                  "cluster_mode": False,
+                  "authentication": None,
+                  "decode_responses": True}
+
+    def setUp(self):
+        self.redis_client = RedisCommon(**self.COMMON_ARG).get_redis_client()
+        self.redis_client.set("WHEAT", 5)
+        self.redis_client.set("HEAT", 4)
+        self.redis_client.set("EAT", 3)
+        self.redis_client.set("AT", 2)
+        self.redis_client.set("A", 1)
+        self.output_directory = tempfile.TemporaryDirectory()
+
+    def test_stream_jsonl_gzip(self):
+        output = os.path.join(self.output_directory.name, "keys.jsonl.gz")
+        key_sink = StreamKeySink(output, JSONL, compress=True)
+        key_sink.write([b"HEAT", "EAT"], "10.10.0.0:6379")
+        key_sink.close()
+        with gzip.open(output, "rt") as output_file:
+            lines = [json.loads(line) for line in output_file]
+        expected_lines = [{"key": "HEAT", "node": "10.10.0.0:6379"},
+                          {"key": "EAT", "node": "10.10.0.0:6379"}]
+        assert lines == expected_lines, f"Output differ. Expected {expected_lines}, found {lines} instead."
+        assert key_sink.get_statistics()["keys_written"] == 2, f"2 key(s) expected to be written, found {key_sink.get_statistics()['keys_written']} instead"
+
+    def test_verify_stream_keys(self):
+        output = os.path.join(self.output_directory.name, "keys.txt")
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "output_keys": output})
+        result = RedisVerify(**args).verify_pattern_naive()
+        with open(output) as output_file:
+            keys = sorted(output_file.read().split())
+        assert keys == sorted(["EAT", "HEAT", "WHEAT"]), f"Keys streamed differ, found {keys} instead."
+        assert "keys" not in result, "Key(s) streamed are not expected to be kept in the result"
+        assert result["keys_written"] == 3, f"3 key(s) expected to be written, found {result['keys_written']} instead"
+
+    def tearDown(self):
+        self.output_directory.cleanup()
+        self.redis_client.flushall()
+        assert self.redis_client.dbsize() == 0, f"The Redis instance is expected to be empty, however, dbsize returns {self.redis_client.dbsize()}"
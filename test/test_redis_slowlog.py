@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import copy
+import os
+import tempfile
 import unittest
 
-from src.redis_slowlog import RedisSlowlog
+from redis import Redis
+
+from src.redis_slowlog import RedisSlowlog, SlowlogColumns
 
 
 class TestRedisSlowlog(unittest.TestCase):
@@ -75,3 +79,69 @@ class TestRedisSlowlog(unittest.TestCase):
                              "readable_start_time": "2021-07-26 02:30:29+0000",
                              "start_time": 1627266629}]
         assert expected_output == output, f"Output differ. Expected {expected_output}, found {output} instead."
+
+    def test_fingerprint_command(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        redis_slowlog_functionality = RedisSlowlog(**args)
+        commands = {b"HMGET state:45678 state lock_expire_a": "HMGET state:? ?",
+                    b"get session:3f2a1c9e-1b2c-4d5e-8f90-123456789abc": "GET session:?",
+                    b"MGET user:1 user:2 user:3": "MGET user:? ?",
+                    b"CONFIG SET maxmemory 100mb": "CONFIG SET",
+                    b"EVALSHA 1b936e3fe509bcbc9cd0664897bbe8fd0ac95a33 1 lock:42": "EVALSHA ?",
+                    b"FLUSHALL": "FLUSHALL"}
+        output = {command: redis_slowlog_functionality.fingerprint_command(command) for command in commands}
+        assert output == commands, f"Output differ. Expected {commands}, found {output} instead."
+
+    def test_aggregate_logs(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"top": 1})
+        redis_slowlog_functionality = RedisSlowlog(**args)
+        logs = [{"command": b"HMGET state:12345 state lock_expire_a", "duration": 61265, "host": "10.10.1.2:6379", "id": 4, "start_time": 1627346702},
+                {"command": b"HMGET state:23456 state lock_expire_a", "duration": 10973, "host": "10.10.1.2:6379", "id": 3, "start_time": 1627254663},
+                {"command": b"HMGET state:34567 state lock_expire_a", "duration": 39980, "host": "10.10.1.3:6379", "id": 2, "start_time": 1627353330},
+                {"command": b"KEYS *", "duration": 20, "host": "10.10.1.3:6379", "id": 1, "start_time": 1627266629}]
+        output = redis_slowlog_functionality.aggregate_logs(logs)
+        fingerprint = output["fingerprints"][0]
+        assert output["entries"] == 4, f"4 entries expected, found {output['entries']} instead"
+        assert len(output["fingerprints"]) == 1, f"Only the top fingerprint is expected, found {output['fingerprints']} instead"
+        assert fingerprint["fingerprint"] == "HMGET state:? ?", f"HMGET state:? ? is expected to be the top fingerprint, found {fingerprint['fingerprint']} instead"
+        assert fingerprint["count"] == 3, f"3 entries expected for the fingerprint, found {fingerprint['count']} instead"
+        assert fingerprint["total_duration_in_microsec"] == 112218, f"Total duration differ, found {fingerprint['total_duration_in_microsec']} instead"
+        assert fingerprint["max_duration_in_microsec"] == 61265, f"Maximum duration differ, found {fingerprint['max_duration_in_microsec']} instead"
+        assert fingerprint["hosts"] == {"10.10.1.2:6379": 2, "10.10.1.3:6379": 1}, f"Hosts differ, found {fingerprint['hosts']} instead"
+        assert output["hosts"]["10.10.1.3:6379"]["count"] == 2, f"2 entries expected for 10.10.1.3:6379, found {output['hosts']['10.10.1.3:6379']} instead"
+
+    def test_tail(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        client = Redis(host="127.0.0.1", port=6379)
+        client.slowlog_reset()
+        threshold = client.config_get("slowlog-log-slower-than")["slowlog-log-slower-than"]
+        client.config_set("slowlog-log-slower-than", 0)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                state_file = os.path.join(directory, "slowlog.json")
+                client.get("WHEAT")
+                output = [log["command"] for log in RedisSlowlog(**args).tail(0, 1, state_file)]
+                assert "GET WHEAT" in output, f"GET WHEAT expected in the first tail, found {output} instead"
+                client.get("HEAT")
+                output = [log["command"] for log in RedisSlowlog(**args).tail(0, 1, state_file)]
+                assert "GET HEAT" in output, f"GET HEAT expected in the second tail, found {output} instead"
+                assert "GET WHEAT" not in output, f"GET WHEAT is expected to be emitted only once, found {output} instead"
+        finally:
+            client.config_set("slowlog-log-slower-than", threshold)
+
+    def test_slowlog_columns(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        redis_slowlog_functionality = RedisSlowlog(**args)
+        raw_clustered_redis_output = {"10.10.1.2:6379": [{"command": b"HMGET state:12345 state lock_expire_a", "duration": 61265, "id": 4, "start_time": 1627346702},
+                                                         {"command": b"HMGET state:23456 state lock_expire_a", "duration": 10973, "id": 3, "start_time": 1627254663}],
+                                      "10.10.1.3:6379": [{"command": b"HMGET state:34567 state lock_expire_a", "duration": 39980, "id": 2, "start_time": 1627353330},
+                                                         {"command": b"HMGET state:45678 state lock_expire_a", "duration": 39416, "id": 1, "start_time": 1627266629}]}
+        columns = SlowlogColumns.from_logs(copy.deepcopy(raw_clustered_redis_output))
+        columns.sort()
+        output = list(columns.iter_rows())
+        logs = redis_slowlog_functionality.cluster_mode_processing(raw_clustered_redis_output)
+        logs = redis_slowlog_functionality.parse_string_codec(redis_slowlog_functionality.append_logs(logs))
+        expected_output = sorted(logs, key=lambda x: x.get("start_time", ""), reverse=True)
+        assert expected_output == output, f"Output differ. Expected {expected_output}, found {output} instead."
+        assert output[-1]["readable_start_time"] == "2021-07-25 23:11:03+0000", f"Readable start time differ, found {output[-1]} instead"
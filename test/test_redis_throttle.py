@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from src.redis_throttle import FeedbackThrottle, FixedThrottle, TokenBucketThrottle, create_throttle
+
+
+class TestRedisThrottle(unittest.TestCase):
+    def test_fixed_throttle(self):
+        throttle = FixedThrottle(sleep=0.01, sleep_batch=10)
+        for _ in range(4):
+            throttle.throttle(5)
+        statistics = throttle.get_statistics()
+        assert statistics["operations"] == 20, f"20 operations expected, found {statistics['operations']} instead"
+        assert abs(statistics["sleep_time"] - 0.02) < 1e-9, f"Expected to sleep twice for 0.02s, slept {statistics['sleep_time']}s instead"
+
+    def test_token_bucket_throttle(self):
+        throttle = TokenBucketThrottle(ops_per_sec=100)
+        # First second worth of operations is allowed as a burst
+        throttle.throttle(100)
+        throttle.throttle(20)
+        statistics = throttle.get_statistics()
+        assert 0.15 <= statistics["sleep_time"] <= 0.25, f"Expected to sleep about 0.2s, slept {statistics['sleep_time']}s instead"
+        assert statistics["effective_rate"] <= 120 / 0.15, f"Effective rate {statistics['effective_rate']} exceeds the target"
+
+    def test_feedback_throttle_backoff(self):
+        throttle = FeedbackThrottle(ops_per_sec=1000)
+        for _ in range(5):
+            throttle.adjust_rate(0.001)
+        assert throttle.rate == 1000, f"Rate is expected to stay at the target, found {throttle.rate} instead"
+        throttle.adjust_rate(0.1)
+        assert throttle.rate == 500, f"Rate is expected to back off to 500, found {throttle.rate} instead"
+        throttle.adjust_rate(0.001)
+        assert throttle.rate == 550, f"Rate is expected to recover to 550, found {throttle.rate} instead"
+
+    def test_invalid_throttle_mode(self):
+        with self.assertRaises(ValueError):
+            create_throttle("unknown")
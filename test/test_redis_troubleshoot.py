@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import unittest
+
+from src.redis_troubleshoot import SUBCOMMANDS
+
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def get_imported_modules(statement):
+    """Modules imported by a fresh interpreter running the statement, as reported by -X importtime"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=SOURCE_DIRECTORY,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return {line.rsplit("|", 1)[1].strip() for line in process.stderr.splitlines() if line.startswith("import time:")}
+
+
+class TestRedisTroubleshoot(unittest.TestCase):
+    def test_entry_point_imports(self):
+        modules = get_imported_modules("import redis_troubleshoot")
+        assert "redis" not in modules, "Entry point is not expected to import redis before a subcommand is chosen"
+        assert not any(module in modules for module, _ in SUBCOMMANDS.values()), f"No task module expected to be imported, found {modules} instead"
+
+    def test_standalone_imports(self):
+        statement = "import {}".format(", ".join(module for module, _ in SUBCOMMANDS.values()))
+        modules = get_imported_modules(statement)
+        for heavy_module in ("rediscluster", "pytz"):
+            assert heavy_module not in modules, f"{heavy_module} is not expected to be imported by any task module"
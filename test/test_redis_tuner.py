@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+from src.redis_checkpoint import RedisCheckpoint
+from src.redis_throttle import create_throttle
+from src.redis_tuner import AutoBatchTuner, BatchTuner
+from src.redis_verify import RedisVerify
+
+
+class RecordingTuner(BatchTuner):
+    def __init__(self, scan_count, pipeline_batch):
+        super().__init__(scan_count, pipeline_batch)
+        self.latencies = []
+
+    def record_page(self, latency, keys):
+        self.latencies.append(latency)
+
+
+class TestRedisTuner(unittest.TestCase):
+    def test_fixed_tuner(self):
+        tuner = BatchTuner(scan_count=1000, pipeline_batch=1000)
+        tuner.record_page(1, 1000)
+        tuner.record_flush(1, 1000)
+        expected_output = {"tuning": {"scan_count": 1000, "pipeline_batch": 1000}}
+        assert tuner.get_statistics() == expected_output, f"Output differ. Expected {expected_output}, found {tuner.get_statistics()} instead."
+
+    def test_sparse_pages_scan_more(self):
+        tuner = AutoBatchTuner(scan_count=1000, pipeline_batch=1000, target_latency=0.05)
+        tuner.record_page(0.01, 2)
+        assert tuner.scan_count == 2000, f"SCAN COUNT is expected to double at most per page, found {tuner.scan_count} instead"
+        for _ in range(20):
+            tuner.record_page(0.001, 0)
+        assert tuner.scan_count == AutoBatchTuner.MAXIMUM_SCAN_COUNT, f"SCAN COUNT is expected to be capped, found {tuner.scan_count} instead"
+
+    def test_dense_flush_smaller(self):
+        tuner = AutoBatchTuner(scan_count=1000, pipeline_batch=1000, target_latency=0.05)
+        tuner.record_flush(0.075, 1000)
+        assert tuner.pipeline_batch == 666, f"Pipeline batch is expected to shrink to 666, found {tuner.pipeline_batch} instead"
+        history = tuner.get_statistics()["tuning"]["history"]
+        assert [entry["pipeline_batch"] for entry in history] == [1000, 666], f"History differ, found {history} instead"
+
+    def test_page_latency_excludes_caller(self):
+        task = RedisVerify("127.0.0.1", "6379", False, None, True, "*", False, False, throttle="none")
+        task.checkpoint = RedisCheckpoint()
+        node = task.get_master_nodes()[0]
+        tuner = RecordingTuner(scan_count=1000, pipeline_batch=1000)
+        for _ in task.scan_node_pages(node, task.get_node_client(node), create_throttle("none", None), tuner):
+            # Stands in for pipeline flushes and sink writes of the caller
+            time.sleep(0.2)
+        assert tuner.latencies and max(tuner.latencies) < 0.2, f"Page latency is expected to only time SCAN, found {tuner.latencies} instead"
@@ -4,6 +4,7 @@ import time
 import unittest
 
 from src.redis_common import RedisCommon
+from src.redis_filter import KeyFilter
 from src.redis_verify import RedisVerify
 
 
@@ -88,6 +89,128 @@ class TestRedisVerify(unittest.TestCase):
         assert result["keys_encountered"] == expected_result["keys_encountered"], f"Number of keys encountered differ. {result['keys_encountered']} key(s) expected, found {result['keys_encountered']} key(s) instead."
         assert result["keys"] == expected_result["keys"], f"Keys encountered differ. {expected_result['keys']} key(s) expected, found {result['keys']} key(s) instead."
 
+    def test_pattern_several_nodes(self):
+        pattern_to_be_tested = "*EAT"
+        # Replica holds an identical copy of the keyspace
+        self.redis_client.execute_command("WAIT", 1, 1000)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": pattern_to_be_tested,
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "concurrency": 2,
+                     "nodes": [{"host": "127.0.0.1", "port": 6379, "name": "127.0.0.1:6379"},
+                               {"host": "127.0.0.1", "port": 6380, "name": "127.0.0.1:6380"}]})
+        redis_verify_functionality = RedisVerify(**args)
+        result = redis_verify_functionality.verify_pattern_naive()
+        assert result["keys_encountered"] == 6, f"Number of keys encountered differ. 6 key(s) expected, found {result['keys_encountered']} key(s) instead."
+        for node_name, node_result in result["nodes"].items():
+            assert node_result["keys_encountered"] == 3, f"Number of keys encountered on {node_name} differ. 3 key(s) expected, found {node_result['keys_encountered']} key(s) instead."
+
+    def test_pattern_prefixes(self):
+        self.redis_client.set("user:1:name", "a")
+        self.redis_client.set("user:1:email", "a", ex=30)
+        self.redis_client.set("user:2:name", "b", ex=7200)
+        self.redis_client.set("session:1", "c")
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "prefix_depth": 2,
+                     "ttl_buckets": True,
+                     "throttle": "none"})
+        redis_verify_functionality = RedisVerify(**args)
+        result = redis_verify_functionality.execute()
+        prefixes = {entry.pop("prefix"): entry for entry in result["prefixes"]}
+        expected_prefixes = {"user": {"keys": 3, "no_ttl": 1, "under_1m": 1, "under_1d": 1},
+                             "user:1": {"keys": 2, "no_ttl": 1, "under_1m": 1},
+                             "user:2": {"keys": 1, "under_1d": 1},
+                             "session": {"keys": 1, "no_ttl": 1},
+                             "(none)": {"keys": 5, "no_ttl": 5}}
+        assert result["keys_encountered"] == 9, f"Number of keys encountered differ. 9 key(s) expected, found {result['keys_encountered']} key(s) instead."
+        assert prefixes == expected_prefixes, f"Prefixes differ. Expected {expected_prefixes}, found {prefixes} instead."
+
+    def test_pattern_prefixes_without_ttl(self):
+        self.redis_client.set("user:1:name", "a")
+        self.redis_client.set("user:1:email", "a", ex=30)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "user:*",
+                     "no_ttl_only": True,
+                     "print_keys": False,
+                     "prefix_depth": 2,
+                     "ttl_buckets": True,
+                     "throttle": "none"})
+        result = RedisVerify(**args).run(metrics=True)
+        prefixes = {entry.pop("prefix"): entry for entry in result["prefixes"]}
+        expected_prefixes = {"user": {"keys": 1, "no_ttl": 1},
+                             "user:1": {"keys": 1, "no_ttl": 1}}
+        assert prefixes == expected_prefixes, f"Prefixes differ. Expected {expected_prefixes}, found {prefixes} instead."
+        assert result["metrics"]["commands"]["TTL"] == 2, f"TTL expected to be looked up once per key, found {result['metrics']['commands']} instead"
+
+    def test_prefixes_ttl_profile_rejected(self):
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "prefix_depth": 2,
+                     "ttl_profile": True})
+        with self.assertRaises(ValueError):
+            RedisVerify(**args)
+
+    def test_pattern_ttl_profile(self):
+        self.redis_client.expire("HEAT", 30)
+        self.redis_client.expire("EAT", 90)
+        self.redis_client.expire("AT", 7200)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*",
+                     "no_ttl_only": False,
+                     "print_keys": False,
+                     "ttl_profile": True,
+                     "throttle": "none"})
+        redis_verify_functionality = RedisVerify(**args)
+        result = redis_verify_functionality.execute()
+        histogram_keys = sum(bucket["keys"] for bucket in result["ttl_histogram"])
+        assert result["persistent_keys"] == 2, f"2 persistent key(s) expected, found {result['persistent_keys']} key(s) instead."
+        assert histogram_keys == 3, f"3 key(s) expected in the TTL histogram, found {histogram_keys} key(s) instead."
+        assert result["ttl_statistics"]["max"] <= 7200, f"Maximum TTL expected within 7200, found {result['ttl_statistics']['max']} instead."
+        assert len(result["expiry_schedule"]) == 60, f"60 minutes expected in the expiry schedule, found {len(result['expiry_schedule'])} instead."
+        assert result["expiry_schedule"][0] == 1 and result["expiry_schedule"][1] == 1, f"1 key expected to expire within the first 2 minutes each, found {result['expiry_schedule'][:2]} instead."
+        assert sum(result["expiry_schedule"]) == 2, f"2 key(s) expected to expire within the hour, found {sum(result['expiry_schedule'])} key(s) instead."
+
+    def test_pattern_filter(self):
+        self.redis_client.expire("HEAT", 100)
+        self.redis_client.expire("WHEAT", 1000)
+        self.redis_client.hset("TREAT", "field", "value")
+        self.redis_client.expire("TREAT", 100)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*",
+                     "no_ttl_only": False,
+                     "print_keys": True,
+                     "throttle": "none"})
+        for key_filter, expected_keys in ((KeyFilter(regex="^[WH]+EAT$"), ["HEAT", "WHEAT"]),
+                                          (KeyFilter(regex="EAT$", max_ttl=500), ["HEAT", "TREAT"]),
+                                          (KeyFilter(prefixes=["T", "E"], types=["string"]), ["EAT"])):
+            for filter_processes in (0, 2):
+                redis_verify_functionality = RedisVerify(key_filter=key_filter, filter_processes=filter_processes, **args)
+                result = redis_verify_functionality.execute()
+                keys = sorted(key.decode("utf-8") for key in result["keys"])
+                assert keys == expected_keys, f"Keys encountered with {key_filter.get_state()} and {filter_processes} process(es) differ. {expected_keys} expected, found {keys} instead."
+                assert result["keys_encountered"] == len(expected_keys), f"Number of keys encountered differ. {len(expected_keys)} key(s) expected, found {result['keys_encountered']} key(s) instead."
+
+    def test_pattern_replica(self):
+        self.redis_client.expire("HEAT", 100)
+        # Wait for the replica to catch up with the keys set
+        self.redis_client.wait(1, 1000)
+        args = copy.deepcopy(self.COMMON_ARG)
+        args.update({"pattern": "*EAT",
+                     "no_ttl_only": True,
+                     "print_keys": False,
+                     "read_preference": "replica",
+                     "throttle": "none"})
+        redis_verify_functionality = RedisVerify(**args)
+        result = redis_verify_functionality.execute()
+        read_node = result["nodes"]["127.0.0.1:6379"]["read_node"]
+        assert result["keys_encountered"] == 2, f"Number of keys encountered differ. 2 key(s) expected, found {result['keys_encountered']} key(s) instead."
+        assert read_node == "127.0.0.1:6380", f"Keys expected to be read from the replica, read from {read_node} instead."
 
     def tearDown(self):
         self.redis_client.flushall()